@@ -1,31 +1,47 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, url_for
 from flask_cors import CORS
 from datetime import timedelta  
 import os
 import logging
 import numpy as np
 import tensorflow as tf
-from heart_predictor import predict_cad, get_medical_analysis
+from heart_predictor import predict_cad, predict_cad_batch, cad_matrix, get_medical_analysis, CAD_FEATURES
 from flask_jwt_extended import JWTManager
 from utils.heart_feature_descriptions import feature_descriptions
-from modules.llm_service import generate_gemini_response
+from modules.llm_service import (
+    generate_gemini_response, stream_gemini_response, parse_gemini_response, cache_metrics as gemini_cache_metrics,
+    coalescing_metrics as gemini_coalescing_metrics
+)
+from modules.json_stream import JsonFieldStreamer
 from modules.rag_service import retrieve_similar_content, load_conversation_dataset
 from modules.prompts import create_analysis_prompt, create_prescription_prompt, create_chat_prompt
 from modules.report_service import generate_pdf_report
-from utils.preprocessing import preprocess_input
+from modules.stt_service import transcribe_audio_file, STT_BACKEND, SERVICE_UNAVAILABLE_MESSAGE
+from modules import analysis_cache
+from modules.model_bundle import EMOTION_BUNDLE_DIR
+from modules import cohere_client, narrative_cache, llm_gateway, chat_history as chat_history_store
+from modules.narrative_jobs import jobs as narrative_jobs, PENDING, RUNNING
+from modules.resilience import Overloaded
+from modules.chat_sessions import get_store as chat_session_store, SessionNotFound
+from utils.preprocessing import HeartFailurePreprocessor
+from utils.attribution import explain_batch
 from utils.field_descriptions import FIELD_DESCRIPTIONS, VALID_VALUES
 from models.model import model, scaler_mean, scaler_scale, encoder_categories, prep_info
 from utils.analysis import generate_cohere_analysis_heart
-from utils.ecg_processing import extract_signal_from_image
+from utils.ecg_processing import (
+    extract_signal_from_image, extract_signals_from_images, extract_beats_from_image, STRIP_DURATION_SECONDS,
+    signals_from_samples, parse_signal_file, extract_leads_from_image
+)
 from utils.analysis_generator import generate_cohere_analysis
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from dotenv import load_dotenv
 from io import BytesIO
 from werkzeug.utils import secure_filename
-from google import genai
+import io
 import json
-import speech_recognition as sr  # Import SpeechRecognition
+import zipfile
+import pandas as pd
 from fall_detection import process_video_for_fall_detection  # Added
 
 # Set up logging
@@ -67,8 +83,6 @@ GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("Please set the GOOGLE_API_KEY environment variable.")
 
-client = genai.Client(api_key=GOOGLE_API_KEY)
-
 # Define allowed file types
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'txt', 'docx', 'doc'}
 
@@ -94,7 +108,7 @@ def upload_file(file):
         file.save(temp_path)
         # Now upload the file from the temporary location
         with open(temp_path, 'rb') as f:
-            uploaded_file = client.files.upload(
+            uploaded_file = llm_gateway.get_client().files.upload(
                 file=f,
                 config={
                     'mime_type': file.content_type,
@@ -108,9 +122,10 @@ def upload_file(file):
             os.remove(temp_path)
 
 def delete_file(file):
-    myfile = client.files.get(name=file)
+    files = llm_gateway.get_client().files
+    myfile = files.get(name=file)
     if myfile:
-        client.files.delete(name=myfile.name)
+        files.delete(name=myfile.name)
         return True
     return False
 
@@ -147,7 +162,7 @@ def process_file_with_gemini(file, user_message, user_name):
         # Generate response from Gemini using multimodal capabilities
         logger.info(f"Processing file for {user_name} with message: {user_message}")
         print(f"File name: {file}")
-        response = client.models.generate_content(
+        response = llm_gateway.generate_content(
             model="gemini-2.0-flash", 
             contents=[
                 system_prompt, file
@@ -155,7 +170,8 @@ def process_file_with_gemini(file, user_message, user_name):
             config={
                 "temperature": 0.3,
                 "max_output_tokens": 2048,
-            }
+            },
+            label="file"
         )
         
         return {
@@ -191,6 +207,23 @@ def retrieve_content():
             'message': 'Error retrieving content'
         }), 500
 
+# How long identical Gemini requests are answered from the response cache, per endpoint (0 disables)
+GEMINI_CACHE_TTLS = {
+    'analyze': float(os.environ.get('GEMINI_CACHE_TTL_ANALYZE', 3600)),
+    'generate_prescription': float(os.environ.get('GEMINI_CACHE_TTL_PRESCRIPTION', 3600)),
+    'generate_ai_response': float(os.environ.get('GEMINI_CACHE_TTL_AI_RESPONSE', 600)),
+    'analyze_video': float(os.environ.get('GEMINI_CACHE_TTL_ANALYZE_VIDEO', 3600)),
+}
+
+def bypass_llm_cache(data=None):
+    """Whether the client asked for a fresh response (Cache-Control: no-cache or a bypass_cache field)"""
+    if 'no-cache' in request.headers.get('Cache-Control', ''):
+        return True
+    value = request.args.get('bypass_cache') or request.form.get('bypass_cache')
+    if isinstance(data, dict):
+        value = data.get('bypass_cache', value)
+    return str(value).lower() in ('1', 'true', 'yes')
+
 @app.route('/analyze', methods=['POST'])
 def analyze_emotions():
     data = request.json
@@ -224,7 +257,9 @@ def analyze_emotions():
     
     # Generate response from Gemini
     try:
-        result = generate_gemini_response(prompt)
+        result = generate_gemini_response(
+            prompt, cache_ttl=GEMINI_CACHE_TTLS['analyze'], bypass_cache=bypass_llm_cache(data), label='analyze'
+        )
         
         if "error" in result:
             return jsonify({
@@ -312,6 +347,19 @@ def predict_arrhythmia():
         image_bytes = file.read()
         print(" Image bytes read")
 
+        mode = request.form.get('mode', 'strip').lower()
+        defer = wants_deferred_analysis()
+        if mode == 'beats':
+            try:
+                duration = float(request.form.get('duration', STRIP_DURATION_SECONDS))
+            except ValueError:
+                duration = float('nan')
+            if not np.isfinite(duration) or duration <= 0:
+                return jsonify({'error': 'duration must be a positive number of seconds'}), 400
+            return jsonify(classify_ecg_beats(image_bytes, duration, defer))
+        if mode != 'strip':
+            return jsonify({'error': f"Unknown mode: {mode} (expected 'strip' or 'beats')"}), 400
+
         ecg_input = extract_signal_from_image(image_bytes)
         print(" ECG signal extracted")
 
@@ -320,24 +368,263 @@ def predict_arrhythmia():
         pred_confidence = float(prediction_probs[0][pred_class])
         print(f"Prediction: {pred_class} with confidence {pred_confidence}")
 
-        analysis = generate_cohere_analysis(ecg_input.squeeze(), pred_class,class_map)
+        signal = ecg_input.squeeze()
+        return jsonify(attach_analysis({
+            'prediction': class_map[pred_class],
+            'confidence': f"{pred_confidence * 100:.2f}%"
+        }, 'ecg', lambda: generate_cohere_analysis(signal, pred_class, class_map), defer))
+
+    except Exception as e:
+        print(f"Exception: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def classify_ecg_beats(image_bytes, duration=STRIP_DURATION_SECONDS, defer=False):
+    """Segment a strip of duration seconds into beats, classify them in one batch and summarize the rhythm"""
+    beats, peak_times = extract_beats_from_image(image_bytes, duration)
+    pred_classes, confidences, _ = classify_ecg_batch(beats)
+
+    timeline = [{
+        'beat': i + 1,
+        'time': round(float(peak_times[i]), 3),
+        'prediction': class_map[int(pred_class)],
+        'class_index': int(pred_class),
+        'confidence': f"{float(confidences[i]) * 100:.2f}%"
+    } for i, pred_class in enumerate(pred_classes)]
+
+    counts = np.bincount(pred_classes, minlength=len(class_map))
+    summary = {class_map[i]: int(count) for i, count in enumerate(counts)}
+
+    # Report the most frequent abnormal beat type, falling back to normal rhythm
+    abnormal = counts[1:]
+    summary_class = int(np.argmax(abnormal)) + 1 if abnormal.any() else 0
+    representative = beats[int(np.flatnonzero(pred_classes == summary_class)[0])].squeeze()
+    logger.info(f"Beat mode: {len(timeline)} beats, summary class {class_map[summary_class]}")
+
+    return attach_analysis({
+        'mode': 'beats',
+        'beat_count': len(timeline),
+        'heart_rate_bpm': round(60.0 * (len(peak_times) - 1) / float(peak_times[-1] - peak_times[0]), 1),
+        'prediction': class_map[summary_class],
+        'summary': summary,
+        'beats': timeline
+    }, 'ecg', lambda: generate_cohere_analysis(representative, summary_class, class_map), defer)
+
+# Batch ECG screening limits
+ECG_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'tif', 'tiff'}
+MAX_ECG_BATCH_IMAGES = int(os.environ.get('MAX_ECG_BATCH_IMAGES', 1000))
+MAX_ECG_ZIP_MEMBER_BYTES = int(os.environ.get('MAX_ECG_ZIP_MEMBER_BYTES', 20 * 1024 * 1024))
+# include_analysis narratives are synchronous LLM calls, so only the first results get one
+MAX_ECG_BATCH_NARRATIVES = int(os.environ.get('MAX_ECG_BATCH_NARRATIVES', 20))
+ECG_PREDICT_BATCH_SIZE = int(os.environ.get('ECG_PREDICT_BATCH_SIZE', 256))
+
+class TooManyImages(ValueError):
+    """More ECG images in a batch upload than MAX_ECG_BATCH_IMAGES"""
+
+def collect_ecg_images(files):
+    """
+    Read uploaded ECG images, expanding any zip archives
+
+    Zip members are counted from the archive directory before any of them is decompressed,
+    so an oversized batch is rejected without reading its images.
+
+    Args:
+        files: List of Flask FileStorage objects
+
+    Returns:
+        tuple: ([(filename, image_bytes)], {filename: error message} for skipped entries)
+
+    Raises:
+        TooManyImages: The upload holds more than MAX_ECG_BATCH_IMAGES images
+    """
+    images, skipped = [], {}
+    count = 0
+
+    def admit():
+        nonlocal count
+        count += 1
+        if count > MAX_ECG_BATCH_IMAGES:
+            raise TooManyImages(f'Too many images (maximum {MAX_ECG_BATCH_IMAGES})')
+
+    for file in files:
+        if not file or file.filename == '':
+            continue
+        if file.filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                members = []
+                for info in archive.infolist():
+                    extension = info.filename.rsplit('.', 1)[-1].lower()
+                    if info.is_dir() or extension not in ECG_IMAGE_EXTENSIONS:
+                        continue
+                    if info.file_size > MAX_ECG_ZIP_MEMBER_BYTES:
+                        skipped[info.filename] = "Image exceeds the maximum allowed size"
+                        continue
+                    admit()
+                    members.append(info)
+                images.extend((info.filename, archive.read(info)) for info in members)
+        else:
+            admit()
+            images.append((file.filename, file.read()))
+    return images, skipped
+
+def classify_ecg_batch(ecg_batch):
+    """Run one batched forward pass; returns (predicted classes, confidences, probabilities)"""
+    prediction_probs = np.asarray(model_.predict(ecg_batch, batch_size=ECG_PREDICT_BATCH_SIZE, verbose=0))
+    pred_classes = np.argmax(prediction_probs, axis=1)
+    confidences = prediction_probs[np.arange(len(pred_classes)), pred_classes]
+    return pred_classes, confidences, prediction_probs
+
+def fill_ecg_results(results, ecg_batch, indices, errors, include_analysis):
+    """
+    Classify a prepared batch into results[indices], record errors and return per-class counts
+
+    With include_analysis the first MAX_ECG_BATCH_NARRATIVES classified results get a narrative.
+    """
+    for i, error in errors.items():
+        results[i]['error'] = error
+
+    summary = {label: 0 for label in class_map.values()}
+    if len(ecg_batch):
+        pred_classes, confidences, _ = classify_ecg_batch(ecg_batch)
+        for row, i in enumerate(indices):
+            pred_class = int(pred_classes[row])
+            results[i].update({
+                'prediction': class_map[pred_class],
+                'class_index': pred_class,
+                'confidence': f"{float(confidences[row]) * 100:.2f}%"
+            })
+            summary[class_map[pred_class]] += 1
+            if include_analysis and row < MAX_ECG_BATCH_NARRATIVES:
+                results[i]['analysis'] = generate_cohere_analysis(ecg_batch[row].squeeze(), pred_class, class_map)
+    return summary
+
+@app.route('/predict_arrhythmia_batch', methods=['POST'])
+def predict_arrhythmia_batch():
+    """Classify many ECG strips (individual files and/or zip archives) in one request"""
+    try:
+        uploads = request.files.getlist('files') + request.files.getlist('file')
+        if not uploads:
+            return jsonify({'error': 'No files in the request'}), 400
+
+        try:
+            images, skipped = collect_ecg_images(uploads)
+        except TooManyImages as e:
+            return jsonify({'error': str(e)}), 400
+        if not images and not skipped:
+            return jsonify({'error': 'No ECG images found in the upload'}), 400
+
+        include_analysis = request.form.get('include_analysis', 'false').lower() == 'true'
+        logger.info(f"Batch arrhythmia request with {len(images)} images")
 
+        ecg_batch, indices, errors = extract_signals_from_images([image for _, image in images])
+        results = [{'filename': filename} for filename, _ in images]
+        summary = fill_ecg_results(results, ecg_batch, indices, errors, include_analysis)
+
+        results.extend({'filename': filename, 'error': error} for filename, error in skipped.items())
         return jsonify({
-            'prediction': class_map[pred_class],
-            'confidence': f"{pred_confidence * 100:.2f}%",
-            'analysis': analysis
+            'count': len(results),
+            'classified': len(indices),
+            'failed': len(results) - len(indices),
+            'summary': summary,
+            'results': results
         })
 
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Uploaded zip archive is corrupt'}), 400
     except Exception as e:
-        print(f"Exception: {e}")
+        logger.exception(f"Error in batch arrhythmia endpoint: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict_arrhythmia_12lead', methods=['POST'])
+def predict_arrhythmia_12lead():
+    """Split a standard 12-lead sheet into leads and classify them in one batch"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file part in the request'}), 400
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+
+        rhythm_strip = request.form.get('rhythm_strip', 'false').lower() == 'true'
+        include_analysis = request.form.get('include_analysis', 'false').lower() == 'true'
+
+        ecg_batch, leads, indices, errors = extract_leads_from_image(file.read(), rhythm_strip)
+        results = [{'lead': lead} for lead in leads]
+        summary = fill_ecg_results(results, ecg_batch, indices, errors, include_analysis)
+        logger.info(f"12-lead request: {len(indices)} of {len(leads)} leads classified")
+
+        return jsonify({
+            'count': len(results),
+            'classified': len(indices),
+            'failed': len(results) - len(indices),
+            'summary': summary,
+            'leads': results
+        })
+
+    except Exception as e:
+        logger.exception(f"Error in 12-lead arrhythmia endpoint: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict_arrhythmia_signals', methods=['POST'])
+def predict_arrhythmia_signals():
+    """
+    Classify raw ECG sample arrays without going through an image
+
+    Accepts JSON {"signals": [[...], ...], "include_analysis": false}, or multipart
+    uploads ('files'/'file') of CSV (one signal per row) or .npy arrays.
+    """
+    try:
+        if request.is_json:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Request body must be a JSON object'}), 400
+            signals = data.get('signals')
+            if signals is None and 'signal' in data:
+                signals = [data['signal']]
+            if not isinstance(signals, list) or not signals:
+                return jsonify({'error': 'Request must contain a non-empty "signals" list'}), 400
+            include_analysis = str(data.get('include_analysis', 'false')).lower() == 'true'
+            sources = [{'index': i} for i in range(len(signals))]
+        else:
+            uploads = request.files.getlist('files') + request.files.getlist('file')
+            if not uploads:
+                return jsonify({'error': 'Send JSON signals or upload CSV/NPY files'}), 400
+            include_analysis = request.form.get('include_analysis', 'false').lower() == 'true'
+            signals, sources = [], []
+            for upload in uploads:
+                try:
+                    file_signals = parse_signal_file(upload.read(), upload.filename or '')
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                signals.extend(file_signals)
+                sources.extend({'filename': upload.filename, 'row': row} for row in range(len(file_signals)))
+
+        if len(signals) > MAX_ECG_BATCH_IMAGES:
+            return jsonify({'error': f'Too many signals: {len(signals)} (maximum {MAX_ECG_BATCH_IMAGES})'}), 400
+        logger.info(f"Raw signal arrhythmia request with {len(signals)} signals")
+
+        ecg_batch, indices, errors = signals_from_samples(signals)
+        results = sources
+        summary = fill_ecg_results(results, ecg_batch, indices, errors, include_analysis)
+        return jsonify({
+            'count': len(results),
+            'classified': len(indices),
+            'failed': len(results) - len(indices),
+            'summary': summary,
+            'results': results
+        })
+
+    except Exception as e:
+        logger.exception(f"Error in raw signal arrhythmia endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 NUMERIC_FEATURES = ["Age", "RestingBP", "Cholesterol", "FastingBS", "MaxHR", "Oldpeak"]
+heart_preprocessor = HeartFailurePreprocessor(prep_info, scaler_mean, scaler_scale, encoder_categories)
 
 @app.route("/predict-heart-disease-failure", methods=["POST"])
 def predict_heart_disease_failure():
     try:
         input_data = request.get_json()
+        defer = wants_deferred_analysis(input_data)
 
         # Ensure all required fields are present
         missing = [key for key in prep_info["feature_order"] if key not in input_data]
@@ -353,23 +640,150 @@ def predict_heart_disease_failure():
         print(f"Input: {input_data}")
         print(f"Prep Info: {prep_info}")
         # Proceed with preprocessing and prediction
-        X = preprocess_input(input_data, prep_info, scaler_mean, scaler_scale, encoder_categories)
+        X = heart_preprocessor.transform(input_data)
 
         prob = float(model.predict(X, verbose=0)[0][0])
         risk = "HIGH" if prob > 0.5 else "LOW"
-        top_factors = list(input_data.keys())[:3]  # Replace with SHAP or feature importance later
-
-        analysis = generate_cohere_analysis_heart(input_data, risk, prob, top_factors)
+        explanation = explain_batch(model, heart_preprocessor, X)[0]
+        top_factors = explanation["top_factors"]
 
-        return jsonify({
+        return jsonify(attach_analysis({
             "risk": risk,
             "probability": prob,
             "top_factors": top_factors,
-            "analysis": analysis
-        })
+            "attributions": explanation["attributions"]
+        }, "heart_failure", lambda: generate_cohere_analysis_heart(input_data, risk, prob, top_factors), defer))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Bulk cohort scoring
+HEART_BULK_MAX_ROWS = int(os.environ.get('HEART_BULK_MAX_ROWS', 200000))
+HEART_BULK_BATCH_SIZE = int(os.environ.get('HEART_BULK_BATCH_SIZE', 8192))
+HEART_BULK_MAX_NARRATIVES = int(os.environ.get('HEART_BULK_MAX_NARRATIVES', 100))
+_ndjson_encoder = json.JSONEncoder(default=str)
+
+def read_heart_cohort():
+    """Parse a CSV or NDJSON cohort from an uploaded file or the raw request body"""
+    upload = request.files.get('file')
+    if upload is not None:
+        data, name, content_type = upload.read(), (upload.filename or '').lower(), upload.mimetype or ''
+    else:
+        data, name, content_type = request.get_data(), '', request.mimetype or ''
+
+    if not data.strip():
+        raise ValueError("Empty cohort upload")
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return pd.read_json(io.BytesIO(data), lines=True, dtype=False)
+    if name.endswith('.csv') or 'csv' in content_type:
+        return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, skipinitialspace=True)
+    raise ValueError("Upload a .csv or .ndjson file (or send text/csv or application/x-ndjson)")
+
+def validate_heart_cohort(df):
+    """
+    Vectorized validation of a cohort against the model's fields
+
+    Returns:
+        tuple: (model input columns by feature, {row: error message} for invalid rows)
+    """
+    columns, checks = {}, []
+    for key in NUMERIC_FEATURES:
+        values = pd.to_numeric(df[key], errors='coerce').to_numpy(dtype=np.float64)
+        checks.append((f"{key} must be numeric", ~np.isfinite(values)))
+        columns[key] = values
+    for key, allowed in VALID_VALUES.items():
+        values = df[key].astype(str).str.strip()
+        checks.append((f"{key} must be one of {allowed}", ~values.isin(allowed).to_numpy()))
+        columns[key] = values.to_numpy(dtype=object)
+
+    # Messages are only built for the rows that failed
+    invalid = np.logical_or.reduce([bad for _, bad in checks])
+    errors = {
+        int(row): "; ".join(message for message, bad in checks if bad[row])
+        for row in np.flatnonzero(invalid)
+    }
+    return columns, errors
+
+@app.route("/predict-heart-disease-failure/bulk", methods=["POST"])
+def predict_heart_disease_failure_bulk():
+    """
+    Score a cohort of patients from CSV or NDJSON and stream one NDJSON line per record
+
+    Each line is {"row", "risk", "probability"} (plus "id" when the input has an id column)
+    or {"row", "error"}. A final {"summary": ...} line closes the stream. Narratives are
+    off by default; include_analysis=true adds them for the first HEART_BULK_MAX_NARRATIVES rows.
+    explain=true adds "top_factors" and "attributions" from batched integrated gradients.
+    """
+    try:
+        df = read_heart_cohort().reset_index(drop=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    missing = [key for key in prep_info["feature_order"] if key not in df.columns]
+    if missing:
+        return jsonify({"error": f"Missing fields: {missing}"}), 400
+    if len(df) > HEART_BULK_MAX_ROWS:
+        return jsonify({"error": f"Too many records: {len(df)} (maximum {HEART_BULK_MAX_ROWS})"}), 400
+
+    include_analysis = request.args.get('include_analysis', request.form.get('include_analysis', 'false')).lower() == 'true'
+    explain = request.args.get('explain', request.form.get('explain', 'false')).lower() == 'true'
+    columns, errors = validate_heart_cohort(df)
+    ids = df['id'].tolist() if 'id' in df.columns else None
+    logger.info(f"Bulk heart-failure request: {len(df)} records, {len(errors)} invalid")
+
+    valid_rows = np.setdiff1d(np.arange(len(df)), np.fromiter(errors, dtype=np.int64, count=len(errors)))
+
+    def generate():
+        high_risk = 0
+        narratives = 0
+        for start in range(0, max(len(df), 1), HEART_BULK_BATCH_SIZE):
+            stop = min(start + HEART_BULK_BATCH_SIZE, len(df))
+            rows = valid_rows[(valid_rows >= start) & (valid_rows < stop)]
+            probs = np.empty(0)
+            explanations = []
+            if len(rows):
+                X = heart_preprocessor.transform_arrays({key: values[rows] for key, values in columns.items()})
+                probs = np.asarray(model.predict(X, batch_size=len(rows), verbose=0)).reshape(-1)
+                if explain:
+                    explanations = explain_batch(model, heart_preprocessor, X)
+                elif include_analysis and narratives < HEART_BULK_MAX_NARRATIVES:
+                    # Only the rows that still get a narrative need their top factors
+                    explanations = explain_batch(model, heart_preprocessor, X[:HEART_BULK_MAX_NARRATIVES - narratives])
+            prob_by_row = dict(zip(rows.tolist(), probs.tolist()))
+            explanation_by_row = dict(zip(rows.tolist(), explanations))
+
+            lines = []
+            for row in range(start, stop):
+                record = {"row": row}
+                if ids is not None:
+                    record["id"] = ids[row]
+                if row in errors:
+                    record["error"] = errors[row]
+                else:
+                    prob = prob_by_row[row]
+                    risk = "HIGH" if prob > 0.5 else "LOW"
+                    high_risk += risk == "HIGH"
+                    record.update({"risk": risk, "probability": prob})
+                    if explain:
+                        record.update(explanation_by_row[row])
+                    if include_analysis and row in explanation_by_row and narratives < HEART_BULK_MAX_NARRATIVES:
+                        patient = {key: df.at[row, key] for key in prep_info["feature_order"]}
+                        record["analysis"] = generate_cohere_analysis_heart(
+                            patient, risk, prob, explanation_by_row[row]["top_factors"]
+                        )
+                        narratives += 1
+                lines.append(_ndjson_encoder.encode(record))
+            if lines:
+                yield "\n".join(lines) + "\n"
+
+        yield json.dumps({"summary": {
+            "count": len(df),
+            "scored": len(valid_rows),
+            "failed": len(errors),
+            "high_risk": int(high_risk)
+        }}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route("/info", methods=["GET"])
 def info():
     return jsonify({
@@ -402,7 +816,10 @@ def generate_prescription():
     
     # Generate response from Gemini
     try:
-        prescription = generate_gemini_response(prompt)
+        prescription = generate_gemini_response(
+            prompt, cache_ttl=GEMINI_CACHE_TTLS['generate_prescription'], bypass_cache=bypass_llm_cache(data),
+            label='prescription'
+        )
         
         if "error" in prescription:
             return jsonify({
@@ -431,6 +848,175 @@ def generate_prescription():
             'error': f"Failed to generate prescription: {str(e)}",
             'generation_date': datetime.now().strftime("%Y-%m-%d")
         }), 500
+def build_chat_prompt(user_message, user_name, emotion, chat_history, conversation_id=None):
+    """Retrieve related content, compact the history into the token budget and build the chat prompt"""
+    # Retrieve relevant mental health information
+    logger.info("Retrieving similar content for user message")
+    relevant_information = retrieve_similar_content(user_message, emotion=emotion)
+    
+    # Whatever the fixed part of the prompt leaves is available for summary and history
+    base_prompt = create_chat_prompt(
+        user_name=user_name,
+        user_message=user_message,
+        chat_history=[],
+        relevant_information=relevant_information
+    )
+    history_budget = chat_history_store.CHAT_PROMPT_TOKEN_BUDGET - chat_history_store.estimate_tokens(base_prompt)
+    if not chat_history:
+        return base_prompt
+    summary, formatted_history = chat_history_store.compact_history(
+        chat_history, user_name, conversation_id=conversation_id, token_budget=max(0, history_budget)
+    )
+    logger.info(f"Chat history compacted to {len(formatted_history)} of {len(chat_history)} messages"
+                f"{' plus summary' if summary else ''}")
+    
+    # Create the chat prompt
+    logger.info("Creating chat prompt")
+    return create_chat_prompt(
+        user_name=user_name,
+        user_message=user_message,
+        chat_history=formatted_history,
+        relevant_information=relevant_information,
+        conversation_summary=summary
+    )
+
+def chat_context(data):
+    """
+    User name, prior messages and summary key for a chat request
+
+    With a session_id the history comes from the server-side session and the client sends only
+    the new message; without one the request's own chat_history is used.
+
+    Raises:
+        SessionNotFound: The session_id is unknown
+    """
+    session_id = data.get('session_id')
+    if not session_id:
+        return data.get('user_name', 'Patient'), data.get('chat_history', []), data.get('conversation_id')
+    session = chat_session_store().get(session_id)
+    if session is None:
+        raise SessionNotFound(session_id)
+    return data.get('user_name') or session['user_name'], chat_session_store().recent(session_id), session_id
+
+def record_chat_turn(data, user_message, reply):
+    """Append the user message and reply to the request's session, if it has one"""
+    session_id = data.get('session_id')
+    if not session_id:
+        return
+    try:
+        chat_session_store().append(session_id, [
+            {'sender': 'user', 'content': user_message},
+            {'sender': 'ai', 'content': reply}
+        ])
+    except Exception as e:
+        logger.error(f"Failed to record chat turn for session {session_id}: {str(e)}")
+
+def session_not_found(session_id):
+    return jsonify({
+        'error': f"Unknown chat session: {session_id}",
+        'timestamp': datetime.now().isoformat()
+    }), 404
+
+@app.route('/chat/sessions', methods=['POST'])
+def create_chat_session():
+    """Start a server-side chat session; later /chat requests send its session_id and only the new message"""
+    data = request.get_json(silent=True) or {}
+    session = chat_session_store().create(data.get('user_name') or 'Patient')
+    return jsonify({
+        'session_id': session['id'],
+        'user_name': session['user_name'],
+        'created_at': datetime.fromtimestamp(session['created_at']).isoformat()
+    }), 201
+
+@app.route('/chat/sessions/<session_id>', methods=['GET'])
+def get_chat_session(session_id):
+    """Session details and its logged messages, from the message id given as ?after= onwards"""
+    session = chat_session_store().get(session_id)
+    if session is None:
+        return session_not_found(session_id)
+    messages = chat_session_store().messages(session_id, after_id=request.args.get('after', 0, type=int))
+    return jsonify({
+        'session_id': session['id'],
+        'user_name': session['user_name'],
+        'message_count': session['message_count'],
+        'messages': [{
+            'id': msg['id'],
+            'sender': msg['sender'],
+            'content': msg['content'],
+            'timestamp': datetime.fromtimestamp(msg['created_at']).isoformat()
+        } for msg in messages]
+    })
+
+def sse_event(event, payload):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /chat as server-sent events
+
+    Sends 'token' events with the reply text as it is generated, then one 'done' event with
+    the full structured response, or an 'error' event if generation fails.
+    """
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON format', 'timestamp': datetime.now().isoformat()}), 400
+    data = request.json
+    user_message = data.get('message', '')
+    if not user_message:
+        return jsonify({'error': 'Message content is required', 'timestamp': datetime.now().isoformat()}), 400
+    try:
+        user_name, chat_history, conversation_id = chat_context(data)
+        # Prompt building needs the request context, so it runs before streaming starts
+        prompt = build_chat_prompt(user_message, user_name, data.get('emotion'), chat_history,
+                                   conversation_id=conversation_id)
+    except SessionNotFound:
+        return session_not_found(data.get('session_id'))
+    except Exception as e:
+        logger.exception(f"Exception preparing chat stream: {str(e)}")
+        # Same 200 fallback as /chat, so clients handle both endpoints alike
+        return jsonify({
+            'error': "An unexpected error occurred. Our team has been notified.",
+            'message': "I'm sorry, but I couldn't process your message due to a technical issue. Please try again in a moment.",
+            'timestamp': datetime.now().isoformat()
+        }), 200
+
+    def events():
+        streamer = JsonFieldStreamer("message")
+        chunks = []
+        try:
+            for chunk in stream_gemini_response(prompt):
+                chunks.append(chunk)
+                text = streamer.feed(chunk)
+                if text:
+                    yield sse_event('token', {'text': text})
+        except Exception as e:
+            logger.exception(f"Exception in chat stream: {str(e)}")
+            yield sse_event('error', {
+                'error': "An unexpected error occurred. Our team has been notified.",
+                'message': streamer.text or "I'm sorry, I couldn't process your message right now. Please try again later.",
+                'timestamp': datetime.now().isoformat()
+            })
+            return
+
+        result = parse_gemini_response("".join(chunks))
+        if "error" in result and not streamer.text:
+            yield sse_event('error', {
+                'error': f"Failed to generate response: {result['error']}",
+                'message': "I'm sorry, I couldn't process your message right now. Please try again later.",
+                'timestamp': datetime.now().isoformat()
+            })
+            return
+        if "error" in result:
+            result = {}
+        result['message'] = result.get('message') or streamer.text
+        result['timestamp'] = datetime.now().isoformat()
+        record_chat_turn(data, user_message, result['message'])
+        yield sse_event('done', result)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/chat', methods=['POST'])
 def chat_with_ai():
     try:
@@ -450,9 +1036,7 @@ def chat_with_ai():
         
         # Get message data
         user_message = data.get('message', '')
-        user_name = data.get('user_name', 'Patient')
         emotion = data.get('emotion', None)  # Optional detected emotion
-        chat_history = data.get('chat_history', [])  # Previous messages for context
         
         # Validate required fields
         if not user_message:
@@ -462,37 +1046,18 @@ def chat_with_ai():
                 'timestamp': datetime.now().isoformat()
             }), 400
         
-        logger.info(f"Processing message from {user_name}, chat history length: {len(chat_history)}")
-        
-        # Ensure chat history is properly formatted if provided
-        formatted_history = []
-        if chat_history:
-            # Limit history to last 10 messages to avoid token limits
-            recent_history = chat_history[-10:]
-            for msg in recent_history:
-                role = "user" if msg.get('sender') == 'user' else "assistant"
-                formatted_history.append({
-                    "role": role, 
-                    "content": msg.get('content', '')
-                })
+        # Previous messages come from the session if there is one, else from the request
+        try:
+            user_name, chat_history, conversation_id = chat_context(data)
+        except SessionNotFound:
+            return session_not_found(data.get('session_id'))
         
-        # Retrieve relevant mental health information
-        logger.info("Retrieving similar content for user message")
-        query = user_message
-        relevant_information = retrieve_similar_content(query, emotion=emotion)
-        
-        # Create the chat prompt
-        logger.info("Creating chat prompt")
-        prompt = create_chat_prompt(
-            user_name=user_name,
-            user_message=user_message,
-            chat_history=formatted_history,
-            relevant_information=relevant_information
-        )
+        logger.info(f"Processing message from {user_name}, chat history length: {len(chat_history)}")
+        prompt = build_chat_prompt(user_message, user_name, emotion, chat_history, conversation_id)
         
         # Generate response from Gemini
         logger.info("Generating response from Gemini")
-        result = generate_gemini_response(prompt)
+        result = generate_gemini_response(prompt, label='chat')
         
         if isinstance(result, dict) and "error" in result:
             logger.error(f"Gemini error: {result['error']}")
@@ -515,6 +1080,7 @@ def chat_with_ai():
             response_text = str(result.get("message", "I'm not sure how to respond to that."))
         
         logger.info("Successfully generated response")
+        record_chat_turn(data, user_message, response_text)
         return jsonify({
             'message': response_text,
             'timestamp': datetime.now().isoformat()
@@ -534,18 +1100,160 @@ def predict():
 
     try:
         input_data = request.get_json()
+        defer = wants_deferred_analysis(input_data)
 
-        prediction, diagnosis, user_df = predict_cad(input_data)
-        analysis = get_medical_analysis(diagnosis, user_df)
-        
-        return jsonify({
+        prediction, diagnosis, patient = predict_cad(input_data)
+
+        return jsonify(attach_analysis({
             'prediction_probability': float(prediction),
-            'diagnosis': diagnosis,
-            'analysis': analysis
+            'diagnosis': diagnosis
+        }, 'cad', lambda: get_medical_analysis(diagnosis, patient), defer))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+MAX_CAD_BATCH = int(os.environ.get('MAX_CAD_BATCH', 10000))
+MAX_CAD_NARRATIVES = int(os.environ.get('MAX_CAD_NARRATIVES', 20))
+
+@app.route('/predict_cad_batch', methods=['POST'])
+def predict_cad_screening():
+    """Score many CAD patients in one forward pass; narratives only when include_analysis is set"""
+    try:
+        data = request.get_json()
+        patients = data.get('patients') if isinstance(data, dict) else None
+        if not isinstance(patients, list) or not patients:
+            return jsonify({'error': 'Request must contain a non-empty "patients" list'}), 400
+        if len(patients) > MAX_CAD_BATCH:
+            return jsonify({'error': f'Too many patients: {len(patients)} (maximum {MAX_CAD_BATCH})'}), 400
+        include_analysis = bool(data.get('include_analysis', False))
+
+        results = [{'index': i} for i in range(len(patients))]
+        valid = []
+        for i, patient in enumerate(patients):
+            try:
+                if not isinstance(patient, dict):
+                    raise ValueError("Patient must be an object")
+                cad_matrix(patient)
+                valid.append(i)
+            except (ValueError, TypeError) as e:
+                results[i]['error'] = str(e)
+
+        if valid:
+            probabilities, diagnoses = predict_cad_batch([patients[i] for i in valid])
+            for row, i in enumerate(valid):
+                results[i].update({
+                    'prediction_probability': float(probabilities[row]),
+                    'diagnosis': diagnoses[row]
+                })
+                if include_analysis and row < MAX_CAD_NARRATIVES:
+                    patient = {feature: patients[i][feature] for feature in CAD_FEATURES}
+                    results[i]['analysis'] = get_medical_analysis(diagnoses[row], patient)
+
+        return jsonify({
+            'count': len(results),
+            'scored': len(valid),
+            'failed': len(results) - len(valid),
+            'results': results
         })
     except Exception as e:
+        logger.exception(f"Error in CAD batch endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics/cohere', methods=['GET'])
+def cohere_metrics():
+    """Latency, retry and in-flight statistics for the shared Cohere client"""
+    return jsonify(cohere_client.metrics())
+
+NARRATIVE_STREAM_TIMEOUT = float(os.environ.get('NARRATIVE_STREAM_TIMEOUT', 120))
+NARRATIVE_STREAM_HEARTBEAT = float(os.environ.get('NARRATIVE_STREAM_HEARTBEAT', 15))
+
+def wants_deferred_analysis(payload=None):
+    """Whether the client asked for the narrative as a background job (query, form or JSON field)"""
+    value = request.args.get('defer_analysis') or request.form.get('defer_analysis')
+    if isinstance(payload, dict):
+        value = payload.pop('defer_analysis', value)
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def attach_analysis(result, kind, generate, defer):
+    """
+    Add the narrative to a prediction, or a handle to it when it is generated in the background
+
+    Args:
+        result (dict): Prediction payload
+        kind (str): Narrative type for metrics and the job record
+        generate (Callable): Produces the narrative; must not use the request context
+        defer (bool): Return immediately with an analysis_job handle
+
+    Returns:
+        dict: result with 'analysis' (None while deferred) and, if deferred, 'analysis_job'
+    """
+    if not defer:
+        result['analysis'] = generate()
+        return result
+    try:
+        job = narrative_jobs.submit(kind, generate)
+    except Overloaded as e:
+        # Every job slot is still in progress; answer this request the synchronous way
+        logger.warning(f"Generating {kind} narrative inline: {str(e)}")
+        result['analysis'] = generate()
+        return result
+    result['analysis'] = None
+    result['analysis_job'] = {
+        'id': job.id,
+        'status': job.status,
+        'url': url_for('narrative_status', job_id=job.id),
+        'stream_url': url_for('narrative_stream', job_id=job.id)
+    }
+    return result
+
+@app.route('/narratives/<job_id>', methods=['GET'])
+def narrative_status(job_id):
+    """Status of a deferred narrative; includes the analysis once it is done"""
+    job = narrative_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired narrative job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/narratives/<job_id>/stream', methods=['GET'])
+def narrative_stream(job_id):
+    """Server-sent events: heartbeats while the narrative is generated, then one 'narrative' event"""
+    if narrative_jobs.get(job_id) is None:
+        return jsonify({'error': 'Unknown or expired narrative job'}), 404
+
+    def events():
+        waited = 0.0
+        while True:
+            job = narrative_jobs.wait(job_id, NARRATIVE_STREAM_HEARTBEAT)
+            if job is None:
+                payload = {'id': job_id, 'status': 'error', 'error': 'Narrative job expired'}
+                break
+            if job.status not in (PENDING, RUNNING):
+                payload = job.to_dict()
+                break
+            waited += NARRATIVE_STREAM_HEARTBEAT
+            if waited >= NARRATIVE_STREAM_TIMEOUT:
+                payload = job.to_dict()
+                break
+            yield ": keepalive\n\n"
+        yield sse_event('narrative', payload)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics/gemini', methods=['GET'])
+def gemini_metrics():
+    """Latency, retry, in-flight and circuit breaker statistics for the Gemini gateway, plus request coalescing"""
+    return jsonify(dict(llm_gateway.metrics(), coalescing=gemini_coalescing_metrics()))
+
+@app.route('/metrics/gemini_cache', methods=['GET'])
+def gemini_cache_stats():
+    """Hit rate and size of the Gemini response cache"""
+    return jsonify(gemini_cache_metrics())
+
+@app.route('/metrics/narrative_cache', methods=['GET'])
+def narrative_cache_metrics():
+    """Hit rate and size of the shared cardiology narrative cache"""
+    return jsonify(narrative_cache.metrics())
+
 @app.route('/feature_descriptions', methods=['GET'])
 def get_feature_info():
     return jsonify(feature_descriptions)
@@ -624,7 +1332,10 @@ def generate_ai_response():
         return jsonify({'error': 'No prompt provided'}), 400
         
     try:
-        result = generate_gemini_response(prompt)
+        result = generate_gemini_response(
+            prompt, cache_ttl=GEMINI_CACHE_TTLS['generate_ai_response'], bypass_cache=bypass_llm_cache(data),
+            label='generate_ai_response'
+        )
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -686,37 +1397,49 @@ def analyze_video_endpoint():
         video_file.save(video_path)
         logging.info(f"Video saved at: {video_path}")
 
-        audio_path = 'audio.wav'
-        ffmpeg_command = f'ffmpeg -y -i "{video_path}" -vn -acodec pcm_s16le -ar 16000 -ac 1 "{audio_path}"'
-        os.system(ffmpeg_command)
-        logging.info(f"Audio extracted to: {audio_path}")
-
-        # --- Speech-to-Text ---
-        transcribed_text = None
-        if os.path.exists(audio_path):
-            recognizer = sr.Recognizer()
-            with sr.AudioFile(audio_path) as source:
-                audio_data = recognizer.record(source)
-                try:
-                    transcribed_text = recognizer.recognize_google(audio_data)
-                    logging.info(f"Transcribed text: {transcribed_text}")
-                except sr.UnknownValueError:
-                    logging.warning("Google Speech Recognition could not understand audio")
-                    transcribed_text = "Audio not clear or no speech detected."
-                except sr.RequestError as e:
-                    logging.error(f"Could not request results from Google Speech Recognition service; {e}")
-                    transcribed_text = "Speech recognition service unavailable."
-        else:
-            logging.warning(f"Audio file not found at {audio_path} for STT.")
-            transcribed_text = "Audio extraction failed."
-        # --- End Speech-to-Text ---
-
-        from modules.combine import process_video
+        from modules.combine import process_video, render_emotion_analysis, EmotionAnalysis
         resnet_pt_path = os.path.join(os.getcwd(), "models", "resnet101_emotion_latest.pt")
         wav2vec_pt_path = os.path.join(os.getcwd(), "models", "wav2vec_emotion_model.pt")
 
-        logging.info("Processing video with emotion analysis models...")
-        emotion_analysis = process_video(video_path, resnet_pt_path, wav2vec_pt_path)
+        # Re-runs on the same recording reuse the stored face, voice and STT results
+        cache_key = analysis_cache.make_key(
+            analysis_cache.hash_file(video_path),
+            analysis_cache.model_fingerprint([resnet_pt_path, wav2vec_pt_path, EMOTION_BUNDLE_DIR], STT_BACKEND)
+        )
+        refresh_analysis = request.form.get('refresh_analysis', 'false').lower() == 'true'
+        cached_analysis = None if refresh_analysis else analysis_cache.get(cache_key)
+
+        audio_path = 'audio.wav'
+        audio_extracted = False
+        # Entries written with ANALYSIS_CACHE_STORE_TRANSCRIPTS=0 hold no transcript, so STT reruns
+        stt_result = cached_analysis.get("stt") if cached_analysis else None
+        if stt_result is None:
+            ffmpeg_command = f'ffmpeg -y -i "{video_path}" -vn -acodec pcm_s16le -ar 16000 -ac 1 "{audio_path}"'
+            os.system(ffmpeg_command)
+            audio_extracted = True
+            logging.info(f"Audio extracted to: {audio_path}")
+
+            # --- Speech-to-Text ---
+            stt_result = transcribe_audio_file(audio_path)
+            # --- End Speech-to-Text ---
+
+        if cached_analysis:
+            logging.info("Using cached emotion analysis")
+            video_result = EmotionAnalysis.from_dict(cached_analysis["emotion_analysis"])
+        else:
+            logging.info("Processing video with emotion analysis models...")
+            video_result = process_video(video_path, resnet_pt_path, wav2vec_pt_path)
+
+            # Errors, transient STT outages and partial transcripts are not cached so the next run retries them
+            if (isinstance(video_result, EmotionAnalysis) and stt_result["text"] != SERVICE_UNAVAILABLE_MESSAGE
+                    and not stt_result.get("failed_chunks")):
+                entry = {"emotion_analysis": video_result.to_dict()}
+                if analysis_cache.ANALYSIS_CACHE_STORE_TRANSCRIPTS:
+                    entry["stt"] = stt_result
+                analysis_cache.put(cache_key, entry)
+
+        transcribed_text = stt_result["text"]
+        emotion_analysis = render_emotion_analysis(video_result)
         logging.info("Video processing complete")
 
         # Use the raw emotion_analysis output for the LLM prompt
@@ -735,7 +1458,9 @@ def analyze_video_endpoint():
         )
 
         logger.info("Generating analysis from Gemini")
-        result = generate_gemini_response(prompt)
+        result = generate_gemini_response(
+            prompt, cache_ttl=GEMINI_CACHE_TTLS['analyze_video'], bypass_cache=bypass_llm_cache(), label='analyze_video'
+        )
 
         if "error" in result:
             return jsonify({
@@ -766,11 +1491,17 @@ def analyze_video_endpoint():
 
         result['timestamp'] = datetime.now().isoformat()
         result['emotion_analysis'] = emotion_analysis
+        if isinstance(video_result, EmotionAnalysis):
+            result['emotion_timeline'] = video_result.to_dict()
         result['transcribed_text'] = transcribed_text  # Optionally include in the final API response
+        result['transcript_segments'] = stt_result["segments"]
+        result['transcript_incomplete'] = bool(stt_result.get("failed_chunks"))
+        result['analysis_cached'] = bool(cached_analysis)
 
         try:
             os.remove(video_path)
-            if os.path.exists(audio_path):
+            # audio.wav is shared, so only remove the copy this request extracted
+            if audio_extracted and os.path.exists(audio_path):
                 os.remove(audio_path)
         except Exception as e:
             logger.warning(f"Error cleaning up temporary files: {str(e)}")
@@ -3,11 +3,12 @@
 import os
 import numpy as np
 import pandas as pd
-import tensorflow as tf
-import cohere
 from dotenv import load_dotenv
 from sklearn.preprocessing import StandardScaler
 from utils.heart_feature_descriptions import feature_descriptions
+from models.numpy_engine import load_inference_model, DenseModel
+from modules.cohere_client import generate_text
+from modules.narrative_cache import cached_narrative, band_profile, CAD_BANDS
 import joblib
 # Load environment variables and Cohere API key
 load_dotenv()
@@ -16,29 +17,93 @@ if not cohere_api_key:
     raise ValueError("COHERE_API_KEY not found in .env")
 
 # Load the trained model
-model = tf.keras.models.load_model("models/cad_model.keras")
+model = load_inference_model("models/cad_model.keras")
 
 
 scaler = joblib.load("models/scaler_cad.pkl")
 
+# Model input order, as the scaler was fitted
+CAD_FEATURES = list(getattr(scaler, "feature_names_in_", feature_descriptions.keys()))
+DIAGNOSIS_CAD = "Coronary Artery Disease (CAD)"
+DIAGNOSIS_NO_CAD = "No CAD"
+
+# Standard scaling is x * (1 / scale) + (-mean / scale); with the NumPy engine it is folded
+# into the first dense layer once, otherwise applied as one vectorized affine step
+_scale = 1.0 / scaler.scale_
+_shift = -scaler.mean_ * _scale
+if isinstance(model, DenseModel):
+    model.layers[0].fold_input_affine(_scale, _shift)
+    _input_affine = None
+else:
+    _input_affine = (_scale, _shift)
+
+
+def cad_matrix(patients):
+    """
+    Stack patient records into a float64 matrix in CAD_FEATURES order
+
+    Args:
+        patients (dict, list or np.ndarray): One record, a list of records, or an
+            array already in CAD_FEATURES order
+
+    Returns:
+        np.ndarray: Shape (num_patients, len(CAD_FEATURES))
+    """
+    if isinstance(patients, dict):
+        patients = [patients]
+    if isinstance(patients, np.ndarray):
+        X = np.asarray(patients, dtype=np.float64)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    rows = []
+    for patient in patients:
+        missing = [feature for feature in CAD_FEATURES if feature not in patient]
+        if missing:
+            raise ValueError(f"Missing fields: {missing}")
+        rows.append([patient[feature] for feature in CAD_FEATURES])
+    return np.asarray(rows, dtype=np.float64).reshape(-1, len(CAD_FEATURES))
+
+
+def predict_cad_batch(patients):
+    """
+    Score many patients in one forward pass
+
+    Args:
+        patients (dict, list or np.ndarray): See cad_matrix
+
+    Returns:
+        tuple: (probabilities as np.ndarray, list of diagnoses)
+    """
+    X = cad_matrix(patients)
+    if X.shape[1] != len(CAD_FEATURES):
+        raise ValueError(f"Expected {len(CAD_FEATURES)} features, got {X.shape[1]}")
+    if _input_affine is not None:
+        X = X * _input_affine[0] + _input_affine[1]
+    probabilities = np.asarray(model.predict(X, verbose=0)).reshape(-1)
+    diagnoses = [DIAGNOSIS_CAD if p > 0.5 else DIAGNOSIS_NO_CAD for p in probabilities]
+    return probabilities, diagnoses
+
 
 def predict_cad(input_data: dict):
-    
-    user_df = pd.DataFrame([input_data])
-    scaled_input = scaler.transform(user_df)
-    prediction = model.predict(scaled_input)[0][0]
-    diagnosis = "Coronary Artery Disease (CAD)" if prediction > 0.5 else "No CAD"
-    print(prediction)
-    print(diagnosis)
-    return prediction, diagnosis, user_df
-
-def get_medical_analysis(diagnosis: str, user_df: pd.DataFrame) -> str:
-    co = cohere.Client(cohere_api_key)
-
-    if diagnosis == "Coronary Artery Disease (CAD)":
+    probabilities, diagnoses = predict_cad_batch(input_data)
+    patient = {feature: input_data[feature] for feature in CAD_FEATURES}
+    return probabilities[0], diagnoses[0], patient
+
+def get_medical_analysis(diagnosis: str, patient) -> str:
+    # Accepts the patient dict from predict_cad, or a one-row DataFrame
+    if isinstance(patient, pd.DataFrame):
+        patient = patient.iloc[0].to_dict()
+
+    # Banded values, so the narrative can be shared by every patient in the same bands
+    patient = band_profile(patient, CAD_BANDS)
+    key = {"diagnosis": diagnosis, "patient": patient}
+    return cached_narrative("cad", key, lambda: _generate_cad_analysis(diagnosis, patient))
+
+def _generate_cad_analysis(diagnosis: str, patient: dict) -> str:
+    if diagnosis == DIAGNOSIS_CAD:
         prompt = f"""
         Act as a professional cardiologist. A patient with these health indicators has been predicted to have Coronary Artery Disease (CAD).
-        Patient Data: {user_df.iloc[0].to_dict()}
+        Patient Data: {patient}
 
         Please provide a concise 250-word medical analysis.
         Include the following points:
@@ -50,7 +115,7 @@ def get_medical_analysis(diagnosis: str, user_df: pd.DataFrame) -> str:
     else:
         prompt = f"""
         Act as a professional cardiologist. A patient with these health indicators has been predicted to have no Coronary Artery Disease (No CAD).
-        Patient Data: {user_df.iloc[0].to_dict()}
+        Patient Data: {patient}
 
         Please provide a concise 250-word medical analysis emphasizing the good prognosis and preventive care. Don't cold anything and response should be in formatted way.
         Include the following points:
@@ -60,12 +125,4 @@ def get_medical_analysis(diagnosis: str, user_df: pd.DataFrame) -> str:
         3. 3 suggested routine clinical follow-ups or diagnostic tests to monitor the patient's heart condition.
         """
 
-    response = co.generate(
-        model='command-r-plus',
-        prompt=prompt,
-        max_tokens=500,
-        temperature=0.8
-    )
-    model_respnose=response.generations[0].text.strip()
-
-    return model_respnose
+    return generate_text(prompt, max_tokens=500, temperature=0.8, label="cad")
@@ -2,11 +2,11 @@ import os
 import json
 import pickle
 import numpy as np
-from tensorflow.keras.models import load_model
+from models.numpy_engine import load_inference_model
 
 MODEL_DIR = "models"
 
-model = load_model(os.path.join(MODEL_DIR, "heart_disease_model.keras"))
+model = load_inference_model(os.path.join(MODEL_DIR, "heart_disease_model.keras"))
 scaler_mean = np.load(os.path.join(MODEL_DIR, "scaler_mean.npy"))
 scaler_scale = np.load(os.path.join(MODEL_DIR, "scaler_scale.npy"))
 
@@ -0,0 +1,253 @@
+"""
+NumPy Engine Module
+Inference for the small dense Keras models without TensorFlow
+
+Reads the architecture (config.json) and weights (model.weights.h5) straight out of a
+.keras archive, folds every BatchNormalization into an adjacent Dense layer, drops
+Dropout, and runs the forward pass as a handful of matrix products.
+"""
+
+import os
+import re
+import io
+import json
+import logging
+import zipfile
+import numpy as np
+import h5py
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# "numpy" serves the dense models without TensorFlow; "keras" loads them with TensorFlow
+DENSE_MODEL_ENGINE = os.environ.get("DENSE_MODEL_ENGINE", "numpy")
+
+# Layers with no effect at inference time
+_PASSTHROUGH_LAYERS = {"InputLayer", "Dropout", "GaussianNoise", "GaussianDropout", "AlphaDropout"}
+
+
+def _relu(x):
+    return np.maximum(x, 0)
+
+
+def _sigmoid(x):
+    out = np.empty_like(x)
+    positive = x >= 0
+    out[positive] = 1 / (1 + np.exp(-x[positive]))
+    exp_x = np.exp(x[~positive])
+    out[~positive] = exp_x / (1 + exp_x)
+    return out
+
+
+def _softmax(x):
+    exp_x = np.exp(x - x.max(axis=-1, keepdims=True))
+    return exp_x / exp_x.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": _relu,
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+    "softmax": _softmax,
+}
+
+
+class DenseLayer:
+    """Affine transform followed by an activation"""
+
+    def __init__(self, kernel, bias, activation="linear"):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}")
+        self.kernel = np.ascontiguousarray(kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.activation = activation
+
+    def fold_output_affine(self, scale, shift):
+        """Absorb y * scale + shift applied to this layer's linear output"""
+        if self.activation != "linear":
+            raise ValueError("An affine transform after a non-linear activation cannot be folded into its outputs")
+        self.kernel = np.ascontiguousarray(self.kernel * scale, dtype=np.float32)
+        self.bias = (self.bias * scale + shift).astype(np.float32)
+
+    def fold_input_affine(self, scale, shift):
+        """Absorb x * scale + shift applied to this layer's inputs"""
+        kernel = self.kernel.astype(np.float64)
+        self.bias = (shift @ kernel + self.bias).astype(np.float32)
+        self.kernel = np.ascontiguousarray(kernel * scale[:, None], dtype=np.float32)
+
+    def set_activation(self, activation):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}")
+        if self.activation != "linear" and activation != "linear":
+            raise ValueError("Stacked activations are not supported")
+        if activation != "linear":
+            self.activation = activation
+
+
+class DenseModel:
+    """
+    Feed-forward stack of DenseLayer objects with a Keras-compatible predict()
+
+    Args:
+        layers (list): DenseLayer objects, in order
+        name (str): Model name for logging
+    """
+
+    def __init__(self, layers, name="dense_model"):
+        self.layers = layers
+        self.name = name
+        self.input_shape = (None, layers[0].kernel.shape[0])
+        self.output_shape = (None, layers[-1].kernel.shape[1])
+
+    def predict(self, X, batch_size=None, verbose=0):
+        """Forward pass; batch_size and verbose are accepted for Keras compatibility"""
+        out = np.asarray(X, dtype=np.float32)
+        if out.ndim == 1:
+            out = out[None, :]
+        for layer in self.layers:
+            out = ACTIVATIONS[layer.activation](out @ layer.kernel + layer.bias)
+        return out
+
+    def __call__(self, X, training=False):
+        return self.predict(X)
+
+    def input_gradients(self, X, output_index=0):
+        """
+        Gradient of one output unit with respect to the inputs, for every row of X
+
+        Args:
+            X (np.ndarray): Inputs of shape (num_records, num_inputs)
+            output_index (int): Output unit to differentiate
+
+        Returns:
+            np.ndarray: Shape (num_records, num_inputs)
+        """
+        out = np.asarray(X, dtype=np.float32)
+        activations = []
+        for layer in self.layers:
+            pre = out @ layer.kernel + layer.bias
+            out = ACTIVATIONS[layer.activation](pre)
+            activations.append((pre, out))
+
+        grad = np.zeros_like(out)
+        grad[:, output_index] = 1.0
+        for layer, (pre, post) in zip(reversed(self.layers), reversed(activations)):
+            if layer.activation == "relu":
+                grad = grad * (pre > 0)
+            elif layer.activation == "sigmoid":
+                grad = grad * post * (1 - post)
+            elif layer.activation == "tanh":
+                grad = grad * (1 - post ** 2)
+            elif layer.activation == "softmax":
+                grad = post * (grad - (grad * post).sum(axis=-1, keepdims=True))
+            grad = grad @ layer.kernel.T
+        return grad
+
+
+def _snake_case(name):
+    name = re.sub(r"(.)([A-Z][a-z]+)", r"\1_\2", name)
+    return re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name).lower()
+
+
+def load_dense_model(path):
+    """
+    Load a Sequential model made of Dense, BatchNormalization, Activation and Dropout layers
+
+    Args:
+        path (str): .keras archive
+
+    Returns:
+        DenseModel: Model with BatchNormalization folded into the Dense kernels
+    """
+    with zipfile.ZipFile(path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights_file = h5py.File(io.BytesIO(archive.read("model.weights.h5")), "r")
+
+    if config.get("class_name") != "Sequential":
+        raise ValueError(f"Only Sequential models are supported, got {config.get('class_name')}")
+
+    layers = []
+    # Weight groups are named per layer class in order (dense, dense_1, ...), not by layer name
+    counters = {}
+    pending_affine = None
+    with weights_file:
+        for layer_config in config["config"]["layers"]:
+            class_name = layer_config["class_name"]
+            settings = layer_config["config"]
+            if class_name in _PASSTHROUGH_LAYERS:
+                continue
+
+            group_name = _snake_case(class_name)
+            count = counters.get(group_name, 0)
+            counters[group_name] = count + 1
+            if count:
+                group_name = f"{group_name}_{count}"
+
+            if class_name == "Dense":
+                variables = weights_file[f"layers/{group_name}/vars"]
+                kernel = variables["0"][()]
+                bias = variables["1"][()] if settings.get("use_bias", True) else np.zeros(kernel.shape[1])
+                layer = DenseLayer(kernel, bias, settings.get("activation", "linear"))
+                if pending_affine is not None:
+                    layer.fold_input_affine(*pending_affine)
+                    pending_affine = None
+                layers.append(layer)
+            elif class_name == "BatchNormalization":
+                if not layers or settings.get("axis", -1) not in (-1, 1):
+                    raise ValueError("BatchNormalization must follow a Dense layer on the feature axis")
+                variables = weights_file[f"layers/{group_name}/vars"]
+                arrays = [variables[str(i)][()] for i in range(len(variables))]
+                units = layers[-1].kernel.shape[1]
+                gamma = arrays.pop(0) if settings.get("scale", True) else np.ones(units)
+                beta = arrays.pop(0) if settings.get("center", True) else np.zeros(units)
+                moving_mean, moving_var = arrays
+                # Inference-mode BatchNormalization is the affine map x * scale + shift; computed
+                # in float64 so the folded weights round once
+                scale = np.asarray(gamma, np.float64) / np.sqrt(np.asarray(moving_var, np.float64) + settings.get("epsilon", 1e-3))
+                shift = np.asarray(beta, np.float64) - np.asarray(moving_mean, np.float64) * scale
+                if layers[-1].activation == "linear" and pending_affine is None:
+                    layers[-1].fold_output_affine(scale, shift)
+                elif pending_affine is None:
+                    # After a non-linearity, fold into the inputs of the next Dense layer instead
+                    pending_affine = (scale, shift)
+                else:
+                    pending_affine = (pending_affine[0] * scale, pending_affine[1] * scale + shift)
+            elif class_name == "Activation":
+                if pending_affine is not None:
+                    raise ValueError("Activation after a non-foldable BatchNormalization is not supported")
+                if not layers:
+                    raise ValueError("Activation before the first Dense layer is not supported")
+                layers[-1].set_activation(settings["activation"])
+            else:
+                raise ValueError(f"Unsupported layer type: {class_name}")
+
+    if pending_affine is not None:
+        # Trailing BatchNormalization after a non-linearity becomes a diagonal layer
+        scale, shift = pending_affine
+        layers.append(DenseLayer(np.diag(scale), shift))
+
+    model = DenseModel(layers, name=config["config"].get("name", "dense_model"))
+    logger.info(f"Loaded {path} into the NumPy engine ({len(layers)} dense layers)")
+    return model
+
+
+def load_inference_model(path, engine=None):
+    """
+    Load a dense .keras model with the configured engine
+
+    Args:
+        path (str): .keras archive
+        engine (str): "numpy" or "keras", defaults to DENSE_MODEL_ENGINE
+
+    Returns:
+        DenseModel or tf.keras.Model: Object with a predict(X, verbose=0) method
+    """
+    engine = engine or DENSE_MODEL_ENGINE
+    if engine == "keras":
+        import tensorflow as tf
+        return tf.keras.models.load_model(path)
+    if engine != "numpy":
+        raise ValueError(f"Unknown dense model engine: {engine}")
+    return load_dense_model(path)
@@ -0,0 +1,201 @@
+"""
+Analysis Cache Module
+Content-addressed disk cache for the face, voice and speech-to-text results of uploaded videos
+
+Entries hold patient data. They expire ANALYSIS_CACHE_TTL seconds after they were written
+(0 keeps them until evicted), and ANALYSIS_CACHE_STORE_TRANSCRIPTS=0 keeps transcripts out
+of the cache entirely so only the emotion analysis is stored.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    "ANALYSIS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "analysis_cache")
+)
+ANALYSIS_CACHE_ENABLED = os.environ.get("ANALYSIS_CACHE_ENABLED", "1") == "1"
+ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get("ANALYSIS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+ANALYSIS_CACHE_STORE_TRANSCRIPTS = os.environ.get("ANALYSIS_CACHE_STORE_TRANSCRIPTS", "1") == "1"
+
+# Bump when the emotion pipeline changes in a way that invalidates stored results
+PIPELINE_VERSION = "1"
+
+_lock = threading.Lock()
+_fingerprints: Dict[tuple, str] = {}
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 of a file without loading it into memory
+
+    Args:
+        path (str): File to hash
+        chunk_size (int): Read size in bytes
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_fingerprint(model_paths: Iterable[str], *extra: str) -> str:
+    """
+    Identify the model versions a result was produced with
+
+    Uses the name, size and modification time of every model file, so replacing
+    a model invalidates earlier entries without hashing gigabytes of weights.
+
+    Args:
+        model_paths (Iterable[str]): Model files or bundle directories
+        *extra (str): Other settings that change the result, e.g. the STT backend
+
+    Returns:
+        str: Short hex fingerprint
+    """
+    parts = [PIPELINE_VERSION, *extra]
+    for path in model_paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+            )
+        for file_path in files:
+            try:
+                stat = os.stat(file_path)
+                parts.append(f"{os.path.basename(file_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{os.path.basename(file_path)}:missing")
+
+    key = tuple(parts)
+    if key not in _fingerprints:
+        _fingerprints[key] = hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+    return _fingerprints[key]
+
+
+def make_key(video_hash: str, fingerprint: str) -> str:
+    """Cache key for a video hash and model fingerprint"""
+    return f"{video_hash}-{fingerprint}"
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _expired(written_at: float, now: float) -> bool:
+    return ANALYSIS_CACHE_TTL > 0 and now - written_at > ANALYSIS_CACHE_TTL
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached analysis, discarding it if it outlived ANALYSIS_CACHE_TTL
+
+    Args:
+        key (str): Key from make_key
+
+    Returns:
+        Optional[dict]: Stored value, or None on a miss
+    """
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+
+    path = _entry_path(key)
+    now = time.time()
+    try:
+        written_at = os.stat(path).st_mtime
+        if _expired(written_at, now):
+            logger.info(f"Analysis cache entry {key} expired")
+            _remove(path)
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Discarding unreadable analysis cache entry {key}: {e}")
+        _remove(path)
+        return None
+
+    # The access time records use for eviction; the modification time keeps the write time for expiry
+    try:
+        os.utime(path, (now, written_at))
+    except OSError:
+        pass
+    logger.info(f"Analysis cache hit for {key}")
+    return value
+
+
+def put(key: str, value: Dict[str, Any]) -> None:
+    """
+    Store an analysis, drop expired entries and evict least recently used ones beyond ANALYSIS_CACHE_MAX_BYTES
+
+    Args:
+        key (str): Key from make_key
+        value (dict): JSON-serializable result
+    """
+    if not ANALYSIS_CACHE_ENABLED:
+        return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not write analysis cache entry {key}: {e}")
+        _remove(tmp_path)
+        return
+
+    _evict()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _evict() -> None:
+    with _lock:
+        start = time.time()
+        entries = []
+        evicted = 0
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if _expired(stat.st_mtime, start):
+                        _remove(entry.path)
+                        evicted += 1
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= ANALYSIS_CACHE_MAX_BYTES:
+                break
+            _remove(path)
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} analysis cache entries in {time.time() - start:.3f} seconds")
@@ -0,0 +1,167 @@
+"""
+Cache Module
+Bounded in-memory LRU with TTL, an optional SQLite tier that survives restarts, and hit-rate metrics
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class LRUTTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after ttl seconds
+
+    Values must be JSON-serializable when a disk tier is configured. A memory miss
+    falls through to the disk tier and promotes the entry back into memory.
+
+    Args:
+        name (str): Name used in logs and metrics
+        max_entries (int): Entries kept in memory
+        ttl (float): Seconds an entry stays valid
+        disk_path (str): SQLite file for the disk tier, None for memory only
+        max_disk_entries (int): Entries kept on disk before the oldest are pruned
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: float = 3600,
+                 disk_path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._db = None
+        if disk_path:
+            try:
+                self._db = sqlite3.connect(disk_path, check_same_thread=False, timeout=5)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"{name} cache: disk tier disabled ({e})")
+                self._db = None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+            value = self._disk_get(key, now)
+            if value is not None:
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                self._memory_set(key, value[1], value[0])
+                return value[1]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value in memory and, if configured, on disk; ttl overrides the cache default"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._stats["stores"] += 1
+            self._memory_set(key, value, expires_at)
+            self._disk_set(key, value, expires_at)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any],
+                       should_cache: Callable[[Any], bool] = lambda value: True,
+                       ttl: Optional[float] = None) -> Any:
+        """
+        Cached value for key, computing and storing it on a miss
+
+        Args:
+            key (str): Cache key
+            compute (Callable): Produces the value on a miss; exceptions propagate uncached
+            should_cache (Callable): Whether a computed value may be stored, e.g. to skip errors
+            ttl (float): Lifetime of a newly stored value, defaults to the cache TTL
+
+        Returns:
+            Any: Cached or freshly computed value
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None and should_cache(value):
+            self.set(key, value, ttl)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, hit rate and current size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                disk=self._db is not None
+            )
+
+    def _memory_set(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache: disk read failed ({e})")
+            return None
+        if row is None or row[1] <= now:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key: str, value: Any, expires_at: float) -> None:
+        if self._db is None:
+            return
+        try:
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            # Prune expired rows and anything beyond the disk bound, oldest first
+            self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            )
+            self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"{self.name} cache: disk write failed ({e})")
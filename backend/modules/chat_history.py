@@ -0,0 +1,184 @@
+"""
+Chat History Module
+Compacts long chat histories: recent turns stay verbatim, older turns are folded into a
+running summary per conversation, and the result is fitted into a token budget
+
+Summaries are updated in the background, so a turn never waits on the summarizer; until
+new turns are folded in they are kept verbatim as far as the budget allows. Turns are folded
+in batches of CHAT_SUMMARY_MIN_MESSAGES, or earlier once the verbatim part no longer fits the
+budget, so most turns cost no summarizer call.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from modules.cache import LRUTTLCache
+from modules.llm_service import generate_gemini_response
+from modules.prompts import create_summary_prompt
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHAT_SUMMARIES_ENABLED = os.environ.get("CHAT_SUMMARIES_ENABLED", "1") == "1"
+# Most recent messages always sent verbatim
+CHAT_RECENT_MESSAGES = int(os.environ.get("CHAT_RECENT_MESSAGES", 6))
+# Upper bound for the whole chat prompt, in estimated tokens
+CHAT_PROMPT_TOKEN_BUDGET = int(os.environ.get("CHAT_PROMPT_TOKEN_BUDGET", 4000))
+CHAT_MESSAGE_MAX_TOKENS = int(os.environ.get("CHAT_MESSAGE_MAX_TOKENS", 400))
+# Unfolded older messages that trigger a summary update while the history still fits the budget
+CHAT_SUMMARY_MIN_MESSAGES = int(os.environ.get("CHAT_SUMMARY_MIN_MESSAGES", 8))
+CHAT_SUMMARY_MAX_WORDS = int(os.environ.get("CHAT_SUMMARY_MAX_WORDS", 200))
+CHAT_SUMMARY_TTL = float(os.environ.get("CHAT_SUMMARY_TTL", 24 * 3600))
+CHAT_SUMMARY_CACHE_SIZE = int(os.environ.get("CHAT_SUMMARY_CACHE_SIZE", 2048))
+CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", 200))
+
+summaries = LRUTTLCache("chat_summaries", max_entries=CHAT_SUMMARY_CACHE_SIZE, ttl=CHAT_SUMMARY_TTL)
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, marking the cut"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 3)].rstrip() + "..."
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """Estimated prompt cost of a verbatim message, including its role marker"""
+    return estimate_tokens(truncate_to_tokens(message["content"], CHAT_MESSAGE_MAX_TOKENS)) + 8
+
+
+def normalize_history(chat_history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Map client messages ({"sender", "content"} or {"role", "content"}) to {"role", "content"}"""
+    messages = []
+    for msg in (chat_history or [])[-CHAT_HISTORY_MAX_MESSAGES:]:
+        if not isinstance(msg, dict):
+            continue
+        sender = msg.get('sender', msg.get('role'))
+        messages.append({
+            "role": "user" if sender == "user" else "assistant",
+            "content": str(msg.get('content', ''))
+        })
+    return messages
+
+
+def conversation_key(conversation_id: str, user_name: str) -> str:
+    """Summary cache key for one conversation"""
+    return hashlib.sha256(f"{conversation_id}\x00{user_name}".encode()).hexdigest()[:32]
+
+
+def message_digest(message: Dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(message, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _unfolded(older: List[Dict[str, str]], entry: Optional[Dict[str, Any]]) -> Tuple[Optional[str], int]:
+    """
+    Cached summary and the index in older from which messages are not yet folded into it
+
+    A summary whose last folded message is not in this history belongs to other turns,
+    so it is not used and the history is summarized from the start.
+    """
+    if not entry:
+        return None, 0
+    digests = [message_digest(message) for message in older]
+    last = entry.get("last_digest")
+    # Search from the end, the folded prefix usually ends close to the recent window
+    for i in range(len(digests) - 1, -1, -1):
+        if digests[i] == last:
+            return entry.get("summary"), i + 1
+    return None, 0
+
+
+def _fold(key: str, summary: Optional[str], messages: List[Dict[str, str]], user_name: str) -> None:
+    try:
+        prompt = create_summary_prompt(user_name, summary, messages, CHAT_SUMMARY_MAX_WORDS)
+        result = generate_gemini_response(prompt, temperature=0.2, label="chat_summary")
+        new_summary = result.get("summary") if isinstance(result, dict) else None
+        if not new_summary or "error" in result:
+            logger.warning(f"Chat summary not updated: {result.get('error', 'no summary returned')}")
+            return
+        summaries.set(key, {"summary": str(new_summary), "last_digest": message_digest(messages[-1])})
+        logger.info(f"Folded {len(messages)} messages into the conversation summary")
+    except Exception as e:
+        logger.error(f"Error updating chat summary: {str(e)}")
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def schedule_fold(key: str, summary: Optional[str], messages: List[Dict[str, str]], user_name: str) -> bool:
+    """Fold messages into the summary in the background, at most one update per conversation"""
+    with _pending_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+    _executor.submit(_fold, key, summary, messages, user_name)
+    return True
+
+
+def compact_history(
+    chat_history: List[Dict[str, Any]],
+    user_name: str,
+    conversation_id: Optional[str] = None,
+    token_budget: Optional[int] = None
+) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """
+    Summary of older turns plus the verbatim messages that fit the token budget
+
+    Args:
+        chat_history (list): Messages from the client, oldest first
+        user_name (str): Name used in the summary
+        conversation_id (str): Conversation or session id the summary is cached under; without
+            one nothing is summarized and the history is only fitted to the budget
+        token_budget (int): Tokens available for summary and history together
+
+    Returns:
+        tuple: (summary or None, messages to include verbatim, oldest first)
+    """
+    messages = normalize_history(chat_history)
+    budget = CHAT_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    summary = None
+    verbatim = messages
+
+    if CHAT_SUMMARIES_ENABLED and conversation_id and len(messages) > CHAT_RECENT_MESSAGES:
+        older = messages[:-CHAT_RECENT_MESSAGES] if CHAT_RECENT_MESSAGES else messages
+        key = conversation_key(conversation_id, user_name)
+        summary, start = _unfolded(older, summaries.get(key))
+        verbatim = messages[start:]
+        if start < len(older):
+            backlog = len(older) - start
+            used = sum(message_tokens(message) for message in verbatim)
+            if summary:
+                used += estimate_tokens(truncate_to_tokens(summary, max(0, budget // 3)))
+            if backlog >= CHAT_SUMMARY_MIN_MESSAGES or used > budget:
+                schedule_fold(key, summary, older[start:], user_name)
+
+    if summary:
+        summary = truncate_to_tokens(summary, max(0, budget // 3))
+        budget -= estimate_tokens(summary)
+
+    # Newest first, so the oldest verbatim turns are the first to go
+    kept = []
+    for message in reversed(verbatim):
+        content = truncate_to_tokens(message["content"], CHAT_MESSAGE_MAX_TOKENS)
+        cost = message_tokens(message)
+        if cost > budget:
+            break
+        budget -= cost
+        kept.append({"role": message["role"], "content": content})
+    kept.reverse()
+    return summary, kept
@@ -0,0 +1,173 @@
+"""
+Chat Sessions Module
+Server-side chat sessions: an append-only SQLite message log per session, so clients send
+only the new message and the prompt context is assembled on the server
+
+The most recent messages of active sessions are also kept in memory, so a turn reads the
+database only when its session was not used since the last restart or eviction.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHAT_SESSION_DB = os.environ.get("CHAT_SESSION_DB", "chat_sessions.db")
+# Messages per session used for the prompt; older ones live on in the summary and the log
+CHAT_SESSION_CONTEXT_MESSAGES = int(os.environ.get("CHAT_SESSION_CONTEXT_MESSAGES", 200))
+CHAT_SESSION_CACHE_SIZE = int(os.environ.get("CHAT_SESSION_CACHE_SIZE", 512))
+CHAT_MESSAGE_MAX_CHARS = int(os.environ.get("CHAT_MESSAGE_MAX_CHARS", 8000))
+
+
+class SessionNotFound(KeyError):
+    """Raised for an unknown chat session id"""
+
+
+class ChatSessionStore:
+    """
+    Thread-safe chat session store on SQLite
+
+    Args:
+        db_path (str): SQLite file, or ":memory:" for a store that does not outlive the process
+        context_messages (int): Recent messages kept per session for prompt context
+        cache_size (int): Sessions whose recent messages are kept in memory
+    """
+
+    def __init__(self, db_path: str = CHAT_SESSION_DB, context_messages: int = CHAT_SESSION_CONTEXT_MESSAGES,
+                 cache_size: int = CHAT_SESSION_CACHE_SIZE):
+        self.context_messages = context_messages
+        self.cache_size = cache_size
+        self._recent: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._db.row_factory = sqlite3.Row
+        if db_path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, user_name TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, message_count INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL REFERENCES sessions(id), sender TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS messages_by_session ON messages (session_id, id);"
+        )
+        self._db.commit()
+        logger.info(f"Chat session store ready at {db_path}")
+
+    def create(self, user_name: str) -> Dict[str, Any]:
+        """
+        Start a new session
+
+        Args:
+            user_name (str): Name used in prompts for this session
+
+        Returns:
+            dict: The session with id, user_name, created_at and message_count
+        """
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (id, user_name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, user_name, now, now)
+            )
+            self._db.commit()
+            self._remember(session_id, deque(maxlen=self.context_messages))
+        return {"id": session_id, "user_name": user_name, "created_at": now, "message_count": 0}
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Session metadata, None if unknown"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, user_name, created_at, updated_at, message_count FROM sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """
+        Append messages to a session's log in one transaction
+
+        Args:
+            session_id (str): Session to append to
+            messages (list): {"sender": "user" | "ai", "content": str} dicts, oldest first
+
+        Raises:
+            SessionNotFound: The session does not exist
+        """
+        now = time.time()
+        rows = [(session_id, msg["sender"], str(msg["content"])[:CHAT_MESSAGE_MAX_CHARS], now) for msg in messages]
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE sessions SET updated_at = ?, message_count = message_count + ? WHERE id = ?",
+                (now, len(rows), session_id)
+            ).rowcount
+            if not updated:
+                self._db.rollback()
+                raise SessionNotFound(session_id)
+            self._db.executemany(
+                "INSERT INTO messages (session_id, sender, content, created_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+            recent = self._recent.get(session_id)
+            if recent is not None:
+                recent.extend({"sender": row[1], "content": row[2]} for row in rows)
+
+    def recent(self, session_id: str) -> List[Dict[str, str]]:
+        """
+        The last context_messages messages of a session, oldest first
+
+        Raises:
+            SessionNotFound: The session does not exist
+        """
+        with self._lock:
+            recent = self._recent.get(session_id)
+            if recent is None:
+                if not self._db.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone():
+                    raise SessionNotFound(session_id)
+                rows = self._db.execute(
+                    "SELECT sender, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                    (session_id, self.context_messages)
+                ).fetchall()
+                recent = deque(({"sender": row["sender"], "content": row["content"]} for row in reversed(rows)),
+                               maxlen=self.context_messages)
+            self._remember(session_id, recent)
+            return list(recent)
+
+    def messages(self, session_id: str, after_id: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """Logged messages with their ids, for clients restoring a conversation"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, sender, content, created_at FROM messages WHERE session_id = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (session_id, after_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _remember(self, session_id: str, recent: deque) -> None:
+        self._recent[session_id] = recent
+        self._recent.move_to_end(session_id)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+
+_store: Optional[ChatSessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ChatSessionStore:
+    """Shared store, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChatSessionStore()
+    return _store
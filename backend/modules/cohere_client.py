@@ -0,0 +1,152 @@
+"""
+Cohere Client Module
+One shared Cohere client for the cardiology narratives, with a pooled HTTP connection,
+per-call deadlines, jittered retries, an in-flight cap and latency metrics
+
+Point COHERE_BASE_URL at a local stand-in server to exercise it without the real API.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Optional, Sequence, Dict, Any
+
+import httpx
+import cohere
+from cohere.core.api_error import ApiError
+from dotenv import load_dotenv
+
+from modules.resilience import Deadline, ConcurrencyLimiter, LatencyRecorder, retry_call
+
+load_dotenv()
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+COHERE_MODEL = os.environ.get("COHERE_MODEL", "command-r-plus")
+COHERE_BASE_URL = os.environ.get("COHERE_BASE_URL") or None
+COHERE_TIMEOUT = float(os.environ.get("COHERE_TIMEOUT", 30))
+COHERE_CONNECT_TIMEOUT = float(os.environ.get("COHERE_CONNECT_TIMEOUT", 5))
+COHERE_MAX_RETRIES = int(os.environ.get("COHERE_MAX_RETRIES", 2))
+COHERE_MAX_IN_FLIGHT = int(os.environ.get("COHERE_MAX_IN_FLIGHT", 8))
+COHERE_QUEUE_TIMEOUT = float(os.environ.get("COHERE_QUEUE_TIMEOUT", 5))
+
+# Rate limits and server-side failures are worth another attempt; other 4xx are not
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_client: Optional[cohere.Client] = None
+_client_lock = threading.Lock()
+limiter = ConcurrencyLimiter(COHERE_MAX_IN_FLIGHT, COHERE_QUEUE_TIMEOUT)
+latency = LatencyRecorder()
+
+
+def get_client() -> cohere.Client:
+    """Shared client; its httpx pool keeps connections to the API alive between requests"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    timeout=httpx.Timeout(COHERE_TIMEOUT, connect=COHERE_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=COHERE_MAX_IN_FLIGHT,
+                        max_keepalive_connections=COHERE_MAX_IN_FLIGHT
+                    )
+                )
+                _client = cohere.Client(
+                    api_key=os.environ.get("COHERE_API_KEY"),
+                    base_url=COHERE_BASE_URL,
+                    timeout=COHERE_TIMEOUT,
+                    httpx_client=http_client
+                )
+                logger.info(f"Created shared Cohere client ({COHERE_BASE_URL or 'default endpoint'})")
+    return _client
+
+
+def reset_client() -> None:
+    """Drop the shared client so the next call builds a new one (e.g. after changing settings)"""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, ApiError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def generate_text(
+    prompt: str,
+    *,
+    max_tokens: int,
+    temperature: float,
+    stop_sequences: Optional[Sequence[str]] = None,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    label: str = "generate"
+) -> str:
+    """
+    Generate text with the shared client
+
+    Args:
+        prompt (str): Prompt text
+        max_tokens (int): Generation limit
+        temperature (float): Sampling temperature
+        stop_sequences (Sequence[str]): Optional stop sequences
+        model (str): Model name, defaults to COHERE_MODEL
+        timeout (float): Deadline in seconds for the whole call including retries
+        label (str): Metrics label, e.g. the calling endpoint
+
+    Returns:
+        str: Generated text, stripped
+
+    Raises:
+        Overloaded: COHERE_MAX_IN_FLIGHT calls are busy for longer than COHERE_QUEUE_TIMEOUT
+        DeadlineExceeded: The deadline ran out between attempts
+        Exception: The last API or transport error
+    """
+    client = get_client()
+    start = time.monotonic()
+    deadline = Deadline(timeout or COHERE_TIMEOUT)
+    attempts = 0
+    kwargs: Dict[str, Any] = {"model": model or COHERE_MODEL, "prompt": prompt,
+                              "max_tokens": max_tokens, "temperature": temperature}
+    if stop_sequences:
+        kwargs["stop_sequences"] = list(stop_sequences)
+
+    def attempt(remaining: float) -> str:
+        nonlocal attempts
+        attempts += 1
+        response = client.generate(
+            **kwargs,
+            request_options={"timeout_in_seconds": max(1, int(remaining)), "max_retries": 0}
+        )
+        return response.generations[0].text.strip()
+
+    ok = False
+    try:
+        with limiter:
+            text = retry_call(
+                attempt,
+                deadline=deadline,
+                max_retries=COHERE_MAX_RETRIES,
+                is_retryable=is_retryable,
+                label=f"Cohere {label}"
+            )
+        ok = True
+        return text
+    finally:
+        latency.record(label, time.monotonic() - start, ok, retries=max(0, attempts - 1))
+
+
+def metrics() -> Dict[str, Any]:
+    """Latency per label plus the current in-flight and rejected counts"""
+    return {
+        "latency": latency.snapshot(),
+        "in_flight": limiter.in_flight,
+        "max_in_flight": limiter.max_in_flight,
+        "rejected": limiter.rejected
+    }
@@ -1,21 +1,46 @@
 import cv2
 import librosa
+import logging
+import threading
 import numpy as np
 import torch
-import torchvision.transforms as transforms
 from torchvision.models import resnet101
 from transformers import Wav2Vec2Processor, Wav2Vec2ForSequenceClassification
 from mtcnn import MTCNN
+from modules.model_bundle import EMOTION_BUNDLE_DIR, bundle_exists, load_emotion_bundle
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
 import warnings
 
 warnings.filterwarnings("ignore")
+logger = logging.getLogger(__name__)
 
 # Define emotion classes (same for both models)
 EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
 
 
+# Models are loaded once per worker process and reused across requests
+_loaded_models = {}
+_models_lock = threading.Lock()
+
+
+# Load pre-trained models, preferring the local safetensors bundle over the .pt files
+def load_models(resnet_pt_path, wav2vec_pt_path, bundle_dir=EMOTION_BUNDLE_DIR):
+    key = (resnet_pt_path, wav2vec_pt_path, bundle_dir)
+    with _models_lock:
+        if key not in _loaded_models:
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            if bundle_exists(bundle_dir):
+                print(f"Loading emotion models from bundle {bundle_dir}...")
+                resnet, wav2vec, wav2vec_processor = load_emotion_bundle(bundle_dir, len(EMOTIONS), device)
+                _loaded_models[key] = (resnet, wav2vec, wav2vec_processor, device)
+            else:
+                _loaded_models[key] = load_pt_models(resnet_pt_path, wav2vec_pt_path, device)
+        return _loaded_models[key]
+
+
 # Load pre-trained models from .pt files
-def load_models(resnet_pt_path, wav2vec_pt_path):
+def load_pt_models(resnet_pt_path, wav2vec_pt_path, device):
     print("Starting to load models...")
     # ResNet101 for facial emotions
     print("Loading ResNet101 model...")
@@ -24,7 +49,6 @@ def load_models(resnet_pt_path, wav2vec_pt_path):
     resnet.fc = torch.nn.Linear(num_ftrs, len(EMOTIONS))  # 7 emotions
     resnet.load_state_dict(torch.load(resnet_pt_path, map_location=torch.device('cpu')))
     resnet.eval()
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     resnet.to(device)
     print(f"ResNet101 loaded and moved to {device}")
 
@@ -56,15 +80,39 @@ def load_models(resnet_pt_path, wav2vec_pt_path):
     print("Model loading complete.")
     return resnet, wav2vec, wav2vec_processor, device
 
-# Preprocess image for ResNet101
-def preprocess_image(image):
-    transform = transforms.Compose([
-        transforms.ToPILImage(),
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-    return transform(image).unsqueeze(0)
+# ResNet101 input size and the ImageNet normalization it was trained with
+FACE_INPUT_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+FACE_BATCH_SIZE = 32
+
+# ToTensor() + Normalize() folded into one multiply-subtract over the whole batch
+_FACE_SCALE = torch.from_numpy(1.0 / (255.0 * IMAGENET_STD)).view(1, 3, 1, 1)
+_FACE_SHIFT = torch.from_numpy(IMAGENET_MEAN / IMAGENET_STD).view(1, 3, 1, 1)
+
+def _face_interpolation(length, size):
+    # PIL's bilinear Resize antialiases when shrinking; INTER_AREA is the closest cv2 match there,
+    # while INTER_LINEAR matches it when enlarging
+    return cv2.INTER_AREA if length > size else cv2.INTER_LINEAR
+
+# Preprocess face crops for ResNet101
+def preprocess_faces(faces, size=FACE_INPUT_SIZE):
+    """Resize RGB face crops into a preallocated uint8 batch and normalize it in one step.
+
+    Returns a float32 tensor of shape (num_faces, 3, size, size).
+    """
+    batch = np.empty((len(faces), size, size, 3), dtype=np.uint8)
+    for i, face in enumerate(faces):
+        height, width = face.shape[:2]
+        if (height > size) != (width > size):
+            # Shrinks along one axis and grows along the other: resize each axis with its own mode
+            face = cv2.resize(face, (size, height), interpolation=_face_interpolation(width, size))
+            width = size
+        cv2.resize(face, (size, size), dst=batch[i], interpolation=_face_interpolation(max(height, width), size))
+    # A single copy does the HWC -> CHW transpose and the uint8 -> float32 cast together
+    tensor = torch.empty((len(faces), 3, size, size), dtype=torch.float32)
+    tensor.copy_(torch.from_numpy(batch).permute(0, 3, 1, 2))
+    return tensor.mul_(_FACE_SCALE).sub_(_FACE_SHIFT)
 
 # Preprocess audio for Wav2Vec
 def preprocess_audio(audio, sample_rate=16000):
@@ -106,19 +154,20 @@ def extract_video_data(video_path, frame_rate=1):
     print(f"Audio extracted, Sample rate: {sr} Hz, Duration: {len(audio)/sr:.2f} seconds")
     return frames, audio, sr
 # Get emotion probabilities from ResNet101
-def get_facial_emotions(resnet, frames, device):
+def get_facial_emotions(resnet, frames, device, batch_size=FACE_BATCH_SIZE):
     print("Processing facial emotions with ResNet101...")
     probabilities = []
-    for i, frame in enumerate(frames):
-        input_tensor = preprocess_image(frame).to(device)
-        with torch.no_grad():
+    with torch.no_grad():
+        for start in range(0, len(frames), batch_size):
+            input_tensor = preprocess_faces(frames[start:start + batch_size]).to(device)
             output = resnet(input_tensor)
-            probs = torch.softmax(output, dim=1).cpu().numpy()[0]
-            probabilities.append(probs)
-            dominant_emotion = EMOTIONS[np.argmax(probs)]
-            print(f"Frame {i+1}/{len(frames)}: Dominant emotion = {dominant_emotion} ({max(probs)*100:.1f}%)")
+            probabilities.append(torch.softmax(output, dim=1).cpu().numpy())
+    probabilities = np.concatenate(probabilities) if probabilities else np.empty((0, len(EMOTIONS)))
+    for i, probs in enumerate(probabilities):
+        dominant_emotion = EMOTIONS[np.argmax(probs)]
+        print(f"Frame {i+1}/{len(frames)}: Dominant emotion = {dominant_emotion} ({max(probs)*100:.1f}%)")
     print(f"Facial emotion processing complete. Total frames analyzed: {len(probabilities)}")
-    return np.array(probabilities)  # Shape: (num_frames, 7)
+    return probabilities  # Shape: (num_frames, 7)
 
 # Get emotion probabilities from Wav2Vec
 def get_voice_emotions(wav2vec, processor, audio, sr, device, segment_length=2):
@@ -146,107 +195,226 @@ def get_voice_emotions(wav2vec, processor, audio, sr, device, segment_length=2):
     print(f"Voice emotion processing complete. Total segments analyzed: {len(probabilities)}")
     return np.array(probabilities)  # Shape: (num_segments, 7)
 
+# Mental health thresholds on the session-average probabilities
+LOW_MOOD_SAD_THRESHOLD = 0.5
+LOW_MOOD_SAD_NEUTRAL_THRESHOLD = 0.7
+ANXIETY_THRESHOLD = 0.4
+POSITIVE_THRESHOLD = 0.6
+REACTIVITY_THRESHOLD = 0.4
+VARIABILITY_THRESHOLD = 15  # Percent standard deviation across segments
+
+ANALYSIS_DISCLAIMER = "Note: This is not a clinical diagnosis. Consult a mental health professional."
+
+
+@dataclass
+class EmotionInsight:
+    """A single finding from the aggregation; message is the human-readable rendering"""
+    kind: str
+    message: str
+    score: float
+    time: Optional[float] = None
+
+
+@dataclass
+class EmotionTimeline:
+    """Per-segment emotion timeline; every array has one row per segment"""
+    start: np.ndarray          # Segment start times in seconds
+    end: np.ndarray            # Segment end times in seconds
+    probabilities: np.ndarray  # (num_segments, len(EMOTIONS)) combined probabilities
+    dominant: np.ndarray       # Index into EMOTIONS of each segment's dominant emotion
+    confidence: np.ndarray     # Probability of the dominant emotion
+
+    def trend_lines(self) -> List[str]:
+        return [
+            f"[{start:.1f}s - {end:.1f}s]: {EMOTIONS[idx].capitalize()} ({conf*100:.1f}%)"
+            for start, end, idx, conf in zip(self.start, self.end, self.dominant, self.confidence)
+        ]
+
+
+@dataclass
+class EmotionAnalysis:
+    """Structured output of process_video"""
+    timeline: EmotionTimeline
+    changes: List[EmotionInsight]
+    emotion_scores: Dict[str, float]
+    insights: List[EmotionInsight]
+
+    def to_text(self) -> str:
+        """Render the report text used in LLM prompts and shown to clinicians"""
+        output = "Temporal Emotion Trends:\n"
+        for trend in self.timeline.trend_lines():
+            output += f"- {trend}\n"
+        if self.changes:
+            output += "\nNotable Changes:\n"
+            for change in self.changes:
+                output += f"- {change.message}\n"
+
+        output += "\nEmotion Scores (Average):\n"
+        for emotion, score in self.emotion_scores.items():
+            output += f"{emotion.capitalize()}: {score*100:.1f}%\n"
+
+        output += "\nMental Health Insights:\n"
+        for insight in self.insights:
+            output += f"- {insight.message}\n"
+
+        output += f"\n{ANALYSIS_DISCLAIMER}"
+        return output
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form of the analysis"""
+        return {
+            "emotions": list(EMOTIONS),
+            "timeline": {
+                "start": self.timeline.start.tolist(),
+                "end": self.timeline.end.tolist(),
+                "probabilities": self.timeline.probabilities.tolist(),
+                "dominant": [EMOTIONS[idx] for idx in self.timeline.dominant],
+                "confidence": self.timeline.confidence.tolist(),
+            },
+            "changes": [asdict(change) for change in self.changes],
+            "emotion_scores": dict(self.emotion_scores),
+            "insights": [asdict(insight) for insight in self.insights],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EmotionAnalysis":
+        timeline = data["timeline"]
+        return cls(
+            timeline=EmotionTimeline(
+                start=np.asarray(timeline["start"], dtype=np.float64),
+                end=np.asarray(timeline["end"], dtype=np.float64),
+                probabilities=np.asarray(timeline["probabilities"], dtype=np.float64).reshape(-1, len(EMOTIONS)),
+                dominant=np.asarray([EMOTIONS.index(e) for e in timeline["dominant"]], dtype=np.int64),
+                confidence=np.asarray(timeline["confidence"], dtype=np.float64),
+            ),
+            changes=[EmotionInsight(**change) for change in data["changes"]],
+            emotion_scores={k: float(v) for k, v in data["emotion_scores"].items()},
+            insights=[EmotionInsight(**insight) for insight in data["insights"]],
+        )
+
+
+def render_emotion_analysis(analysis) -> str:
+    """Text form of a process_video result; error results are already plain strings"""
+    if isinstance(analysis, EmotionAnalysis):
+        return analysis.to_text()
+    return analysis if isinstance(analysis, str) else str(analysis)
+
+
 # Combine facial and voice probabilities
 def combine_probabilities(face_probs, voice_probs, video_duration, frame_rate=1, segment_length=2):
-    print("Combining facial and voice emotion probabilities...")
+    """Average face frames into voice-length segments and blend them with the voice probabilities.
+
+    Returns an array of shape (num_segments, len(EMOTIONS)).
+    """
+    face_probs = np.asarray(face_probs, dtype=np.float64).reshape(-1, len(EMOTIONS))
+    voice_probs = np.asarray(voice_probs, dtype=np.float64).reshape(-1, len(EMOTIONS))
     num_frames = len(face_probs)
     num_segments = len(voice_probs)
-    print(f"Face probabilities: {num_frames} frames, Voice probabilities: {num_segments} segments")
-
     frames_per_segment = int(frame_rate * segment_length)
-    combined_probs = []
-
-    for i in range(min(num_segments, (num_frames // frames_per_segment) + 1)):
-        start_frame = i * frames_per_segment
-        end_frame = min((i + 1) * frames_per_segment, num_frames)
-        if end_frame > start_frame:
-            face_segment_probs = np.mean(face_probs[start_frame:end_frame], axis=0)
-        else:
-            face_segment_probs = face_probs[start_frame] if start_frame < num_frames else np.zeros(len(EMOTIONS))
-        voice_segment_probs = voice_probs[i] if i < num_segments else np.zeros(len(EMOTIONS))
+    count = min(num_segments, (num_frames // frames_per_segment) + 1)
 
-        combined = (face_segment_probs + voice_segment_probs) / 2
-        combined_probs.append(combined)
-        dominant_emotion = EMOTIONS[np.argmax(combined)]
-        print(f"Segment {i+1}: Combined dominant emotion = {dominant_emotion} ({max(combined)*100:.1f}%)")
+    # Pool frames per segment with one reshape-sum; segments past the last frame pool to zeros
+    padded = np.zeros((count * frames_per_segment, len(EMOTIONS)))
+    used = min(num_frames, len(padded))
+    padded[:used] = face_probs[:used]
+    frame_counts = np.clip(num_frames - np.arange(count) * frames_per_segment, 0, frames_per_segment)
+    face_segment_probs = padded.reshape(count, frames_per_segment, -1).sum(axis=1)
+    face_segment_probs /= np.maximum(frame_counts, 1)[:, None]
 
-    print(f"Probability combination complete. Total combined segments: {len(combined_probs)}")
-    return np.array(combined_probs)  # Shape: (num_segments, 7)
+    combined_probs = (face_segment_probs + voice_probs[:count]) / 2
+    logger.debug(f"Combined {num_frames} face frames and {num_segments} voice segments into {count} segments")
+    return combined_probs  # Shape: (num_segments, 7)
 
 # Analyze temporal trends in emotions
 def analyze_temporal_trends(combined_probs, segment_length=2):
-    print("Analyzing temporal emotion trends...")
-    trends = []
-    dominant_emotions = []
-
-    for i, probs in enumerate(combined_probs):
-        time_start = i * segment_length
-        time_end = (i + 1) * segment_length
-        max_prob = np.max(probs)
-        dominant_emotion = EMOTIONS[np.argmax(probs)]
-        dominant_emotions.append((time_start, time_end, dominant_emotion, max_prob))
-        trend = f"[{time_start:.1f}s - {time_end:.1f}s]: {dominant_emotion.capitalize()} ({max_prob*100:.1f}%)"
-        trends.append(trend)
-        print(f"Trend for segment {i+1}: {trend}")
+    """Build the segment timeline and detect emotion shifts and high variability.
+
+    Returns (EmotionTimeline, List[EmotionInsight]).
+    """
+    combined_probs = np.asarray(combined_probs, dtype=np.float64).reshape(-1, len(EMOTIONS))
+    starts = np.arange(len(combined_probs), dtype=np.float64) * segment_length
+    dominant = np.argmax(combined_probs, axis=1)
+    timeline = EmotionTimeline(
+        start=starts,
+        end=starts + segment_length,
+        probabilities=combined_probs,
+        dominant=dominant,
+        confidence=np.max(combined_probs, axis=1) if len(combined_probs) else np.empty(0),
+    )
 
     changes = []
-    for i in range(1, len(dominant_emotions)):
-        prev_emotion = dominant_emotions[i-1][2]
-        curr_emotion = dominant_emotions[i][2]
-        if prev_emotion != curr_emotion:
-            time = dominant_emotions[i][0]
-            change = f"Emotion shift from {prev_emotion.capitalize()} to {curr_emotion.capitalize()} at {time:.1f}s"
-            changes.append(change)
-            print(change)
-
-    sad_std = np.std(combined_probs[:, EMOTIONS.index('sad')]) * 100
-    happy_std = np.std(combined_probs[:, EMOTIONS.index('happy')]) * 100
-    if sad_std > 15:
-        change = f"High variability in sadness ({sad_std:.1f}%)"
-        changes.append(change)
-        print(change)
-    if happy_std > 15:
-        change = f"High variability in happiness ({happy_std:.1f}%)"
-        changes.append(change)
-        print(change)
-
-    print("Temporal trend analysis complete.")
-    return trends, changes
+    for i in np.flatnonzero(dominant[1:] != dominant[:-1]) + 1:
+        prev_emotion = EMOTIONS[dominant[i - 1]]
+        curr_emotion = EMOTIONS[dominant[i]]
+        changes.append(EmotionInsight(
+            kind="emotion_shift",
+            message=f"Emotion shift from {prev_emotion.capitalize()} to {curr_emotion.capitalize()} at {starts[i]:.1f}s",
+            score=float(timeline.confidence[i]),
+            time=float(starts[i]),
+        ))
+
+    stds = np.std(combined_probs, axis=0) * 100
+    for emotion, label in (("sad", "sadness"), ("happy", "happiness")):
+        emotion_std = float(stds[EMOTIONS.index(emotion)])
+        if emotion_std > VARIABILITY_THRESHOLD:
+            changes.append(EmotionInsight(
+                kind=f"{emotion}_variability",
+                message=f"High variability in {label} ({emotion_std:.1f}%)",
+                score=emotion_std / 100,
+            ))
+
+    logger.debug(f"Temporal trend analysis found {len(changes)} notable changes")
+    return timeline, changes
 
 # Map emotions to mental health indicators
 def map_to_mental_health(combined_probs):
-    print("Mapping emotions to mental health indicators...")
+    """Map the session-average probabilities to mental health insights.
+
+    Returns (emotion_scores dict, List[EmotionInsight]).
+    """
     avg_probs = np.mean(combined_probs, axis=0)
-    emotion_scores = dict(zip(EMOTIONS, avg_probs))
+    emotion_scores = {emotion: float(score) for emotion, score in zip(EMOTIONS, avg_probs)}
 
     mental_health_insights = []
 
-    if emotion_scores['sad'] > 0.5 or (emotion_scores['sad'] + emotion_scores['neutral']) > 0.7:
-        insight = f"Potential low mood detected ({emotion_scores['sad']*100:.1f}% sadness)"
-        mental_health_insights.append(insight)
-        print(insight)
-
-    if emotion_scores['fear'] > 0.4 or emotion_scores['angry'] > 0.4:
-        insight = f"Potential anxiety detected ({max(emotion_scores['fear'], emotion_scores['angry'])*100:.1f}% confidence)"
-        mental_health_insights.append(insight)
-        print(insight)
-
-    if emotion_scores['happy'] > 0.6:
-        insight = f"Positive mental state detected ({emotion_scores['happy']*100:.1f}% happiness)"
-        mental_health_insights.append(insight)
-        print(insight)
-
-    if emotion_scores['surprise'] > 0.4:
-        insight = f"Possible emotional reactivity detected ({emotion_scores['surprise']*100:.1f}% surprise)"
-        mental_health_insights.append(insight)
-        print(insight)
+    if emotion_scores['sad'] > LOW_MOOD_SAD_THRESHOLD or \
+            (emotion_scores['sad'] + emotion_scores['neutral']) > LOW_MOOD_SAD_NEUTRAL_THRESHOLD:
+        mental_health_insights.append(EmotionInsight(
+            kind="low_mood",
+            message=f"Potential low mood detected ({emotion_scores['sad']*100:.1f}% sadness)",
+            score=emotion_scores['sad'],
+        ))
+
+    if emotion_scores['fear'] > ANXIETY_THRESHOLD or emotion_scores['angry'] > ANXIETY_THRESHOLD:
+        anxiety_score = max(emotion_scores['fear'], emotion_scores['angry'])
+        mental_health_insights.append(EmotionInsight(
+            kind="anxiety",
+            message=f"Potential anxiety detected ({anxiety_score*100:.1f}% confidence)",
+            score=anxiety_score,
+        ))
+
+    if emotion_scores['happy'] > POSITIVE_THRESHOLD:
+        mental_health_insights.append(EmotionInsight(
+            kind="positive",
+            message=f"Positive mental state detected ({emotion_scores['happy']*100:.1f}% happiness)",
+            score=emotion_scores['happy'],
+        ))
+
+    if emotion_scores['surprise'] > REACTIVITY_THRESHOLD:
+        mental_health_insights.append(EmotionInsight(
+            kind="reactivity",
+            message=f"Possible emotional reactivity detected ({emotion_scores['surprise']*100:.1f}% surprise)",
+            score=emotion_scores['surprise'],
+        ))
 
     if not mental_health_insights:
-        insight = "No clear mental health indicators detected."
-        mental_health_insights.append(insight)
-        print(insight)
+        mental_health_insights.append(EmotionInsight(
+            kind="none",
+            message="No clear mental health indicators detected.",
+            score=0.0,
+        ))
 
-    print("Mental health mapping complete.")
+    logger.debug(f"Mental health mapping produced {len(mental_health_insights)} insights")
     return emotion_scores, mental_health_insights
 
 # Main function to process a video
@@ -278,29 +446,15 @@ def process_video(video_path, resnet_pt_path, wav2vec_pt_path):
     combined_probs = combine_probabilities(face_probs, voice_probs, video_duration)
 
     print("Analyzing temporal trends...")
-    trends, changes = analyze_temporal_trends(combined_probs)
+    timeline, changes = analyze_temporal_trends(combined_probs)
 
     print("Mapping to mental health insights...")
     emotion_scores, mental_health_insights = map_to_mental_health(combined_probs)
-
-    print("Generating final output...")
-    output = "Temporal Emotion Trends:\n"
-    for trend in trends:
-        output += f"- {trend}\n"
-    if changes:
-        output += "\nNotable Changes:\n"
-        for change in changes:
-            output += f"- {change}\n"
-
-    output += "\nEmotion Scores (Average):\n"
-    for emotion, score in emotion_scores.items():
-        output += f"{emotion.capitalize()}: {score*100:.1f}%\n"
-
-    output += "\nMental Health Insights:\n"
-    for insight in mental_health_insights:
-        output += f"- {insight}\n"
-
-    output += "\nNote: This is not a clinical diagnosis. Consult a mental health professional."
     print("Video processing complete.")
 
-    return output
\ No newline at end of file
+    return EmotionAnalysis(
+        timeline=timeline,
+        changes=changes,
+        emotion_scores=emotion_scores,
+        insights=mental_health_insights
+    )
@@ -0,0 +1,151 @@
+"""
+JSON Stream Module
+Incrementally extracts one top-level string field from JSON that arrives in chunks,
+so a streamed model response can be shown to the user before the JSON is complete
+"""
+
+import json
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JsonFieldStreamer:
+    """
+    Decode the value of a top-level string field while its JSON is still being received
+
+    Text outside the outer object (e.g. a ```json fence) is ignored, and escape sequences
+    split across chunks, including surrogate pairs, are decoded once complete.
+
+    Args:
+        field (str): Top-level key whose string value is extracted
+    """
+
+    def __init__(self, field: str = "message"):
+        self.field = field
+        self.text = ""
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._is_key = False
+        self._expect_key = False
+        self._await_value = False
+        self._capturing = False
+        self._key = []
+        self._last_key = None
+        self._escape = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consume the next chunk of JSON text
+
+        Args:
+            chunk (str): Next piece of the response
+
+        Returns:
+            str: Newly decoded characters of the field value (may be empty)
+        """
+        out = []
+        for ch in chunk:
+            if self._capturing:
+                self._capture(ch, out)
+            elif self._in_string:
+                self._skip_string(ch)
+            else:
+                self._structure(ch)
+        piece = "".join(out)
+        self.text += piece
+        return piece
+
+    def _structure(self, ch: str) -> None:
+        if ch == '"':
+            self._in_string = True
+            self._is_key = self._expect_key and self._depth == 1
+            self._capturing = (self._await_value and self._depth == 1 and not self.done
+                               and self._last_key == self.field)
+            self._key = []
+            self._expect_key = False
+            self._await_value = False
+        elif ch in "{[":
+            self._depth += 1
+            self._expect_key = ch == "{" and self._depth == 1
+            self._await_value = False
+        elif ch in "}]":
+            self._depth -= 1
+        elif ch == "," and self._depth == 1:
+            self._expect_key = True
+        elif ch == ":" and self._depth == 1:
+            self._await_value = True
+        elif not ch.isspace():
+            self._await_value = False
+
+    def _skip_string(self, ch: str) -> None:
+        if self._escaped:
+            self._escaped = False
+            self._key.append(ch)
+        elif ch == "\\":
+            self._escaped = True
+        elif ch == '"':
+            self._in_string = False
+            if self._is_key:
+                self._last_key = "".join(self._key)
+        else:
+            self._key.append(ch)
+
+    def _capture(self, ch: str, out: list) -> None:
+        if not self._escape:
+            if ch == "\\":
+                self._escape = ch
+            elif ch == '"':
+                self._capturing = False
+                self._in_string = False
+                self.done = True
+            else:
+                out.append(ch)
+            return
+
+        self._escape += ch
+        escape = self._escape
+        if escape[1] != "u":
+            out.append(_SIMPLE_ESCAPES.get(escape[1], escape[1]))
+            self._escape = ""
+            return
+        if ch in '"\\' and len(escape) not in (7, 8):
+            # Truncated escape such as \u12" must not swallow the closing quote
+            out.append("\ufffd" if len(escape) <= 6 else "\ufffd\ufffd")
+            self._escape = ""
+            self._capture(ch, out)
+            return
+        if len(escape) < 6:
+            return
+        try:
+            high = 0xD800 <= int(escape[2:6], 16) <= 0xDBFF
+        except ValueError:
+            # Not four hex digits, e.g. \uZZZZ
+            out.append("\ufffd")
+            self._escape = ""
+            return
+        if high and len(escape) == 7 and ch != "\\":
+            # Lone high surrogate followed by something else
+            out.append("\ufffd")
+            self._escape = ""
+            self._capture(ch, out)
+            return
+        if high and len(escape) == 8 and ch != "u":
+            # High surrogate followed by a different escape, e.g. \n
+            out.append("\ufffd")
+            self._escape = "\\"
+            self._capture(ch, out)
+            return
+        if high and len(escape) < 12:
+            return
+        try:
+            out.append(json.loads(f'"{escape}"'))
+        except ValueError:
+            out.append("\ufffd")
+        self._escape = ""
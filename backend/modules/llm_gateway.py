@@ -0,0 +1,344 @@
+"""
+LLM Gateway Module
+The single Gemini client for the backend, with per-endpoint deadlines, a global in-flight cap,
+jittered retries for transient errors and a circuit breaker, as sync and asyncio APIs
+
+Point GEMINI_BASE_URL at a local stand-in server to exercise it without the real API.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+from google import genai
+from google.genai import errors, types
+from dotenv import load_dotenv
+
+from modules.resilience import (
+    Deadline, DeadlineExceeded, ConcurrencyLimiter, CircuitBreaker, LatencyRecorder,
+    retry_call, retry_call_async
+)
+
+load_dotenv()
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL") or None
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 60))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 2))
+GEMINI_MAX_IN_FLIGHT = int(os.environ.get("GEMINI_MAX_IN_FLIGHT", 8))
+GEMINI_QUEUE_TIMEOUT = float(os.environ.get("GEMINI_QUEUE_TIMEOUT", 5))
+GEMINI_CIRCUIT_FAILURES = int(os.environ.get("GEMINI_CIRCUIT_FAILURES", 5))
+GEMINI_CIRCUIT_RESET = float(os.environ.get("GEMINI_CIRCUIT_RESET", 30))
+
+# Deadline in seconds per endpoint label, including retries; override with GEMINI_DEADLINE_<LABEL>
+DEFAULT_DEADLINES = {
+    "chat": 20,
+    "chat_stream": 60,
+    "chat_summary": 30,
+    "analyze": 45,
+    "analyze_video": 60,
+    "prescription": 45,
+    "generate_ai_response": 30,
+    "file": 90,
+}
+
+# Rate limits and server-side failures are worth another attempt; other 4xx are not
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+if not GOOGLE_API_KEY:
+    logger.error("GOOGLE_API_KEY not found in environment variables")
+
+_client: Optional[genai.Client] = None
+_client_lock = threading.Lock()
+limiter = ConcurrencyLimiter(GEMINI_MAX_IN_FLIGHT, GEMINI_QUEUE_TIMEOUT)
+circuit = CircuitBreaker(GEMINI_CIRCUIT_FAILURES, GEMINI_CIRCUIT_RESET, name="Gemini")
+latency = LatencyRecorder()
+
+
+def get_client() -> genai.Client:
+    """Shared client for generation and the files API"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(
+                    api_key=GOOGLE_API_KEY,
+                    http_options=types.HttpOptions(base_url=GEMINI_BASE_URL, timeout=int(GEMINI_TIMEOUT * 1000))
+                )
+                logger.info(f"Created shared Gemini client ({GEMINI_BASE_URL or 'default endpoint'})")
+    return _client
+
+
+def reset_client() -> None:
+    """Drop the shared client so the next call builds a new one (e.g. after changing settings)"""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def deadline_for(label: str) -> float:
+    """Deadline in seconds for an endpoint label"""
+    override = os.environ.get(f"GEMINI_DEADLINE_{label.upper()}")
+    if override:
+        return float(override)
+    return float(DEFAULT_DEADLINES.get(label, GEMINI_TIMEOUT))
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def _record_outcome(error: Optional[Exception]) -> None:
+    # Only transient failures say the provider is degraded; a rejected request does not
+    if error is not None and (is_retryable(error) or isinstance(error, DeadlineExceeded)):
+        circuit.record_failure()
+    else:
+        circuit.record_success()
+
+
+def _with_timeout(config: Any, remaining: float) -> Any:
+    """Copy of the generation config whose HTTP timeout ends at the deadline"""
+    http_options = types.HttpOptions(timeout=max(1000, int(remaining * 1000)))
+    if isinstance(config, types.GenerateContentConfig):
+        return config.model_copy(update={"http_options": http_options})
+    return dict(config or {}, http_options=http_options)
+
+
+def generate_content(
+    *,
+    model: str,
+    contents: Any,
+    config: Any = None,
+    label: str = "default",
+    timeout: Optional[float] = None
+) -> types.GenerateContentResponse:
+    """
+    Generate content with the shared client
+
+    Args:
+        model (str): Model name
+        contents (Any): Prompt text, or a list of parts and uploaded files
+        config (Any): Generation config as a dict or GenerateContentConfig
+        label (str): Endpoint label for the deadline and metrics
+        timeout (float): Deadline in seconds, defaults to deadline_for(label)
+
+    Returns:
+        GenerateContentResponse: The model response
+
+    Raises:
+        Overloaded: GEMINI_MAX_IN_FLIGHT calls are busy for longer than GEMINI_QUEUE_TIMEOUT
+        CircuitOpen: Gemini failed repeatedly and is not called until GEMINI_CIRCUIT_RESET passes
+        DeadlineExceeded: The deadline ran out between attempts
+        Exception: The last API or transport error
+    """
+    start = time.monotonic()
+    deadline = Deadline(timeout or deadline_for(label))
+    attempts = 0
+
+    def attempt(remaining: float) -> types.GenerateContentResponse:
+        nonlocal attempts
+        attempts += 1
+        circuit.before_call()
+        try:
+            response = get_client().models.generate_content(
+                model=model, contents=contents, config=_with_timeout(config, remaining)
+            )
+        except Exception as e:
+            _record_outcome(e)
+            raise
+        _record_outcome(None)
+        return response
+
+    ok = False
+    try:
+        with limiter:
+            response = retry_call(
+                attempt,
+                deadline=deadline,
+                max_retries=GEMINI_MAX_RETRIES,
+                is_retryable=is_retryable,
+                label=f"Gemini {label}"
+            )
+        ok = True
+        return response
+    finally:
+        latency.record(label, time.monotonic() - start, ok, retries=max(0, attempts - 1))
+
+
+async def agenerate_content(
+    *,
+    model: str,
+    contents: Any,
+    config: Any = None,
+    label: str = "default",
+    timeout: Optional[float] = None
+) -> types.GenerateContentResponse:
+    """asyncio counterpart of generate_content; shares its in-flight cap and circuit"""
+    start = time.monotonic()
+    deadline = Deadline(timeout or deadline_for(label))
+    attempts = 0
+
+    async def attempt(remaining: float) -> types.GenerateContentResponse:
+        nonlocal attempts
+        attempts += 1
+        circuit.before_call()
+        try:
+            response = await get_client().aio.models.generate_content(
+                model=model, contents=contents, config=_with_timeout(config, remaining)
+            )
+        except Exception as e:
+            _record_outcome(e)
+            raise
+        _record_outcome(None)
+        return response
+
+    ok = False
+    try:
+        async with limiter:
+            response = await retry_call_async(
+                attempt,
+                deadline=deadline,
+                max_retries=GEMINI_MAX_RETRIES,
+                is_retryable=is_retryable,
+                label=f"Gemini {label}"
+            )
+        ok = True
+        return response
+    finally:
+        latency.record(label, time.monotonic() - start, ok, retries=max(0, attempts - 1))
+
+
+def stream_content(
+    *,
+    model: str,
+    contents: Any,
+    config: Any = None,
+    label: str = "default",
+    timeout: Optional[float] = None
+) -> Iterator[str]:
+    """
+    Stream generated text with the shared client
+
+    Opening the stream is retried like generate_content until the first chunk arrives;
+    a failure after that is raised to the caller, since text has already been sent on.
+
+    Yields:
+        str: Successive text chunks
+    """
+    start = time.monotonic()
+    deadline = Deadline(timeout or deadline_for(label))
+    attempts = 0
+
+    def open_stream(remaining: float):
+        nonlocal attempts
+        attempts += 1
+        circuit.before_call()
+        try:
+            stream = get_client().models.generate_content_stream(
+                model=model, contents=contents, config=_with_timeout(config, remaining)
+            )
+            return stream, next(stream, None)
+        except Exception as e:
+            _record_outcome(e)
+            raise
+
+    ok = False
+    try:
+        with limiter:
+            stream, chunk = retry_call(
+                open_stream,
+                deadline=deadline,
+                max_retries=GEMINI_MAX_RETRIES,
+                is_retryable=is_retryable,
+                label=f"Gemini {label}"
+            )
+            try:
+                while chunk is not None:
+                    if chunk.text:
+                        yield chunk.text
+                    if deadline.expired():
+                        raise DeadlineExceeded(f"Gemini {label} stream exceeded its deadline")
+                    chunk = next(stream, None)
+            except Exception as e:
+                _record_outcome(e)
+                raise
+            _record_outcome(None)
+        ok = True
+    finally:
+        latency.record(label, time.monotonic() - start, ok, retries=max(0, attempts - 1))
+
+
+async def astream_content(
+    *,
+    model: str,
+    contents: Any,
+    config: Any = None,
+    label: str = "default",
+    timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """asyncio counterpart of stream_content"""
+    start = time.monotonic()
+    deadline = Deadline(timeout or deadline_for(label))
+    attempts = 0
+
+    async def open_stream(remaining: float):
+        nonlocal attempts
+        attempts += 1
+        circuit.before_call()
+        try:
+            stream = await get_client().aio.models.generate_content_stream(
+                model=model, contents=contents, config=_with_timeout(config, remaining)
+            )
+            return stream, await anext(stream, None)
+        except Exception as e:
+            _record_outcome(e)
+            raise
+
+    ok = False
+    try:
+        async with limiter:
+            stream, chunk = await retry_call_async(
+                open_stream,
+                deadline=deadline,
+                max_retries=GEMINI_MAX_RETRIES,
+                is_retryable=is_retryable,
+                label=f"Gemini {label}"
+            )
+            try:
+                while chunk is not None:
+                    if chunk.text:
+                        yield chunk.text
+                    if deadline.expired():
+                        raise DeadlineExceeded(f"Gemini {label} stream exceeded its deadline")
+                    chunk = await anext(stream, None)
+            except Exception as e:
+                _record_outcome(e)
+                raise
+            _record_outcome(None)
+        ok = True
+    finally:
+        latency.record(label, time.monotonic() - start, ok, retries=max(0, attempts - 1))
+
+
+def metrics() -> Dict[str, Any]:
+    """Latency per label, in-flight and rejected counts and the circuit state"""
+    return {
+        "latency": latency.snapshot(),
+        "in_flight": limiter.in_flight,
+        "max_in_flight": limiter.max_in_flight,
+        "rejected": limiter.rejected,
+        "circuit": {
+            "state": circuit.state,
+            "times_opened": circuit.times_opened,
+            "short_circuited": circuit.short_circuited
+        }
+    }
@@ -4,118 +4,222 @@ Handles all interactions with the Gemini AI model
 """
 
 import os
+import copy
 import json
 import time
-from google import genai
+import hashlib
 import logging
 # load environment variables from .env file
 from dotenv import load_dotenv
+from modules.cache import LRUTTLCache
+from modules import llm_gateway
+from modules.resilience import SingleFlight
 load_dotenv()
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Configure the Google API client
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY") 
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-else:
-    logger.error("GOOGLE_API_KEY not found in environment variables")
+# Opt-in response cache; callers choose the TTL per endpoint
+GEMINI_CACHE_ENABLED = os.environ.get("GEMINI_CACHE_ENABLED", "1") == "1"
+GEMINI_CACHE_SIZE = int(os.environ.get("GEMINI_CACHE_SIZE", 512))
+# SQLite file for the disk tier; empty keeps the cache in memory only
+GEMINI_CACHE_DB = os.environ.get("GEMINI_CACHE_DB", "")
 
-def generate_gemini_response(prompt, model="gemini-2.0-flash", temperature=0.3):
+response_cache = LRUTTLCache(
+    "gemini",
+    max_entries=GEMINI_CACHE_SIZE,
+    ttl=3600,
+    disk_path=GEMINI_CACHE_DB or None
+)
+
+def generation_config(temperature):
+    """Generation settings sent with every request"""
+    return {
+        "temperature": temperature,
+        "max_output_tokens": 2048,
+        "response_mime_type": "application/json",
+        "top_p": 0.95,
+        "top_k": 40,
+    }
+
+def response_cache_key(prompt, model, temperature):
+    """Hash of everything that determines the response: prompt, model and generation config"""
+    payload = json.dumps(
+        {"prompt": prompt, "model": model, "config": generation_config(temperature)},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Identical concurrent requests share one provider call
+single_flight = SingleFlight()
+
+def cache_metrics():
+    """Hit rate and size of the Gemini response cache"""
+    return response_cache.stats()
+
+def coalescing_metrics():
+    """How many identical concurrent requests were served by another caller's provider call"""
+    return single_flight.stats()
+
+def generate_gemini_response(prompt, model="gemini-2.0-flash", temperature=0.3, cache_ttl=None, bypass_cache=False,
+                             label="default"):
     """
-    Helper function to generate responses from Gemini AI - always generates fresh responses
+    Helper function to generate responses from Gemini AI
+    
+    Concurrent calls with the same prompt, model and config wait on one provider call and share
+    its result. Responses are only cached when cache_ttl is given; errors are never cached.
     
     Args:
         prompt (str): The prompt to send to Gemini
         model (str): The model to use
         temperature (float): Controls randomness (0.0-1.0)
+        cache_ttl (float): Seconds to reuse the response for an identical request, None to disable
+        bypass_cache (bool): Skip the cache lookup and refresh the entry with a fresh response
+        label (str): Endpoint label for the gateway deadline and metrics
         
     Returns:
         dict: Parsed JSON response or error message
     """
+    key = response_cache_key(prompt, model, temperature)
+    use_cache = bool(cache_ttl) and GEMINI_CACHE_ENABLED
+    if use_cache and not bypass_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.info(f"Serving cached {model} response")
+            # Callers add fields to the result, so hand out a copy
+            return copy.deepcopy(cached)
+
+    def generate():
+        result = _generate_fresh(prompt, model, temperature, label)
+        if use_cache and isinstance(result, dict) and "error" not in result:
+            response_cache.set(key, copy.deepcopy(result), cache_ttl)
+        return result
+
+    result, shared = single_flight.do(key, generate)
+    if shared:
+        logger.info(f"Shared an in-flight {model} response with a concurrent identical request")
+    # Every caller gets its own copy, since callers add fields to the result
+    return copy.deepcopy(result)
+
+def _generate_fresh(prompt, model, temperature, label):
+    """Call Gemini and parse its JSON response"""
     try:
         start_time = time.time()
         logger.info(f"Generating fresh response using {model} with temperature {temperature}")
         
-        response = client.models.generate_content(
+        response = llm_gateway.generate_content(
             model=model,
             contents=prompt,
-            config={
-                "temperature": temperature,
-                "max_output_tokens": 2048,
-                "response_mime_type": "application/json",
-                "top_p": 0.95,
-                "top_k": 40,
-            }
+            config=generation_config(temperature),
+            label=label
         )
         
-        # Parse the response as JSON
-        response_text = response.text.strip()
+        result = parse_gemini_response(response.text)
+        logger.info(f"Generated response in {time.time() - start_time:.2f} seconds")
+        return result
+
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        return {"error": str(e)}
+
+def stream_gemini_response(prompt, model="gemini-2.0-flash", temperature=0.3, label="chat_stream"):
+    """
+    Stream the raw response text from Gemini as it is generated
+    
+    Args:
+        prompt (str): The prompt to send to Gemini
+        model (str): The model to use
+        temperature (float): Controls randomness (0.0-1.0)
+        label (str): Endpoint label for the gateway deadline and metrics
         
-        # Sometimes the API returns text with markdown code blocks
-        if response_text.startswith("```json") and response_text.endswith("```"):
-            response_text = response_text[7:-3].strip()
+    Yields:
+        str: Successive chunks of the JSON response text
+    """
+    start_time = time.time()
+    first_chunk = True
+    logger.info(f"Streaming response using {model} with temperature {temperature}")
+    for text in llm_gateway.stream_content(
+        model=model,
+        contents=prompt,
+        config=generation_config(temperature),
+        label=label
+    ):
+        if first_chunk:
+            logger.info(f"First chunk after {time.time() - start_time:.2f} seconds")
+            first_chunk = False
+        yield text
+    logger.info(f"Streamed response in {time.time() - start_time:.2f} seconds")
+
+def parse_gemini_response(response_text):
+    """
+    Parse the JSON text returned by Gemini into a dict
+    
+    Args:
+        response_text (str): Raw model output, possibly wrapped in a markdown code block
         
-        # Log the raw response for debugging
-        logger.debug(f"Raw response: {response_text}")
+    Returns:
+        dict: Parsed response or error message
+    """
+    response_text = response_text.strip()
+    
+    # Sometimes the API returns text with markdown code blocks
+    if response_text.startswith("```json") and response_text.endswith("```"):
+        response_text = response_text[7:-3].strip()
+    
+    # Log the raw response for debugging
+    logger.debug(f"Raw response: {response_text}")
+    
+    try:
+        result = json.loads(response_text)
         
-        try:
-            result = json.loads(response_text)
+        # Handle case where result is a list instead of a dictionary
+        if isinstance(result, list):
+            logger.warning(f"Received list instead of dict: {result}")
             
-            # Handle case where result is a list instead of a dictionary
-            if isinstance(result, list):
-                logger.warning(f"Received list instead of dict: {result}")
-                
-                # If it's a non-empty list, convert it to a dictionary if possible
-                if result and isinstance(result[0], dict):
-                    logger.info("Converting list of dicts to a single dict (using first element)")
-                    result = result[0]
+            # If it's a non-empty list, convert it to a dictionary if possible
+            if result and isinstance(result[0], dict):
+                logger.info("Converting list of dicts to a single dict (using first element)")
+                result = result[0]
+            else:
+                # Create a dictionary wrapper for the list
+                logger.info("Wrapping list result in a dictionary")
+                result = {
+                    "results": result,
+                    "error": "Response was a list, expected a dictionary. Wrapped for compatibility."
+                }
+        
+        # Validate that result is now a dictionary
+        if not isinstance(result, dict):
+            logger.error(f"Invalid response format after conversion: expected dict, got {type(result)}")
+            return {"error": "Invalid response format from AI model", "raw_type": str(type(result))}
+        
+        # Ensure arrays are properly initialized
+        for field in ["recommendations", "therapy_options", "medication_considerations"]:
+            if field in result and not isinstance(result[field], list):
+                logger.warning(f"Converting {field} to list: was {type(result[field])}")
+                # If the field exists but isn't a list, convert it to a list with one item
+                if result[field]:  # If not empty/null
+                    result[field] = [result[field]]
                 else:
-                    # Create a dictionary wrapper for the list
-                    logger.info("Wrapping list result in a dictionary")
-                    result = {
-                        "results": result,
-                        "error": "Response was a list, expected a dictionary. Wrapped for compatibility."
-                    }
-            
-            # Validate that result is now a dictionary
-            if not isinstance(result, dict):
-                logger.error(f"Invalid response format after conversion: expected dict, got {type(result)}")
-                return {"error": "Invalid response format from AI model", "raw_type": str(type(result))}
-            
-            # Ensure arrays are properly initialized
-            for field in ["recommendations", "therapy_options", "medication_considerations"]:
-                if field in result and not isinstance(result[field], list):
-                    logger.warning(f"Converting {field} to list: was {type(result[field])}")
-                    # If the field exists but isn't a list, convert it to a list with one item
-                    if result[field]:  # If not empty/null
-                        result[field] = [result[field]]
+                    result[field] = []
+        
+        return result
+        
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parsing error: {e}")
+        logger.error(f"Problematic response text: {response_text}")
+        # Try to clean up the response by removing any non-JSON content
+        clean_response = response_text.split('```')[0].strip()
+        if clean_response:
+            try:
+                result = json.loads(clean_response)
+                # Check if the result is a list and handle it
+                if isinstance(result, list):
+                    if result and isinstance(result[0], dict):
+                        result = result[0]
                     else:
-                        result[field] = []
-            
-            logger.info(f"Generated response in {time.time() - start_time:.2f} seconds")
-            return result
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            logger.error(f"Problematic response text: {response_text}")
-            # Try to clean up the response by removing any non-JSON content
-            clean_response = response_text.split('```')[0].strip()
-            if clean_response:
-                try:
-                    result = json.loads(clean_response)
-                    # Check if the result is a list and handle it
-                    if isinstance(result, list):
-                        if result and isinstance(result[0], dict):
-                            result = result[0]
-                        else:
-                            result = {"results": result}
-                    return result
-                except:
-                    pass
-            return {"error": f"Failed to parse response as JSON: {str(e)}", "raw_response": response_text[:500]}
-            
-    except Exception as e:
-        logger.error(f"Error generating response: {str(e)}")
-        return {"error": str(e)}
+                        result = {"results": result}
+                return result
+            except:
+                pass
+        return {"error": f"Failed to parse response as JSON: {str(e)}", "raw_response": response_text[:500]}
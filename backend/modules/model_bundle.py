@@ -0,0 +1,146 @@
+"""
+Model Bundle Module
+Local safetensors bundle for the emotion models, loaded through mmap without any model hub lookup
+
+Bundle layout:
+    bundle.json                        manifest (format version, emotion labels, file names)
+    resnet101_emotion.safetensors      ResNet101 facial emotion weights
+    wav2vec/                           Wav2Vec2 classifier in save_pretrained format
+        config.json
+        model.safetensors
+        preprocessor_config.json
+
+Build a bundle once (needs the hub or a warm HF cache) with:
+    python -m modules.model_bundle --resnet models/resnet101_emotion_latest.pt \
+        --wav2vec models/wav2vec_emotion_model.pt --out models/emotion_bundle
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+EMOTION_BUNDLE_DIR = os.environ.get(
+    "EMOTION_BUNDLE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "emotion_bundle")
+)
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "bundle.json"
+RESNET_WEIGHTS_NAME = "resnet101_emotion.safetensors"
+WAV2VEC_DIR_NAME = "wav2vec"
+BASE_WAV2VEC_MODEL = "facebook/wav2vec2-base-960h"
+
+
+def bundle_exists(bundle_dir: str = EMOTION_BUNDLE_DIR) -> bool:
+    """Check whether a model bundle has been exported to bundle_dir"""
+    return os.path.isfile(os.path.join(bundle_dir, MANIFEST_NAME))
+
+
+def load_emotion_bundle(bundle_dir: str, num_labels: int, device):
+    """
+    Load the emotion models from a local bundle
+
+    The safetensors files are memory-mapped and the tensors are assigned to the
+    modules without copying, so worker processes on one host share the pages
+    through the OS page cache.
+
+    Args:
+        bundle_dir (str): Bundle directory
+        num_labels (int): Number of emotion classes the heads were trained with
+        device (torch.device): Device to move the models to
+
+    Returns:
+        tuple: (resnet, wav2vec, feature_extractor)
+    """
+    # Deferred so importing the bundle settings does not pull in torch
+    import torch
+    from safetensors.torch import load_file
+    from torchvision.models import resnet101
+    from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+
+    start_time = time.time()
+    with open(os.path.join(bundle_dir, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported emotion bundle format: {manifest.get('format')}")
+    if len(manifest.get("emotions", [])) != num_labels:
+        raise ValueError(f"Bundle has {len(manifest.get('emotions', []))} emotion labels, expected {num_labels}")
+
+    # Build ResNet101 on the meta device so no memory is spent on random initialization
+    with torch.device("meta"):
+        resnet = resnet101(weights=None)
+        resnet.fc = torch.nn.Linear(resnet.fc.in_features, num_labels)
+    resnet_state = load_file(os.path.join(bundle_dir, manifest["resnet"]), device="cpu")
+    resnet.load_state_dict(resnet_state, assign=True)
+    resnet.eval()
+    resnet.to(device)
+
+    wav2vec_dir = os.path.join(bundle_dir, manifest["wav2vec"])
+    feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(wav2vec_dir, local_files_only=True)
+    wav2vec = Wav2Vec2ForSequenceClassification.from_pretrained(
+        wav2vec_dir,
+        local_files_only=True,
+        use_safetensors=True,
+        low_cpu_mem_usage=True
+    )
+    wav2vec.eval()
+    wav2vec.to(device)
+
+    logger.info(f"Loaded emotion bundle from {bundle_dir} in {time.time() - start_time:.2f} seconds")
+    return resnet, wav2vec, feature_extractor
+
+
+def export_emotion_bundle(resnet_pt_path: str, wav2vec_pt_path: str, bundle_dir: str, emotions: list) -> None:
+    """
+    Convert the .pt checkpoints into a local safetensors bundle
+
+    Args:
+        resnet_pt_path (str): ResNet101 state dict saved with torch.save
+        wav2vec_pt_path (str): Wav2Vec2 classifier state dict saved with torch.save
+        bundle_dir (str): Output directory
+        emotions (list): Emotion labels, in model output order
+    """
+    import torch
+    from safetensors.torch import save_file
+    from transformers import Wav2Vec2Config, Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    resnet_state = torch.load(resnet_pt_path, map_location="cpu")
+    save_file({k: v.contiguous() for k, v in resnet_state.items()}, os.path.join(bundle_dir, RESNET_WEIGHTS_NAME))
+    logger.info(f"Wrote {RESNET_WEIGHTS_NAME}")
+
+    config = Wav2Vec2Config.from_pretrained(BASE_WAV2VEC_MODEL, num_labels=len(emotions))
+    config.id2label = dict(enumerate(emotions))
+    config.label2id = {label: i for i, label in enumerate(emotions)}
+    wav2vec = Wav2Vec2ForSequenceClassification(config)
+    wav2vec.load_state_dict(torch.load(wav2vec_pt_path, map_location="cpu"))
+    wav2vec_dir = os.path.join(bundle_dir, WAV2VEC_DIR_NAME)
+    wav2vec.save_pretrained(wav2vec_dir, safe_serialization=True)
+    Wav2Vec2FeatureExtractor.from_pretrained(BASE_WAV2VEC_MODEL).save_pretrained(wav2vec_dir)
+    logger.info(f"Wrote {WAV2VEC_DIR_NAME}/")
+
+    with open(os.path.join(bundle_dir, MANIFEST_NAME), "w") as f:
+        json.dump({
+            "format": BUNDLE_FORMAT,
+            "emotions": list(emotions),
+            "resnet": RESNET_WEIGHTS_NAME,
+            "wav2vec": WAV2VEC_DIR_NAME
+        }, f, indent=2)
+    logger.info(f"Emotion bundle exported to {bundle_dir}")
+
+
+if __name__ == "__main__":
+    from modules.combine import EMOTIONS
+
+    parser = argparse.ArgumentParser(description="Export the emotion models to a local safetensors bundle")
+    parser.add_argument("--resnet", required=True, help="Path to resnet101_emotion_latest.pt")
+    parser.add_argument("--wav2vec", required=True, help="Path to wav2vec_emotion_model.pt")
+    parser.add_argument("--out", default=EMOTION_BUNDLE_DIR, help="Output bundle directory")
+    args = parser.parse_args()
+    export_emotion_bundle(args.resnet, args.wav2vec, args.out, EMOTIONS)
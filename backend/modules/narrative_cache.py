@@ -0,0 +1,102 @@
+"""
+Narrative Cache Module
+Reuses cardiology narratives across patients with the same diagnosis and similar measurements
+
+Numeric features are quantized into bands (e.g. age 60-65) and the narrative is generated
+from the banded profile, so a cached text is equally valid for every patient in the band.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Callable, Dict
+
+from modules.cache import LRUTTLCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+NARRATIVE_CACHE_ENABLED = os.environ.get("NARRATIVE_CACHE_ENABLED", "1") == "1"
+NARRATIVE_CACHE_SIZE = int(os.environ.get("NARRATIVE_CACHE_SIZE", 2048))
+NARRATIVE_CACHE_TTL = float(os.environ.get("NARRATIVE_CACHE_TTL", 7 * 24 * 3600))
+# SQLite file for the disk tier; empty keeps the cache in memory only
+NARRATIVE_CACHE_DB = os.environ.get("NARRATIVE_CACHE_DB", "")
+
+# Band widths for the numeric inputs of each model; other fields are used as-is
+HEART_FAILURE_BANDS = {"Age": 5, "RestingBP": 10, "Cholesterol": 20, "MaxHR": 10, "Oldpeak": 0.5}
+CAD_BANDS = {"age": 5, "trestbps": 10, "chol": 20, "thalach": 10, "oldpeak": 0.5}
+PROBABILITY_BAND = 0.05
+
+# Generators return these prefixes instead of raising; such texts must not be cached
+ERROR_PREFIXES = ("⚠️",)
+
+narrative_cache = LRUTTLCache(
+    "narratives",
+    max_entries=NARRATIVE_CACHE_SIZE,
+    ttl=NARRATIVE_CACHE_TTL,
+    disk_path=NARRATIVE_CACHE_DB or None
+)
+
+
+def quantize(value: float, step: float) -> float:
+    """Lower edge of the band of width step that value falls in"""
+    return round((float(value) // step) * step, 6)
+
+
+def band_profile(values: Dict[str, Any], bands: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Replace numeric features with their band, e.g. {"Age": 63} -> {"Age": "60-65"}
+
+    Returns the values unchanged when the narrative cache is disabled, so prompts keep
+    the exact measurements.
+    """
+    if not NARRATIVE_CACHE_ENABLED:
+        return dict(values)
+    profile = {}
+    for key, value in values.items():
+        step = bands.get(key)
+        if step is None:
+            profile[key] = value.item() if hasattr(value, "item") else value
+            continue
+        try:
+            low = quantize(value, step)
+        except (TypeError, ValueError):
+            profile[key] = value
+            continue
+        profile[key] = f"{low:g}-{low + step:g}"
+    return profile
+
+
+def band_value(value: float, step: float) -> float:
+    """Round value to the centre of its band (identity when the cache is disabled)"""
+    if not NARRATIVE_CACHE_ENABLED:
+        return float(value)
+    return round(quantize(value, step) + step / 2, 6)
+
+
+def is_cacheable(text: Any) -> bool:
+    return isinstance(text, str) and bool(text.strip()) and not text.startswith(ERROR_PREFIXES)
+
+
+def cached_narrative(kind: str, key_parts: Any, generate: Callable[[], str]) -> str:
+    """
+    Narrative for key_parts, generated at most once per TTL
+
+    Args:
+        kind (str): Narrative type, e.g. "ecg", "heart_failure", "cad"
+        key_parts (Any): JSON-serializable inputs the narrative depends on (already banded)
+        generate (Callable): Produces the narrative on a miss
+
+    Returns:
+        str: Narrative text
+    """
+    if not NARRATIVE_CACHE_ENABLED:
+        return generate()
+    digest = hashlib.sha256(json.dumps(key_parts, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    return narrative_cache.get_or_compute(f"{kind}:{digest}", generate, should_cache=is_cacheable)
+
+
+def metrics() -> Dict[str, Any]:
+    return narrative_cache.stats()
@@ -0,0 +1,134 @@
+"""
+Narrative Jobs Module
+Runs LLM narratives in background workers so prediction endpoints can answer immediately
+
+An endpoint submits the narrative and returns a job id; the client then polls
+GET /narratives/<id> or listens on GET /narratives/<id>/stream until it is ready.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+from modules.resilience import Overloaded
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+NARRATIVE_WORKERS = int(os.environ.get("NARRATIVE_WORKERS", 4))
+# Finished jobs are kept this long for clients to collect them
+NARRATIVE_JOB_TTL = float(os.environ.get("NARRATIVE_JOB_TTL", 600))
+NARRATIVE_MAX_JOBS = int(os.environ.get("NARRATIVE_MAX_JOBS", 5000))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "error"
+
+
+class NarrativeJob:
+    """State of one background narrative"""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = PENDING
+        self.analysis: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.finished = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = {"id": self.id, "kind": self.kind, "status": self.status}
+        if self.status == DONE:
+            job["analysis"] = self.analysis
+        elif self.status == FAILED:
+            job["error"] = self.error
+        if self.finished_at is not None:
+            job["seconds"] = round(self.finished_at - self.created_at, 3)
+        return job
+
+
+class NarrativeJobs:
+    """
+    Bounded registry of narrative jobs backed by a thread pool
+
+    Args:
+        workers (int): Narratives generated concurrently
+        ttl (float): Seconds a finished job stays retrievable
+        max_jobs (int): Jobs kept in total; the oldest finished jobs are dropped first
+    """
+
+    def __init__(self, workers: int = NARRATIVE_WORKERS, ttl: float = NARRATIVE_JOB_TTL,
+                 max_jobs: int = NARRATIVE_MAX_JOBS):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="narrative")
+        self._jobs: "OrderedDict[str, NarrativeJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, generate: Callable[[], str]) -> NarrativeJob:
+        """
+        Queue a narrative for background generation
+
+        Args:
+            kind (str): Narrative type, e.g. "ecg", "heart_failure", "cad"
+            generate (Callable): Produces the narrative; must not touch the request context
+
+        Returns:
+            NarrativeJob: The queued job
+
+        Raises:
+            Overloaded: All max_jobs slots hold jobs that have not finished yet
+        """
+        job = NarrativeJob(kind)
+        with self._lock:
+            self._prune(time.time())
+            if len(self._jobs) >= self.max_jobs:
+                raise Overloaded(f"{self.max_jobs} narrative jobs are still pending or running")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, generate)
+        return job
+
+    def get(self, job_id: str) -> Optional[NarrativeJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[NarrativeJob]:
+        """The job once finished or after timeout seconds, None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            job.finished.wait(timeout)
+        return job
+
+    def _run(self, job: NarrativeJob, generate: Callable[[], str]) -> None:
+        job.status = RUNNING
+        try:
+            job.analysis = generate()
+            job.status = DONE
+        except Exception as e:
+            logger.error(f"Narrative job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job.finished.set()
+
+    def _prune(self, now: float) -> None:
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        # Jobs still in progress are never dropped, clients are waiting on them
+        excess = len(self._jobs) - self.max_jobs + 1
+        if excess > 0:
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+            for job_id in finished[:excess]:
+                del self._jobs[job_id]
+
+
+jobs = NarrativeJobs()
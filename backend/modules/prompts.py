@@ -340,10 +340,13 @@ def create_chat_prompt(
     user_name: str,
     user_message: str,
     chat_history: List[Dict[str, str]],
-    relevant_information: List[Dict[str, Any]]
+    relevant_information: List[Dict[str, Any]],
+    conversation_summary: Optional[str] = None
 ) -> str:
     """
     Create a therapeutic chat prompt with RAG integration that produces concise, professional responses
+
+    conversation_summary, when given, stands in for the turns before chat_history.
     """
     # Format RAG context
     rag_context = format_rag_context(relevant_information)
@@ -376,6 +379,13 @@ def create_chat_prompt(
     
     concerns_text = "\n".join(potential_concerns) if potential_concerns else "No acute concerns detected"
     
+    summary_text = ""
+    if conversation_summary:
+        summary_text = f"""### Earlier Conversation Summary
+    {conversation_summary}
+    
+    """
+    
     # Current date
     today_date = date.today().strftime("%B %d, %Y")
     
@@ -389,7 +399,7 @@ def create_chat_prompt(
     - **User Name**: {user_name}
     - **Date**: {today_date}
     
-    ### Recent Conversation History
+    {summary_text}### Recent Conversation History
     ```
     {history_text}
     ```
@@ -457,3 +467,41 @@ def create_chat_prompt(
     
     return prompt
 
+
+def create_summary_prompt(
+    user_name: str,
+    previous_summary: Optional[str],
+    messages: List[Dict[str, str]],
+    max_words: int = 200
+) -> str:
+    """
+    Create a prompt that folds older chat turns into the running conversation summary
+    """
+    history_text = ""
+    for msg in messages:
+        speaker = user_name if msg.get('role') == "user" else "Mental Health Assistant"
+        history_text += f"{speaker}: {msg.get('content', '')}\n"
+
+    prompt = f"""
+    You maintain a running summary of a supportive mental health conversation between {user_name} and a Mental Health Assistant.
+    
+    ### Current Summary
+    {previous_summary or "No summary yet, this is the start of the conversation."}
+    
+    ### New Messages To Add
+    ```
+    {history_text}
+    ```
+    
+    Update the summary so it covers both the current summary and the new messages. Keep what matters for continuing the conversation: the concerns and feelings {user_name} described, relevant life circumstances, coping strategies already suggested and how they were received, and any safety concerns (always keep these). Leave out greetings and small talk. Write in the third person, at most {max_words} words.
+
+    Return ONLY a JSON object with this structure:
+    
+    ```json
+    {{
+        "summary": "The updated summary"
+    }}
+    ```
+    """
+    
+    return prompt
@@ -0,0 +1,372 @@
+"""
+Resilience Module
+Shared deadlines, retries, concurrency limits and latency metrics for calls to external services
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Any, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """The call did not finish within its deadline"""
+
+
+class Overloaded(Exception):
+    """Too many calls are already in flight"""
+
+
+class CircuitOpen(Exception):
+    """The service failed repeatedly and calls are short-circuited until it recovers"""
+
+
+class Deadline:
+    """Absolute point in time a call has to finish by"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (1 = first retry)"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+def retry_call(
+    fn: Callable[[float], Any],
+    *,
+    deadline: Deadline,
+    max_retries: int,
+    is_retryable: Callable[[Exception], bool],
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    label: str = "call"
+) -> Any:
+    """
+    Call fn with retries and jittered exponential backoff, all within one deadline
+
+    Args:
+        fn (Callable): Called with the seconds left before the deadline
+        deadline (Deadline): Overall deadline, including backoff sleeps
+        max_retries (int): Retries after the first attempt
+        is_retryable (Callable): Whether an exception is worth retrying
+        base_delay (float): Backoff for the first retry, doubled per retry
+        max_delay (float): Upper bound for one backoff
+        label (str): Name used in log messages
+
+    Returns:
+        Any: Result of fn
+    """
+    attempt = 0
+    while True:
+        if deadline.expired():
+            raise DeadlineExceeded(f"{label} exceeded its deadline")
+        try:
+            return fn(deadline.remaining())
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if delay >= deadline.remaining():
+                raise DeadlineExceeded(f"{label} exceeded its deadline after {attempt} attempts") from e
+            logger.warning(f"{label} failed ({e}); retry {attempt}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+async def retry_call_async(
+    fn: Callable[[float], Any],
+    *,
+    deadline: Deadline,
+    max_retries: int,
+    is_retryable: Callable[[Exception], bool],
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    label: str = "call"
+) -> Any:
+    """
+    asyncio counterpart of retry_call; fn is a coroutine function, cancelled at the deadline
+
+    Args:
+        fn (Callable): Coroutine function called with the seconds left before the deadline
+        deadline (Deadline): Overall deadline, including backoff sleeps
+        max_retries (int): Retries after the first attempt
+        is_retryable (Callable): Whether an exception is worth retrying
+        base_delay (float): Backoff for the first retry, doubled per retry
+        max_delay (float): Upper bound for one backoff
+        label (str): Name used in log messages
+
+    Returns:
+        Any: Result of fn
+    """
+    attempt = 0
+    while True:
+        if deadline.expired():
+            raise DeadlineExceeded(f"{label} exceeded its deadline")
+        remaining = deadline.remaining()
+        try:
+            return await asyncio.wait_for(fn(remaining), timeout=remaining)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f"{label} exceeded its deadline") from e
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if delay >= deadline.remaining():
+                raise DeadlineExceeded(f"{label} exceeded its deadline after {attempt} attempts") from e
+            logger.warning(f"{label} failed ({e}); retry {attempt}/{max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of calls in flight; callers wait up to queue_timeout for a slot
+
+    Args:
+        max_in_flight (int): Maximum concurrent calls
+        queue_timeout (float): Seconds to wait for a slot before raising Overloaded
+    """
+
+    def __init__(self, max_in_flight: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def __enter__(self):
+        if not self._semaphore.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(f"More than {self.max_in_flight} calls in flight")
+        with self._lock:
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+    async def __aenter__(self):
+        # Wait for a slot off the event loop, so sync and async callers share one cap
+        acquire = asyncio.ensure_future(asyncio.to_thread(self._semaphore.acquire, True, self.queue_timeout))
+        try:
+            acquired = await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The worker thread cannot be interrupted and may still get a slot; hand it back
+            acquire.add_done_callback(self._release_abandoned)
+            raise
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(f"More than {self.max_in_flight} calls in flight")
+        with self._lock:
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def _release_abandoned(self, acquire: "asyncio.Future") -> None:
+        if not acquire.cancelled() and acquire.exception() is None and acquire.result():
+            self._semaphore.release()
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while instead of letting every caller wait on it
+
+    After failure_threshold consecutive failures the circuit opens and calls fail fast with
+    CircuitOpen. Once reset_timeout has passed, one trial call is let through (half-open):
+    success closes the circuit again, failure re-opens it.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_timeout (float): Seconds the circuit stays open before a trial call
+        name (str): Name used in log messages
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "service"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen unless a call may go through now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = True
+                return
+            self.short_circuited += 1
+            raise CircuitOpen(f"{self.name} circuit is open after repeated failures")
+
+    def record_success(self) -> None:
+        """The service answered; client errors such as a rejected prompt count as answers too"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"{self.name} circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"{self.name} circuit opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is in flight
+    wait for it and receive the same result or exception. Nothing is kept afterwards, so
+    results are never stale.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with this key
+
+        Args:
+            key (str): Identity of the call
+            fn (Callable): Work to run when no identical call is in flight
+
+        Returns:
+            tuple: (result, shared) where shared is True if another caller's execution was reused
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = SingleFlight._Call()
+                self.executed += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.executed + self.collapsed
+            return {
+                "executed": self.executed,
+                "collapsed": self.collapsed,
+                "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+                "in_flight": len(self._calls)
+            }
+
+
+class LatencyRecorder:
+    """
+    Rolling latency and error statistics per label
+
+    Args:
+        window (int): Number of recent calls kept per label for percentiles
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, label: str, seconds: float, ok: bool, retries: int = 0) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(label, deque(maxlen=self.window))
+            samples.append(seconds)
+            counts = self._counts.setdefault(label, {"calls": 0, "errors": 0, "retries": 0})
+            counts["calls"] += 1
+            counts["errors"] += 0 if ok else 1
+            counts["retries"] += retries
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Counts plus mean/p50/p95/p99 latency in milliseconds for every label"""
+        with self._lock:
+            stats = {}
+            for label, samples in self._samples.items():
+                ordered = sorted(samples)
+
+                def percentile(q: float) -> float:
+                    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+                stats[label] = dict(
+                    self._counts[label],
+                    mean_ms=round(sum(ordered) / len(ordered) * 1000, 1),
+                    p50_ms=percentile(0.50),
+                    p95_ms=percentile(0.95),
+                    p99_ms=percentile(0.99)
+                )
+            return stats
+
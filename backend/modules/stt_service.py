@@ -0,0 +1,240 @@
+"""
+Speech-to-Text Service Module
+Splits recordings at silences and transcribes the chunks in parallel with a pluggable recognizer backend
+"""
+
+import os
+import json
+import wave
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Tuple
+import numpy as np
+import speech_recognition as sr
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Backend selection: "google" needs network access, "vosk" and "sphinx" run fully offline
+STT_BACKEND = os.environ.get("STT_BACKEND", "google")
+VOSK_MODEL_PATH = os.environ.get(
+    "VOSK_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "vosk")
+)
+STT_MAX_WORKERS = int(os.environ.get("STT_MAX_WORKERS", 4))
+
+# Silence splitting parameters
+FRAME_MS = 30                # Analysis frame length
+MIN_SILENCE_MS = 500         # A pause must last this long to become a cut point
+SILENCE_OFFSET_DB = 16       # Frames this far below the recording's loudness count as silence
+MAX_CHUNK_SECONDS = 30       # Chunks longer than this are split evenly
+
+# Messages kept identical to the previous inline implementation in app.py
+NO_SPEECH_MESSAGE = "Audio not clear or no speech detected."
+SERVICE_UNAVAILABLE_MESSAGE = "Speech recognition service unavailable."
+EXTRACTION_FAILED_MESSAGE = "Audio extraction failed."
+
+_executor = ThreadPoolExecutor(max_workers=STT_MAX_WORKERS, thread_name_prefix="stt")
+_vosk_model = None
+_vosk_lock = threading.Lock()
+
+
+def _recognize_google(audio_data: sr.AudioData) -> str:
+    return sr.Recognizer().recognize_google(audio_data)
+
+
+def _recognize_sphinx(audio_data: sr.AudioData) -> str:
+    return sr.Recognizer().recognize_sphinx(audio_data)
+
+
+def _get_vosk_model():
+    """Load the local Vosk model once; the model object is shared by all worker threads"""
+    global _vosk_model
+    if _vosk_model is None:
+        with _vosk_lock:
+            if _vosk_model is None:
+                from vosk import Model, SetLogLevel
+                SetLogLevel(-1)
+                if not os.path.isdir(VOSK_MODEL_PATH):
+                    raise sr.RequestError(f"Vosk model not found at {VOSK_MODEL_PATH}")
+                logger.info(f"Loading Vosk model from {VOSK_MODEL_PATH}")
+                _vosk_model = Model(VOSK_MODEL_PATH)
+    return _vosk_model
+
+
+def _recognize_vosk(audio_data: sr.AudioData) -> str:
+    from vosk import KaldiRecognizer
+    recognizer = KaldiRecognizer(_get_vosk_model(), audio_data.sample_rate)
+    recognizer.AcceptWaveform(audio_data.get_raw_data(convert_width=2))
+    text = json.loads(recognizer.FinalResult()).get("text", "")
+    if not text:
+        raise sr.UnknownValueError()
+    return text
+
+
+_BACKENDS: Dict[str, Callable[[sr.AudioData], str]] = {
+    "google": _recognize_google,
+    "sphinx": _recognize_sphinx,
+    "vosk": _recognize_vosk,
+}
+
+
+def register_backend(name: str, recognize: Callable[[sr.AudioData], str]) -> None:
+    """
+    Register a custom recognizer backend
+
+    Args:
+        name (str): Backend name used with STT_BACKEND or the backend argument
+        recognize (Callable): Takes an sr.AudioData chunk and returns its text. Should raise
+            sr.UnknownValueError for unintelligible audio and sr.RequestError when the engine is unavailable
+    """
+    _BACKENDS[name] = recognize
+
+
+def _read_wav(audio_path: str) -> Tuple[np.ndarray, int]:
+    """Read a PCM WAV file into a mono int16 array"""
+    with wave.open(audio_path, 'rb') as wav_file:
+        sample_rate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+        raw = wav_file.readframes(wav_file.getnframes())
+
+    if sample_width != 2:
+        raise ValueError(f"Expected 16-bit PCM audio, got {sample_width * 8}-bit")
+
+    samples = np.frombuffer(raw, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, sample_rate
+
+
+def split_on_silence(samples: np.ndarray, sample_rate: int) -> List[Tuple[int, int]]:
+    """
+    Split a recording into speech chunks at pauses
+
+    Args:
+        samples (np.ndarray): Mono int16 samples
+        sample_rate (int): Sample rate in Hz
+
+    Returns:
+        List[Tuple[int, int]]: (start_sample, end_sample) of every chunk that contains sound
+    """
+    frame_len = max(1, int(sample_rate * FRAME_MS / 1000))
+    num_frames = len(samples) // frame_len
+    if num_frames == 0:
+        return [(0, len(samples))] if len(samples) else []
+
+    frames = samples[:num_frames * frame_len].astype(np.float32).reshape(num_frames, frame_len)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-9
+    frame_db = 20 * np.log10(rms / 32768.0)
+    overall_db = 20 * np.log10(np.sqrt(np.mean(frames ** 2)) / 32768.0 + 1e-12)
+    silent = frame_db < overall_db - SILENCE_OFFSET_DB
+
+    # Locate runs of silent frames long enough to cut at
+    padded = np.concatenate(([False], silent, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    min_run = max(1, MIN_SILENCE_MS // FRAME_MS)
+    long_runs = (run_ends - run_starts) >= min_run
+
+    # Speech chunks are the gaps between long silent runs
+    bounds = []
+    cursor = 0
+    for run_start, run_end in zip(run_starts[long_runs], run_ends[long_runs]):
+        if run_start > cursor:
+            bounds.append((cursor, run_start))
+        cursor = run_end
+    if cursor < num_frames:
+        bounds.append((cursor, num_frames))
+
+    max_frames = max(1, int(MAX_CHUNK_SECONDS * 1000 / FRAME_MS))
+    chunks = []
+    for start, end in bounds:
+        if silent[start:end].all():
+            continue
+        pieces = int(np.ceil((end - start) / max_frames))
+        cuts = np.linspace(start, end, pieces + 1).astype(int)
+        chunks.extend((int(a) * frame_len, int(b) * frame_len) for a, b in zip(cuts[:-1], cuts[1:]))
+
+    # Keep the unframed tail with the last chunk
+    if chunks and chunks[-1][1] == num_frames * frame_len:
+        chunks[-1] = (chunks[-1][0], len(samples))
+    return chunks
+
+
+def _transcribe_chunk(recognize, samples: np.ndarray, sample_rate: int) -> Dict[str, Any]:
+    audio_data = sr.AudioData(samples.tobytes(), sample_rate, 2)
+    try:
+        return {"text": recognize(audio_data).strip(), "error": None}
+    except sr.UnknownValueError:
+        return {"text": "", "error": None}
+    except sr.RequestError as e:
+        return {"text": "", "error": str(e)}
+
+
+def transcribe_audio_file(audio_path: str, backend: str = None) -> Dict[str, Any]:
+    """
+    Transcribe a WAV file by splitting it at silences and recognizing the chunks in parallel
+
+    Args:
+        audio_path (str): Path to a 16-bit PCM WAV file
+        backend (str): Recognizer backend name, defaults to STT_BACKEND
+
+    Returns:
+        dict: {"text": full transcript or a status message,
+               "segments": [{"start": s, "end": s, "text": str}, ...],
+               "backend": backend name,
+               "failed_chunks": chunks the backend could not transcribe (the transcript is partial if > 0)}
+    """
+    backend = backend or STT_BACKEND
+    result = {"text": EXTRACTION_FAILED_MESSAGE, "segments": [], "backend": backend, "failed_chunks": 0}
+
+    if not os.path.exists(audio_path):
+        logger.warning(f"Audio file not found at {audio_path} for STT.")
+        return result
+
+    recognize = _BACKENDS.get(backend)
+    if recognize is None:
+        logger.error(f"Unknown speech recognition backend: {backend}")
+        result["text"] = SERVICE_UNAVAILABLE_MESSAGE
+        return result
+
+    try:
+        samples, sample_rate = _read_wav(audio_path)
+    except (wave.Error, ValueError, EOFError) as e:
+        logger.error(f"Could not read audio for STT: {e}")
+        return result
+
+    chunks = split_on_silence(samples, sample_rate)
+    logger.info(f"Transcribing {len(chunks)} audio chunks with the {backend} backend")
+
+    futures = [
+        _executor.submit(_transcribe_chunk, recognize, samples[start:end], sample_rate)
+        for start, end in chunks
+    ]
+    outputs = [future.result() for future in futures]
+
+    for (start, end), output in zip(chunks, outputs):
+        if output["text"]:
+            result["segments"].append({
+                "start": round(start / sample_rate, 2),
+                "end": round(end / sample_rate, 2),
+                "text": output["text"]
+            })
+
+    errors = [output["error"] for output in outputs if output["error"]]
+    result["failed_chunks"] = len(errors)
+    if result["segments"]:
+        result["text"] = " ".join(segment["text"] for segment in result["segments"])
+        logger.info(f"Transcribed text: {result['text']}")
+        if errors:
+            logger.warning(f"Transcript is partial: {len(errors)} of {len(chunks)} chunks failed; {errors[0]}")
+    elif errors:
+        logger.error(f"Could not request results from the {backend} speech recognition backend; {errors[0]}")
+        result["text"] = SERVICE_UNAVAILABLE_MESSAGE
+    else:
+        logger.warning("Speech recognition could not understand audio")
+        result["text"] = NO_SPEECH_MESSAGE
+    return result
@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import time
+import tempfile
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import analysis_cache
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, value in (('CACHE_DIR', self.tmp.name), ('ANALYSIS_CACHE_ENABLED', True),
+                            ('ANALYSIS_CACHE_MAX_BYTES', 1 << 20), ('ANALYSIS_CACHE_TTL', 3600)):
+            patcher = patch.object(analysis_cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def entry_path(self, key):
+        return os.path.join(self.tmp.name, f"{key}.json")
+
+    def age(self, key, accessed, modified):
+        now = time.time()
+        os.utime(self.entry_path(key), (now - accessed, now - modified))
+
+    def test_put_then_get(self):
+        self.assertIsNone(analysis_cache.get("missing"))
+        value = {"stt": {"text": "hello"}, "emotion_analysis": {"scores": [0.1, 0.9]}}
+        analysis_cache.put("k1", value)
+        self.assertEqual(analysis_cache.get("k1"), value)
+
+    def test_disabled_cache_stores_nothing(self):
+        with patch.object(analysis_cache, 'ANALYSIS_CACHE_ENABLED', False):
+            analysis_cache.put("k1", {"a": 1})
+            self.assertIsNone(analysis_cache.get("k1"))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_unreadable_entry_is_discarded(self):
+        with open(self.entry_path("k1"), 'w') as f:
+            f.write("{not json")
+        self.assertIsNone(analysis_cache.get("k1"))
+        self.assertFalse(os.path.exists(self.entry_path("k1")))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        payload = {"data": "x" * 400}
+        for key in ("old", "used", "new"):
+            analysis_cache.put(key, payload)
+        self.age("old", accessed=300, modified=300)
+        self.age("used", accessed=300, modified=300)
+        self.age("new", accessed=100, modified=100)
+        # Reading refreshes the access time, so "used" outlives the newer but idle "new"
+        self.assertIsNotNone(analysis_cache.get("used"))
+
+        size = os.path.getsize(self.entry_path("old"))
+        with patch.object(analysis_cache, 'ANALYSIS_CACHE_MAX_BYTES', 3 * size):
+            analysis_cache.put("latest", payload)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["latest.json", "new.json", "used.json"])
+
+    def test_entries_expire_after_the_ttl(self):
+        analysis_cache.put("k1", {"a": 1})
+        analysis_cache.put("k2", {"b": 2})
+        # Use does not extend retention: expiry counts from when the entry was written
+        self.age("k1", accessed=0, modified=7200)
+        self.assertIsNone(analysis_cache.get("k1"))
+        self.assertFalse(os.path.exists(self.entry_path("k1")))
+
+        self.age("k2", accessed=7200, modified=7200)
+        analysis_cache.put("k3", {"c": 3})
+        self.assertFalse(os.path.exists(self.entry_path("k2")))
+
+        with patch.object(analysis_cache, 'ANALYSIS_CACHE_TTL', 0):
+            self.age("k3", accessed=10 ** 6, modified=10 ** 6)
+            self.assertEqual(analysis_cache.get("k3"), {"c": 3})
+
+    def test_model_fingerprint_changes_with_the_models(self):
+        model_path = os.path.join(self.tmp.name, "model.pt")
+        bundle_dir = os.path.join(self.tmp.name, "bundle")
+        os.makedirs(bundle_dir)
+        with open(model_path, 'wb') as f:
+            f.write(b"weights")
+        with open(os.path.join(bundle_dir, "face.onnx"), 'wb') as f:
+            f.write(b"graph")
+
+        fingerprint = analysis_cache.model_fingerprint([model_path, bundle_dir], "vosk")
+        self.assertEqual(analysis_cache.model_fingerprint([model_path, bundle_dir], "vosk"), fingerprint)
+        self.assertNotEqual(analysis_cache.model_fingerprint([model_path, bundle_dir], "google"), fingerprint)
+
+        with open(model_path, 'wb') as f:
+            f.write(b"retrained weights")
+        retrained = analysis_cache.model_fingerprint([model_path, bundle_dir], "vosk")
+        self.assertNotEqual(retrained, fingerprint)
+
+        with open(os.path.join(bundle_dir, "voice.onnx"), 'wb') as f:
+            f.write(b"graph")
+        self.assertNotEqual(analysis_cache.model_fingerprint([model_path, bundle_dir], "vosk"), retrained)
+
+        missing = analysis_cache.model_fingerprint([os.path.join(self.tmp.name, "absent.pt")], "vosk")
+        self.assertNotEqual(missing, fingerprint)
+        self.assertNotEqual(analysis_cache.make_key("abc", fingerprint), analysis_cache.make_key("abc", retrained))
+
+    def test_hash_file(self):
+        path = os.path.join(self.tmp.name, "video.mp4")
+        with open(path, 'wb') as f:
+            f.write(b"frames" * 1000)
+        self.assertEqual(analysis_cache.hash_file(path), analysis_cache.hash_file(path, chunk_size=7))
+
+
+if __name__ == '__main__':
+    unittest.main()
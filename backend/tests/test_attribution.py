@@ -0,0 +1,76 @@
+import unittest
+import os
+import sys
+import json
+import pickle
+import numpy as np
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.preprocessing import HeartFailurePreprocessor
+from utils.attribution import integrated_gradients, feature_attributions, explain_batch, baseline_for
+
+try:
+    import tensorflow as tf
+except ImportError:
+    tf = None
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+
+class TestAttribution(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(MODEL_DIR, "preprocessing_info.json")) as f:
+            prep_info = json.load(f)
+        with open(os.path.join(MODEL_DIR, "encoder_categories.pkl"), "rb") as f:
+            encoder_categories = pickle.load(f)
+        cls.preprocessor = HeartFailurePreprocessor(
+            prep_info,
+            np.load(os.path.join(MODEL_DIR, "scaler_mean.npy")),
+            np.load(os.path.join(MODEL_DIR, "scaler_scale.npy")),
+            encoder_categories
+        )
+        cls.record = {
+            "Age": 60, "RestingBP": 140, "Cholesterol": 280, "FastingBS": 1, "MaxHR": 110, "Oldpeak": 2.5,
+            "Sex": "M", "ChestPainType": "ATA", "RestingECG": "ST", "ExerciseAngina": "Y", "ST_Slope": "Flat"
+        }
+
+    def test_feature_attributions_fold_one_hot_columns(self):
+        columns = np.arange(self.preprocessor.num_columns, dtype=np.float64)[None, :]
+        features, attributions = feature_attributions(self.preprocessor, columns)
+        self.assertEqual(features[:6], self.preprocessor.numerical_features)
+        # Sex has one column (6), ChestPainType three (7, 8, 9)
+        self.assertEqual(attributions[0, features.index("Sex")], 6)
+        self.assertEqual(attributions[0, features.index("ChestPainType")], 7 + 8 + 9)
+        self.assertAlmostEqual(attributions.sum(), columns.sum())
+
+    @unittest.skipIf(tf is None, "TensorFlow is not installed")
+    def test_integrated_gradients_linear_model_is_exact(self):
+        weights = np.linspace(-1, 1, self.preprocessor.num_columns).astype(np.float32)
+        model = tf.keras.Sequential([
+            tf.keras.Input(shape=(self.preprocessor.num_columns,)),
+            tf.keras.layers.Dense(1, use_bias=False)
+        ])
+        model.layers[0].set_weights([weights[:, None]])
+
+        X = self.preprocessor.transform([self.record, dict(self.record, Sex="F")])
+        attributions = integrated_gradients(model, X, baseline_for(self.preprocessor))
+        np.testing.assert_allclose(attributions, X * weights, rtol=1e-5, atol=1e-6)
+
+    @unittest.skipIf(tf is None, "TensorFlow is not installed")
+    def test_explain_batch_completeness(self):
+        model = tf.keras.models.load_model(os.path.join(MODEL_DIR, "heart_disease_model.keras"))
+        X = self.preprocessor.transform([self.record, dict(self.record, Age=35, ExerciseAngina="N")])
+        explanations = explain_batch(model, self.preprocessor, X, steps=64)
+
+        self.assertEqual(len(explanations), 2)
+        baseline = baseline_for(self.preprocessor)[None, :]
+        gap = model(X, training=False).numpy()[:, 0] - model(baseline, training=False).numpy()[0, 0]
+        for explanation, expected in zip(explanations, gap):
+            self.assertEqual(len(explanation["top_factors"]), 3)
+            self.assertAlmostEqual(sum(explanation["attributions"].values()), expected, delta=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
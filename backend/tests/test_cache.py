@@ -0,0 +1,115 @@
+import unittest
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from unittest.mock import patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.cache import LRUTTLCache
+from modules import narrative_cache
+from utils import analysis_generator
+
+
+class TestLRUTTLCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUTTLCache("test", max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = LRUTTLCache("test", max_entries=4, ttl=0.05)
+        cache.set("a", 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_get_or_compute_counts_hits_and_skips_uncacheable(self):
+        cache = LRUTTLCache("test", max_entries=4, ttl=60)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return "text"
+
+        self.assertEqual(cache.get_or_compute("k", compute), "text")
+        self.assertEqual(cache.get_or_compute("k", compute), "text")
+        self.assertEqual(len(calls), 1)
+
+        cache.get_or_compute("err", lambda: "⚠️ failed", should_cache=narrative_cache.is_cacheable)
+        self.assertIsNone(cache.get("err"))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["hit_rate"], 0.25)
+
+    def test_disk_tier_survives_a_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            LRUTTLCache("test", max_entries=4, ttl=60, disk_path=path).set("k", {"text": "narrative"})
+
+            cache = LRUTTLCache("test", max_entries=4, ttl=60, disk_path=path)
+            self.assertEqual(cache.get("k"), {"text": "narrative"})
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            # Promoted into memory on the first read
+            cache.get("k")
+            self.assertEqual(cache.stats()["memory_hits"], 1)
+            cache._db.close()
+
+
+@unittest.skipUnless(narrative_cache.NARRATIVE_CACHE_ENABLED, "Narrative cache disabled")
+class TestNarrativeCache(unittest.TestCase):
+    def setUp(self):
+        narrative_cache.narrative_cache.clear()
+
+    def test_band_profile(self):
+        profile = narrative_cache.band_profile(
+            {"Age": 63, "RestingBP": 138.0, "Oldpeak": 1.2, "ChestPainType": "ASY"},
+            narrative_cache.HEART_FAILURE_BANDS
+        )
+        self.assertEqual(profile, {"Age": "60-65", "RestingBP": "130-140", "Oldpeak": "1-1.5", "ChestPainType": "ASY"})
+
+    def test_patients_in_the_same_bands_share_a_narrative(self):
+        prompts = []
+
+        def narrative_for(patient):
+            profile = narrative_cache.band_profile(patient, narrative_cache.CAD_BANDS)
+
+            def generate():
+                prompts.append(profile)
+                return f"analysis of {profile}"
+
+            return narrative_cache.cached_narrative("cad", {"diagnosis": "CAD", "patient": profile}, generate)
+
+        first = narrative_for({"age": 61, "chol": 241, "cp": 2})
+        second = narrative_for({"age": 64, "chol": 255, "cp": 2})
+        third = narrative_for({"age": 64, "chol": 255, "cp": 3})
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual(len(prompts), 2)
+
+
+    def test_ecg_narratives_are_keyed_by_diagnosis(self):
+        class_map = {0: "Normal beat", 2: "Ventricular ectopic beat"}
+        rng = np.random.default_rng(0)
+        with patch.object(analysis_generator, 'generate_text', side_effect=lambda prompt, **kw: prompt) as generate:
+            first = analysis_generator.generate_cohere_analysis(rng.normal(size=187), 0, class_map)
+            second = analysis_generator.generate_cohere_analysis(rng.normal(size=187) * 3, 0, class_map)
+            other = analysis_generator.generate_cohere_analysis(rng.normal(size=187), 2, class_map)
+        self.assertEqual(first, second)
+        self.assertIn("Ventricular ectopic beat", other)
+        self.assertEqual(generate.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
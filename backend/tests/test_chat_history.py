@@ -0,0 +1,159 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import chat_history
+from modules.prompts import create_chat_prompt
+
+
+def make_history(count):
+    return [{"sender": "user" if i % 2 == 0 else "ai", "content": f"message {i}"} for i in range(count)]
+
+
+def wait_for_folds(timeout=5):
+    end = time.monotonic() + timeout
+    while chat_history._pending and time.monotonic() < end:
+        time.sleep(0.01)
+
+
+class TestChatHistory(unittest.TestCase):
+    def setUp(self):
+        chat_history.summaries.clear()
+        for name, value in (('CHAT_RECENT_MESSAGES', 4), ('CHAT_SUMMARY_MIN_MESSAGES', 2)):
+            patcher = patch.object(chat_history, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_short_history_is_kept_verbatim(self):
+        with patch.object(chat_history, 'generate_gemini_response') as generate:
+            summary, messages = chat_history.compact_history(make_history(4), "Sam", "c1")
+        self.assertIsNone(summary)
+        self.assertEqual([m["content"] for m in messages], [f"message {i}" for i in range(4)])
+        self.assertEqual(messages[1]["role"], "assistant")
+        generate.assert_not_called()
+
+    def test_older_turns_are_folded_into_a_summary(self):
+        with patch.object(chat_history, 'generate_gemini_response',
+                          return_value={"summary": "Sam talked about work stress."}) as generate:
+            # First turn: nothing summarized yet, so everything stays verbatim while folding runs
+            summary, messages = chat_history.compact_history(make_history(10), "Sam", "c1")
+            self.assertIsNone(summary)
+            self.assertEqual(len(messages), 10)
+            wait_for_folds()
+            self.assertEqual(generate.call_count, 1)
+            self.assertIn("message 5", generate.call_args[0][0])
+            self.assertNotIn("message 6", generate.call_args[0][0])
+
+            summary, messages = chat_history.compact_history(make_history(10), "Sam", "c1")
+            self.assertEqual(summary, "Sam talked about work stress.")
+            self.assertEqual([m["content"] for m in messages], [f"message {i}" for i in range(6, 10)])
+
+            # Two more turns: only the messages that left the recent window are folded
+            summary, messages = chat_history.compact_history(make_history(12), "Sam", "c1")
+            self.assertEqual(len(messages), 6)
+            wait_for_folds()
+            prompt = generate.call_args[0][0]
+            self.assertIn("Sam talked about work stress.", prompt)
+            self.assertIn("message 7", prompt)
+            self.assertNotIn("message 5", prompt)
+
+    def test_short_increments_do_not_fold(self):
+        with patch.object(chat_history, 'CHAT_SUMMARY_MIN_MESSAGES', 4), \
+                patch.object(chat_history, 'generate_gemini_response',
+                             return_value={"summary": "Sam talked about work stress."}) as generate:
+            chat_history.compact_history(make_history(10), "Sam", "c1")
+            wait_for_folds()
+            self.assertEqual(generate.call_count, 1)
+
+            # Each turn adds two messages; the summary is only updated once four are unfolded
+            for count in (12, 12, 14):
+                summary, messages = chat_history.compact_history(make_history(count), "Sam", "c1")
+                wait_for_folds()
+                self.assertEqual(generate.call_count, 2 if count == 14 else 1)
+            self.assertEqual(summary, "Sam talked about work stress.")
+            self.assertEqual(len(messages), 8)
+            self.assertIn("message 9", generate.call_args[0][0])
+            self.assertNotIn("message 5", generate.call_args[0][0])
+
+    def test_backlog_is_folded_early_when_it_does_not_fit(self):
+        history = [{"sender": "user", "content": "x" * 400} for _ in range(6)]
+        with patch.object(chat_history, 'CHAT_SUMMARY_MIN_MESSAGES', 10), \
+                patch.object(chat_history, 'generate_gemini_response', return_value={"summary": "s"}) as generate:
+            chat_history.compact_history(history, "Sam", "c1", token_budget=10000)
+            wait_for_folds()
+            generate.assert_not_called()
+            chat_history.compact_history(history, "Sam", "c1", token_budget=250)
+            wait_for_folds()
+            generate.assert_called_once()
+
+    def test_summaries_are_per_conversation(self):
+        with patch.object(chat_history, 'generate_gemini_response', return_value={"summary": "first"}):
+            chat_history.compact_history(make_history(10), "Sam", "c1")
+            wait_for_folds()
+        summary, messages = chat_history.compact_history(make_history(10), "Sam", "c2")
+        wait_for_folds()
+        self.assertIsNone(summary)
+        self.assertEqual(len(messages), 10)
+
+    def test_conversations_with_the_same_name_never_share_a_summary(self):
+        other = [{"sender": "user", "content": f"other {i}"} for i in range(10)]
+        with patch.object(chat_history, 'generate_gemini_response',
+                          return_value={"summary": "Sam described private details."}) as generate:
+            chat_history.compact_history(make_history(10), "Patient", "c1")
+            wait_for_folds()
+            summary, _ = chat_history.compact_history(other, "Patient", "c2")
+            wait_for_folds()
+            self.assertIsNone(summary)
+            self.assertNotIn("private details", generate.call_args[0][0])
+
+            # Same conversation key but a history the summary was not built from
+            summary, messages = chat_history.compact_history(other, "Patient", "c1")
+            self.assertIsNone(summary)
+            self.assertEqual(len(messages), 10)
+            wait_for_folds()
+
+    def test_no_summary_without_a_conversation_id(self):
+        with patch.object(chat_history, 'generate_gemini_response') as generate:
+            summary, messages = chat_history.compact_history(make_history(10), "Patient")
+            wait_for_folds()
+        self.assertIsNone(summary)
+        self.assertEqual(len(messages), 10)
+        generate.assert_not_called()
+
+    def test_failed_summary_keeps_turns_verbatim(self):
+        with patch.object(chat_history, 'generate_gemini_response', return_value={"error": "unavailable"}):
+            chat_history.compact_history(make_history(10), "Sam", "c1")
+            wait_for_folds()
+            summary, messages = chat_history.compact_history(make_history(10), "Sam", "c1")
+            wait_for_folds()
+        self.assertIsNone(summary)
+        self.assertEqual(len(messages), 10)
+
+    def test_budget_drops_the_oldest_turns(self):
+        history = [{"sender": "user", "content": "x" * 400} for _ in range(4)]
+        with patch.object(chat_history, 'generate_gemini_response'):
+            _, messages = chat_history.compact_history(history, "Sam", "c1", token_budget=250)
+        # Each message costs about 108 tokens, so only the newest two fit
+        self.assertEqual(len(messages), 2)
+
+    def test_long_messages_are_truncated(self):
+        history = [{"sender": "user", "content": "y" * 10000}]
+        _, messages = chat_history.compact_history(history, "Sam", "c1", token_budget=10000)
+        self.assertLessEqual(chat_history.estimate_tokens(messages[0]["content"]),
+                             chat_history.CHAT_MESSAGE_MAX_TOKENS)
+        self.assertTrue(messages[0]["content"].endswith("..."))
+
+    def test_summary_is_included_in_chat_prompt(self):
+        prompt = create_chat_prompt("Sam", "Hi again", [], [], conversation_summary="Sam talked about work stress.")
+        self.assertIn("Earlier Conversation Summary", prompt)
+        self.assertIn("Sam talked about work stress.", prompt)
+        self.assertNotIn("Earlier Conversation Summary", create_chat_prompt("Sam", "Hi", [], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.chat_sessions import ChatSessionStore, SessionNotFound
+
+
+class TestChatSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ChatSessionStore(":memory:", context_messages=4, cache_size=2)
+
+    def test_messages_are_appended_in_order(self):
+        session = self.store.create("Sam")
+        self.store.append(session["id"], [{"sender": "user", "content": "hi"}, {"sender": "ai", "content": "hello"}])
+        self.store.append(session["id"], [{"sender": "user", "content": "how are you"}])
+
+        self.assertEqual([m["content"] for m in self.store.recent(session["id"])], ["hi", "hello", "how are you"])
+        self.assertEqual(self.store.get(session["id"])["message_count"], 3)
+        logged = self.store.messages(session["id"])
+        self.assertEqual(logged[0]["sender"], "user")
+        self.assertEqual([m["content"] for m in self.store.messages(session["id"], after_id=logged[1]["id"])],
+                         ["how are you"])
+
+    def test_recent_is_bounded_but_log_is_complete(self):
+        session = self.store.create("Sam")
+        for i in range(6):
+            self.store.append(session["id"], [{"sender": "user", "content": f"m{i}"}])
+        self.assertEqual([m["content"] for m in self.store.recent(session["id"])], ["m2", "m3", "m4", "m5"])
+        self.assertEqual(len(self.store.messages(session["id"])), 6)
+
+    def test_recent_is_reloaded_after_eviction(self):
+        first = self.store.create("Sam")
+        self.store.append(first["id"], [{"sender": "user", "content": f"m{i}"} for i in range(5)])
+        # Two more sessions push the first out of the in-memory cache
+        self.store.create("Alex")
+        self.store.create("Kim")
+        self.assertNotIn(first["id"], self.store._recent)
+        self.assertEqual([m["content"] for m in self.store.recent(first["id"])], ["m1", "m2", "m3", "m4"])
+
+    def test_sessions_survive_a_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.db")
+            store = ChatSessionStore(path)
+            session = store.create("Sam")
+            store.append(session["id"], [{"sender": "user", "content": "remember me"}])
+            store._db.close()
+
+            reopened = ChatSessionStore(path)
+            self.assertEqual(reopened.get(session["id"])["user_name"], "Sam")
+            self.assertEqual(reopened.recent(session["id"]), [{"sender": "user", "content": "remember me"}])
+            reopened._db.close()
+
+    def test_unknown_session(self):
+        self.assertIsNone(self.store.get("missing"))
+        with self.assertRaises(SessionNotFound):
+            self.store.recent("missing")
+        with self.assertRaises(SessionNotFound):
+            self.store.append("missing", [{"sender": "user", "content": "hi"}])
+        self.assertEqual(self.store.messages("missing"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
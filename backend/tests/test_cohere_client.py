@@ -0,0 +1,118 @@
+import unittest
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from modules import cohere_client
+    from modules.resilience import Overloaded
+except ImportError:
+    cohere_client = None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers /v1/generate like the Cohere API; fails the first `failures` requests with 503"""
+    failures = 0
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StandInHandler.requests.append((self.path, body))
+        if StandInHandler.failures > 0:
+            StandInHandler.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"message": "unavailable"}')
+            return
+        payload = {
+            "id": "gen-1",
+            "prompt": body["prompt"],
+            "generations": [{"id": "g-1", "text": f"  echo: {body['prompt'][:20]}  "}]
+        }
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(payload).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(cohere_client is None, "cohere is not installed")
+class TestCohereClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("COHERE_API_KEY", "test-key")
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.original_base_url = cohere_client.COHERE_BASE_URL
+        cohere_client.COHERE_BASE_URL = f"http://127.0.0.1:{cls.server.server_port}"
+        cohere_client.reset_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cohere_client.COHERE_BASE_URL = cls.original_base_url
+        cohere_client.reset_client()
+
+    def setUp(self):
+        StandInHandler.failures = 0
+        StandInHandler.requests = []
+
+    def test_generate_text_uses_shared_client(self):
+        text = cohere_client.generate_text("Patient summary", max_tokens=10, temperature=0.3, label="test")
+        self.assertEqual(text, "echo: Patient summary")
+        self.assertIs(cohere_client.get_client(), cohere_client.get_client())
+        path, body = StandInHandler.requests[0]
+        self.assertTrue(path.endswith('/generate'))
+        self.assertEqual(body["max_tokens"], 10)
+
+    def test_retries_server_errors(self):
+        StandInHandler.failures = 2
+        original = cohere_client.COHERE_MAX_RETRIES
+        cohere_client.COHERE_MAX_RETRIES = 2
+        try:
+            text = cohere_client.generate_text("retry me", max_tokens=5, temperature=0.0, label="retry")
+        finally:
+            cohere_client.COHERE_MAX_RETRIES = original
+        self.assertEqual(text, "echo: retry me")
+        self.assertEqual(len(StandInHandler.requests), 3)
+        self.assertEqual(cohere_client.metrics()["latency"]["retry"]["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        StandInHandler.failures = 10
+        original = cohere_client.COHERE_MAX_RETRIES
+        cohere_client.COHERE_MAX_RETRIES = 1
+        try:
+            with self.assertRaises(Exception):
+                cohere_client.generate_text("fail", max_tokens=5, temperature=0.0, label="fail")
+        finally:
+            cohere_client.COHERE_MAX_RETRIES = original
+        self.assertEqual(len(StandInHandler.requests), 2)
+        self.assertEqual(cohere_client.metrics()["latency"]["fail"]["errors"], 1)
+
+    def test_in_flight_cap(self):
+        limiter = cohere_client.limiter
+        original_timeout = limiter.queue_timeout
+        limiter.queue_timeout = 0.05
+        held = []
+        try:
+            for _ in range(limiter.max_in_flight):
+                held.append(limiter.__enter__())
+            with self.assertRaises(Overloaded):
+                cohere_client.generate_text("busy", max_tokens=5, temperature=0.0, label="busy")
+        finally:
+            for item in held:
+                item.__exit__(None, None, None)
+            limiter.queue_timeout = original_timeout
+        self.assertEqual(StandInHandler.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
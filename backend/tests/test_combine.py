@@ -0,0 +1,173 @@
+import unittest
+import os
+import sys
+import json
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.combine import (
+    preprocess_faces, IMAGENET_MEAN, IMAGENET_STD, FACE_INPUT_SIZE, EMOTIONS, EmotionAnalysis,
+    combine_probabilities, analyze_temporal_trends, map_to_mental_health
+)
+
+# Agreement with the torchvision pipeline, in normalized units (1 uint8 level is about 0.017)
+FACE_MEAN_TOLERANCE = 0.02
+FACE_MAX_TOLERANCE = 0.25
+
+
+def smooth_crop(rng, height, width):
+    """Random image with face-like smoothness rather than per-pixel noise"""
+    coarse = torch.from_numpy(rng.integers(0, 256, size=(3, height // 8 + 1, width // 8 + 1)).astype(np.float32))
+    image = torch.nn.functional.interpolate(coarse[None], size=(height, width), mode="bilinear")[0]
+    return np.ascontiguousarray(image.permute(1, 2, 0).clamp(0, 255).byte().numpy())
+
+
+def torchvision_reference(face):
+    transform = transforms.Compose([
+        transforms.ToPILImage(),
+        transforms.Resize((FACE_INPUT_SIZE, FACE_INPUT_SIZE)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=IMAGENET_MEAN.tolist(), std=IMAGENET_STD.tolist())
+    ])
+    return transform(face)
+
+
+def legacy_combine_probabilities(face_probs, voice_probs, frame_rate=1, segment_length=2):
+    """The per-segment loop combine_probabilities replaced"""
+    num_frames = len(face_probs)
+    num_segments = len(voice_probs)
+    frames_per_segment = int(frame_rate * segment_length)
+    combined_probs = []
+    for i in range(min(num_segments, (num_frames // frames_per_segment) + 1)):
+        start_frame = i * frames_per_segment
+        end_frame = min((i + 1) * frames_per_segment, num_frames)
+        if end_frame > start_frame:
+            face_segment_probs = np.mean(face_probs[start_frame:end_frame], axis=0)
+        else:
+            face_segment_probs = face_probs[start_frame] if start_frame < num_frames else np.zeros(len(EMOTIONS))
+        voice_segment_probs = voice_probs[i] if i < num_segments else np.zeros(len(EMOTIONS))
+        combined_probs.append((face_segment_probs + voice_segment_probs) / 2)
+    return np.array(combined_probs)
+
+
+def legacy_report(combined_probs, segment_length=2):
+    """The text process_video returned before it produced an EmotionAnalysis"""
+    output = "Temporal Emotion Trends:\n"
+    for i, probs in enumerate(combined_probs):
+        output += (f"- [{i * segment_length:.1f}s - {(i + 1) * segment_length:.1f}s]: "
+                   f"{EMOTIONS[np.argmax(probs)].capitalize()} ({np.max(probs)*100:.1f}%)\n")
+
+    changes = []
+    for i in range(1, len(combined_probs)):
+        prev_emotion, curr_emotion = EMOTIONS[np.argmax(combined_probs[i - 1])], EMOTIONS[np.argmax(combined_probs[i])]
+        if prev_emotion != curr_emotion:
+            changes.append(f"Emotion shift from {prev_emotion.capitalize()} to {curr_emotion.capitalize()} "
+                           f"at {i * segment_length:.1f}s")
+    sad_std = np.std(combined_probs[:, EMOTIONS.index('sad')]) * 100
+    happy_std = np.std(combined_probs[:, EMOTIONS.index('happy')]) * 100
+    if sad_std > 15:
+        changes.append(f"High variability in sadness ({sad_std:.1f}%)")
+    if happy_std > 15:
+        changes.append(f"High variability in happiness ({happy_std:.1f}%)")
+    if changes:
+        output += "\nNotable Changes:\n"
+        for change in changes:
+            output += f"- {change}\n"
+
+    emotion_scores = dict(zip(EMOTIONS, np.mean(combined_probs, axis=0)))
+    output += "\nEmotion Scores (Average):\n"
+    for emotion, score in emotion_scores.items():
+        output += f"{emotion.capitalize()}: {score*100:.1f}%\n"
+
+    insights = []
+    if emotion_scores['sad'] > 0.5 or (emotion_scores['sad'] + emotion_scores['neutral']) > 0.7:
+        insights.append(f"Potential low mood detected ({emotion_scores['sad']*100:.1f}% sadness)")
+    if emotion_scores['fear'] > 0.4 or emotion_scores['angry'] > 0.4:
+        insights.append(f"Potential anxiety detected "
+                        f"({max(emotion_scores['fear'], emotion_scores['angry'])*100:.1f}% confidence)")
+    if emotion_scores['happy'] > 0.6:
+        insights.append(f"Positive mental state detected ({emotion_scores['happy']*100:.1f}% happiness)")
+    if emotion_scores['surprise'] > 0.4:
+        insights.append(f"Possible emotional reactivity detected ({emotion_scores['surprise']*100:.1f}% surprise)")
+    if not insights:
+        insights.append("No clear mental health indicators detected.")
+    output += "\nMental Health Insights:\n"
+    for insight in insights:
+        output += f"- {insight}\n"
+
+    output += "\nNote: This is not a clinical diagnosis. Consult a mental health professional."
+    return output
+
+
+def random_probs(rng, rows, concentration=0.3):
+    return rng.dirichlet(np.full(len(EMOTIONS), concentration), size=rows)
+
+
+def build_analysis(combined_probs):
+    timeline, changes = analyze_temporal_trends(combined_probs)
+    emotion_scores, insights = map_to_mental_health(combined_probs)
+    return EmotionAnalysis(timeline=timeline, changes=changes, emotion_scores=emotion_scores, insights=insights)
+
+
+class TestPreprocessFaces(unittest.TestCase):
+    def assert_matches_torchvision(self, sizes):
+        rng = np.random.default_rng(0)
+        faces = [smooth_crop(rng, height, width) for height, width in sizes]
+        batch = preprocess_faces(faces)
+        self.assertEqual(tuple(batch.shape), (len(faces), 3, FACE_INPUT_SIZE, FACE_INPUT_SIZE))
+        reference = torch.stack([torchvision_reference(face) for face in faces])
+        diff = (batch - reference).abs()
+        self.assertLess(diff.mean().item(), FACE_MEAN_TOLERANCE)
+        self.assertLess(diff.max().item(), FACE_MAX_TOLERANCE)
+
+    def test_downscaled_crops_match_torchvision(self):
+        self.assert_matches_torchvision([(400, 380), (300, 260), (450, 450), (230, 500)])
+
+    def test_upscaled_crops_match_torchvision(self):
+        self.assert_matches_torchvision([(100, 90), (150, 200), (224, 120)])
+
+    def test_mixed_crops_match_torchvision(self):
+        self.assert_matches_torchvision([(400, 100), (100, 400), (224, 224)])
+
+    def test_unscaled_crop_is_exact(self):
+        face = smooth_crop(np.random.default_rng(1), FACE_INPUT_SIZE, FACE_INPUT_SIZE)
+        self.assertTrue(torch.allclose(preprocess_faces([face])[0], torchvision_reference(face), atol=1e-5))
+
+
+class TestEmotionAnalysis(unittest.TestCase):
+    def test_combine_probabilities_matches_the_loop(self):
+        rng = np.random.default_rng(0)
+        # Fewer, equal and more face frames than voice segments cover partial and empty segments
+        for num_frames, num_segments in ((1, 4), (7, 4), (8, 4), (9, 4), (20, 3), (5, 10)):
+            face_probs, voice_probs = random_probs(rng, num_frames), random_probs(rng, num_segments)
+            expected = legacy_combine_probabilities(face_probs, voice_probs)
+            combined = combine_probabilities(face_probs, voice_probs, video_duration=2 * num_segments)
+            self.assertEqual(combined.shape, expected.shape)
+            self.assertTrue(np.allclose(combined, expected))
+
+    def test_to_text_matches_the_previous_report(self):
+        rng = np.random.default_rng(1)
+        cases = [
+            random_probs(rng, 6),
+            random_probs(rng, 5, concentration=5.0),
+            np.tile(np.eye(len(EMOTIONS))[EMOTIONS.index('sad')], (4, 1)),
+            np.tile(np.eye(len(EMOTIONS))[EMOTIONS.index('happy')], (3, 1)),
+        ]
+        for combined_probs in cases:
+            self.assertEqual(build_analysis(combined_probs).to_text(), legacy_report(combined_probs))
+
+    def test_dict_round_trip(self):
+        analysis = build_analysis(random_probs(np.random.default_rng(2), 8))
+        data = json.loads(json.dumps(analysis.to_dict()))
+        restored = EmotionAnalysis.from_dict(data)
+        self.assertEqual(restored.to_dict(), analysis.to_dict())
+        self.assertEqual(restored.to_text(), analysis.to_text())
+        self.assertTrue(np.array_equal(restored.timeline.dominant, analysis.timeline.dominant))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import io
+import os
+import sys
+import numpy as np
+import cv2
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.ecg_processing import (
+    extract_signal_from_image, trace_columns, segment_beats, normalize_signal, signals_from_samples, parse_signal_file,
+    image_dimensions, decode_scale, decode_ecg_image, trace_from_image, find_lead_rows, extract_leads_from_image
+)
+from utils import ecg_processing
+
+TRACE_SAMPLES = 500
+
+
+def encode_png(image):
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+def synthetic_strip(width=1000, height=200, seed=0):
+    """Dark sine-like trace on a white background, with a few gaps in the line"""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width), 255, np.uint8)
+    x = np.arange(width)
+    y = (height / 2 + height / 4 * np.sin(x / 37.0) + rng.normal(0, 2, width)).astype(int)
+    points = np.stack([x, np.clip(y, 0, height - 1)], axis=1).reshape(-1, 1, 2)
+    cv2.polylines(image, [points], False, 0, 2)
+    image[:, 400:420] = 255
+    return image
+
+
+class TestECGProcessing(unittest.TestCase):
+    def test_trace_columns_matches_per_column_mean(self):
+        rng = np.random.default_rng(1)
+        binary = np.where(rng.random((100, 500)) < 0.03, 255, 0).astype(np.uint8)
+        binary[:, ::17] = 0  # empty columns
+
+        expected = []
+        for col in range(binary.shape[1]):
+            column_pixels = np.where(binary[:, col] > 0)[0]
+            expected.append(np.mean(column_pixels) if column_pixels.size > 0 else np.nan)
+
+        np.testing.assert_array_equal(trace_columns(binary), np.array(expected))
+
+    def test_extract_signal_shape_and_normalization(self):
+        signal = extract_signal_from_image(encode_png(synthetic_strip()))
+        self.assertEqual(signal.shape, (1, 187, 1))
+        self.assertFalse(np.isnan(signal).any())
+        self.assertAlmostEqual(float(np.mean(signal)), 0.0, places=6)
+
+    def test_extract_signal_blank_image(self):
+        blank = np.full((100, 500), 255, np.uint8)
+        with self.assertRaises(ValueError):
+            extract_signal_from_image(encode_png(blank))
+
+    def test_extract_signal_invalid_bytes(self):
+        with self.assertRaises(ValueError):
+            extract_signal_from_image(b"not an image")
+
+    def test_segment_beats_finds_r_peaks(self):
+        # 75 bpm over a 10 s strip, as image row positions (R waves point up, i.e. smaller rows)
+        t = np.arange(TRACE_SAMPLES) * 10.0 / TRACE_SAMPLES
+        trace = 50 - 40 * sum(np.exp(-((t - r) / 0.02) ** 2) for r in np.arange(0.4, 10, 0.8))
+        beats, peak_times = segment_beats(trace, duration_seconds=10)
+
+        self.assertEqual(beats.shape, (12, 187, 1))
+        np.testing.assert_allclose(peak_times, np.arange(0.4, 10, 0.8), atol=0.02)
+        self.assertAlmostEqual(float(beats[:, 0].min()), 1.0, delta=0.1)
+        # Window is 1.2 x the 100 sample RR interval, zero padded to 187
+        self.assertTrue(np.all(beats[:-1, 120:] == 0))
+
+    def test_segment_beats_flat_signal(self):
+        with self.assertRaises(ValueError):
+            segment_beats(np.full(TRACE_SAMPLES, 50.0))
+
+    def test_signals_from_samples_matches_single_path(self):
+        rng = np.random.default_rng(2)
+        signals = [rng.normal(size=360), rng.normal(size=360), rng.normal(size=250)]
+        batch, indices, errors = signals_from_samples(signals)
+
+        self.assertEqual(batch.shape, (3, 187, 1))
+        self.assertEqual(indices, [0, 1, 2])
+        self.assertEqual(errors, {})
+        for row, samples in enumerate(signals):
+            np.testing.assert_allclose(batch[row:row + 1], normalize_signal(samples), atol=1e-12)
+
+    def test_signals_from_samples_rejects_bad_rows(self):
+        signals = [np.sin(np.arange(100) / 5.0), [1.0] * 50, [1.0, 2.0], [np.nan] * 40]
+        batch, indices, errors = signals_from_samples(signals)
+        self.assertEqual(batch.shape, (1, 187, 1))
+        self.assertEqual(indices, [0])
+        self.assertEqual(sorted(errors), [1, 2, 3])
+
+    def test_parse_signal_file_csv_and_npy(self):
+        csv_signals = parse_signal_file(b"lead_ii\n1,2,3\n4,5\n", "signals.csv")
+        self.assertEqual([s.tolist() for s in csv_signals], [[1, 2, 3], [4, 5]])
+
+        buffer = io.BytesIO()
+        np.save(buffer, np.zeros((3, 20), np.float32))
+        self.assertEqual(len(parse_signal_file(buffer.getvalue(), "signals.npy")), 3)
+
+        with self.assertRaises(ValueError):
+            parse_signal_file(b"", "signals.json")
+
+    def test_image_dimensions_from_header(self):
+        image = np.zeros((123, 456), np.uint8)
+        self.assertEqual(image_dimensions(encode_png(image)), (456, 123))
+        self.assertEqual(image_dimensions(cv2.imencode('.jpg', image)[1].tobytes()), (456, 123))
+        self.assertIsNone(image_dimensions(cv2.imencode('.bmp', image)[1].tobytes()))
+
+    def test_decode_scale(self):
+        self.assertEqual(decode_scale(4000, 3000), 4)
+        self.assertEqual(decode_scale(8000, 1600), 8)
+        self.assertEqual(decode_scale(1280, 735), 1)
+
+    def test_reduced_decode_keeps_trace(self):
+        large = cv2.resize(synthetic_strip(), (4000, 800), interpolation=cv2.INTER_NEAREST)
+        data = cv2.imencode('.jpg', large)[1].tobytes()
+        decoded = decode_ecg_image(data)
+        self.assertEqual(decoded.shape, (200, 1000))
+
+        full = trace_from_image(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE))
+        self.assertLessEqual(np.abs(trace_from_image(decoded) - full).max(), 1.5)
+
+    def test_oversized_image_rejected(self):
+        data = encode_png(np.zeros((300, 400), np.uint8))
+        original = ecg_processing.MAX_ECG_IMAGE_PIXELS
+        ecg_processing.MAX_ECG_IMAGE_PIXELS = 100_000
+        try:
+            with self.assertRaises(ValueError):
+                decode_ecg_image(data)
+        finally:
+            ecg_processing.MAX_ECG_IMAGE_PIXELS = original
+
+    def test_find_lead_rows_uneven_sheet(self):
+        sheet = np.full((900, 800), 255, np.uint8)
+        for centre in (130, 470, 760):  # uneven spacing
+            sheet[centre - 40:centre + 40:8, :] = 0
+        rows = find_lead_rows(sheet, 3)
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(170 < rows[0][1] < 430)
+        self.assertTrue(510 < rows[1][1] < 720)
+
+    def test_extract_leads_from_sheet(self):
+        rows = [synthetic_strip(width=2400, height=300, seed=seed) for seed in range(4)]
+        sheet = np.vstack(rows)
+        sheet[:, 600:620] = 255
+
+        batch, leads, indices, errors = extract_leads_from_image(encode_png(sheet), rhythm_strip=True)
+        self.assertEqual(len(leads), 13)
+        self.assertEqual(leads[:4], ["I", "aVR", "V1", "V4"])
+        self.assertEqual(leads[-1], "II (rhythm)")
+        self.assertEqual(batch.shape, (13, 187, 1))
+        self.assertEqual(errors, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+import json
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.json_stream import JsonFieldStreamer
+
+
+def feed_in_chunks(text, size):
+    streamer = JsonFieldStreamer("message")
+    pieces = [streamer.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return streamer, pieces
+
+
+class TestJsonFieldStreamer(unittest.TestCase):
+    def test_value_is_decoded_incrementally(self):
+        message = 'Line one\n"quoted" \\ tab\t café \U0001F600 {not: json}'
+        text = '```json\n' + json.dumps({"other": {"message": "nested"}, "message": message, "z": 1}) + '\n```'
+        for size in (1, 2, 3, 7, len(text)):
+            streamer, pieces = feed_in_chunks(text, size)
+            self.assertEqual(''.join(pieces), message)
+            self.assertEqual(streamer.text, message)
+            self.assertTrue(streamer.done)
+
+    def test_text_arrives_before_the_json_is_complete(self):
+        streamer = JsonFieldStreamer("message")
+        self.assertEqual(streamer.feed('{"message": "Hel'), 'Hel')
+        self.assertEqual(streamer.feed('lo'), 'lo')
+        self.assertFalse(streamer.done)
+
+    def test_only_top_level_keys_match(self):
+        streamer, pieces = feed_in_chunks('{"a": "message", "b": ["message", {"message": "x"}]}', 4)
+        self.assertEqual(''.join(pieces), '')
+        self.assertFalse(streamer.done)
+
+    def test_lone_surrogate_is_replaced(self):
+        streamer, pieces = feed_in_chunks('{"message": "a\\ud800\\nb"}', 1)
+        self.assertEqual(''.join(pieces), 'a�\nb')
+
+    def test_malformed_unicode_escape_is_replaced(self):
+        for size in (1, 3, 100):
+            streamer, pieces = feed_in_chunks('{"message": "a\\uZZZZb\\u12\\ud800\\u12", "z": 1}', size)
+            self.assertEqual(''.join(pieces), 'a\ufffdb\ufffd\ufffd\ufffd')
+            self.assertTrue(streamer.done)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import os
+import sys
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from modules import llm_gateway
+    from modules.resilience import CircuitBreaker, CircuitOpen, Overloaded
+except ImportError:
+    llm_gateway = None
+
+
+def candidate(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers generateContent/streamGenerateContent like the Gemini API; fails the first `failures` with 503"""
+    failures = 0
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StandInHandler.requests.append(self.path)
+        if StandInHandler.failures > 0:
+            StandInHandler.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"error": {"code": 503, "message": "unavailable", "status": "UNAVAILABLE"}}')
+            return
+        prompt = body["contents"][0]["parts"][0]["text"]
+        if ':streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for word in prompt.split():
+                self.wfile.write(f"data: {json.dumps(candidate(word + ' '))}\r\n\r\n".encode())
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(candidate(f"echo: {prompt}")).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(llm_gateway is None, "google-genai is not installed")
+class TestLLMGateway(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.original = (llm_gateway.GEMINI_BASE_URL, llm_gateway.GOOGLE_API_KEY, llm_gateway.GEMINI_MAX_RETRIES)
+        llm_gateway.GEMINI_BASE_URL = f"http://127.0.0.1:{cls.server.server_port}"
+        llm_gateway.GOOGLE_API_KEY = "test-key"
+        llm_gateway.reset_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        llm_gateway.GEMINI_BASE_URL, llm_gateway.GOOGLE_API_KEY, llm_gateway.GEMINI_MAX_RETRIES = cls.original
+        llm_gateway.reset_client()
+
+    def setUp(self):
+        StandInHandler.failures = 0
+        StandInHandler.requests = []
+        llm_gateway.GEMINI_MAX_RETRIES = 2
+        llm_gateway.circuit = CircuitBreaker(3, 60, name="Gemini")
+
+    def generate(self, prompt, label="test"):
+        return llm_gateway.generate_content(model="gemini-test", contents=prompt, config={"temperature": 0.0},
+                                            label=label, timeout=10)
+
+    def test_generate_and_retry(self):
+        StandInHandler.failures = 2
+        self.assertEqual(self.generate("hello", label="retry").text, "echo: hello")
+        self.assertEqual(len(StandInHandler.requests), 3)
+        self.assertTrue(StandInHandler.requests[0].endswith('/models/gemini-test:generateContent'))
+        self.assertEqual(llm_gateway.metrics()["latency"]["retry"]["retries"], 2)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        llm_gateway.GEMINI_MAX_RETRIES = 0
+        StandInHandler.failures = 3
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                self.generate("down")
+        with self.assertRaises(CircuitOpen):
+            self.generate("short-circuited")
+        self.assertEqual(len(StandInHandler.requests), 3)
+        self.assertEqual(llm_gateway.metrics()["circuit"]["state"], "open")
+
+        # After the reset timeout one trial call goes through and closes the circuit again
+        llm_gateway.circuit.reset_timeout = 0
+        self.assertEqual(self.generate("back").text, "echo: back")
+        self.assertEqual(llm_gateway.circuit.state, "closed")
+
+    def test_in_flight_cap(self):
+        limiter = llm_gateway.limiter
+        original_timeout = limiter.queue_timeout
+        limiter.queue_timeout = 0.05
+        held = []
+        try:
+            for _ in range(limiter.max_in_flight):
+                held.append(limiter.__enter__())
+            with self.assertRaises(Overloaded):
+                self.generate("busy")
+        finally:
+            for item in held:
+                item.__exit__(None, None, None)
+            limiter.queue_timeout = original_timeout
+        self.assertEqual(StandInHandler.requests, [])
+
+    def test_stream(self):
+        StandInHandler.failures = 1
+        chunks = list(llm_gateway.stream_content(model="gemini-test", contents="one two three",
+                                                 label="stream", timeout=10))
+        self.assertEqual(chunks, ["one ", "two ", "three "])
+        self.assertIn(':streamGenerateContent', StandInHandler.requests[-1])
+
+    def test_async_api(self):
+        async def run():
+            results = await asyncio.gather(*[
+                llm_gateway.agenerate_content(model="gemini-test", contents=f"p{i}", label="async", timeout=10)
+                for i in range(4)
+            ])
+            chunks = [chunk async for chunk in llm_gateway.astream_content(
+                model="gemini-test", contents="a b", label="async_stream", timeout=10)]
+            return [r.text for r in results], chunks
+
+        texts, chunks = asyncio.run(run())
+        self.assertEqual(texts, [f"echo: p{i}" for i in range(4)])
+        self.assertEqual(chunks, ["a ", "b "])
+
+    def test_deadlines_per_label(self):
+        self.assertEqual(llm_gateway.deadline_for("chat"), llm_gateway.DEFAULT_DEADLINES["chat"])
+        os.environ["GEMINI_DEADLINE_CHAT"] = "3"
+        try:
+            self.assertEqual(llm_gateway.deadline_for("chat"), 3.0)
+        finally:
+            del os.environ["GEMINI_DEADLINE_CHAT"]
+
+
+if __name__ == '__main__':
+    unittest.main()
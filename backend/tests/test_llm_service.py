@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+import time
+import threading
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from modules import llm_service
+except ImportError:
+    llm_service = None
+
+
+def fake_client(*texts):
+    client = MagicMock()
+    client.models.generate_content.side_effect = [MagicMock(text=text) for text in texts]
+    return client
+
+
+@unittest.skipIf(llm_service is None, "google-genai not installed")
+class TestGeminiResponseCache(unittest.TestCase):
+    def setUp(self):
+        llm_service.response_cache.clear()
+
+    def test_uncached_by_default(self):
+        client = fake_client('{"a": 1}', '{"a": 2}')
+        with patch.object(llm_service.llm_gateway, 'get_client', return_value=client):
+            self.assertEqual(llm_service.generate_gemini_response("prompt"), {"a": 1})
+            self.assertEqual(llm_service.generate_gemini_response("prompt"), {"a": 2})
+
+    @unittest.skipUnless(llm_service and llm_service.GEMINI_CACHE_ENABLED, "Gemini cache disabled")
+    def test_identical_requests_hit_the_cache(self):
+        client = fake_client('{"a": 1}', '{"a": 2}', '{"a": 3}')
+        with patch.object(llm_service.llm_gateway, 'get_client', return_value=client):
+            first = llm_service.generate_gemini_response("prompt", cache_ttl=60)
+            first["patient_information"] = {"name": "mutated by caller"}
+            self.assertEqual(llm_service.generate_gemini_response("prompt", cache_ttl=60), {"a": 1})
+            # A different temperature is a different request
+            self.assertEqual(llm_service.generate_gemini_response("prompt", temperature=0.9, cache_ttl=60), {"a": 2})
+            # Bypass fetches a fresh response and refreshes the entry
+            self.assertEqual(llm_service.generate_gemini_response("prompt", cache_ttl=60, bypass_cache=True), {"a": 3})
+            self.assertEqual(llm_service.generate_gemini_response("prompt", cache_ttl=60), {"a": 3})
+        self.assertEqual(client.models.generate_content.call_count, 3)
+        self.assertEqual(llm_service.cache_metrics()["hits"], 2)
+
+    @unittest.skipUnless(llm_service and llm_service.GEMINI_CACHE_ENABLED, "Gemini cache disabled")
+    def test_errors_are_not_cached(self):
+        client = fake_client('not json', '{"a": 1}')
+        with patch.object(llm_service.llm_gateway, 'get_client', return_value=client):
+            self.assertIn("error", llm_service.generate_gemini_response("prompt", cache_ttl=60))
+            self.assertEqual(llm_service.generate_gemini_response("prompt", cache_ttl=60), {"a": 1})
+
+
+@unittest.skipIf(llm_service is None, "google-genai not installed")
+class TestGeminiRequestCoalescing(unittest.TestCase):
+    def test_concurrent_identical_requests_share_one_call(self):
+        release = threading.Event()
+        calls = []
+
+        def generate_content(**kwargs):
+            calls.append(kwargs["contents"])
+            release.wait(5)
+            return MagicMock(text='{"assessment": "shared"}')
+
+        client = MagicMock()
+        client.models.generate_content.side_effect = generate_content
+        before = llm_service.coalescing_metrics()["collapsed"]
+        results = []
+        with patch.object(llm_service.llm_gateway, 'get_client', return_value=client):
+            threads = [threading.Thread(target=lambda: results.append(
+                llm_service.generate_gemini_response("same prompt"))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            while llm_service.coalescing_metrics()["collapsed"] - before < 3:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(calls, ["same prompt"])
+        self.assertEqual(results, [{"assessment": "shared"}] * 4)
+        # Each caller owns its result
+        self.assertEqual(len({id(result) for result in results}), 4)
+        self.assertEqual(llm_service.coalescing_metrics()["in_flight"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
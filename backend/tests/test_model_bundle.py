@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import json
+import tempfile
+import torch
+from torchvision.models import resnet101
+from transformers import Wav2Vec2Config, Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import model_bundle
+
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
+
+
+def tiny_wav2vec_config():
+    """A few-layer Wav2Vec2 so the test does not need the hub or the full base model"""
+    return Wav2Vec2Config(
+        hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64,
+        conv_dim=(16, 16), conv_stride=(5, 2), conv_kernel=(10, 3), num_conv_pos_embeddings=16,
+        num_conv_pos_embedding_groups=2, classifier_proj_size=16
+    )
+
+
+class TestModelBundle(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(0)
+        cls.tmp = tempfile.TemporaryDirectory()
+        base_dir = os.path.join(cls.tmp.name, "base")
+        tiny_wav2vec_config().save_pretrained(base_dir)
+        Wav2Vec2FeatureExtractor().save_pretrained(base_dir)
+
+        cls.resnet = resnet101(weights=None)
+        cls.resnet.fc = torch.nn.Linear(cls.resnet.fc.in_features, len(EMOTIONS))
+        cls.resnet.eval()
+        config = Wav2Vec2Config.from_pretrained(base_dir, num_labels=len(EMOTIONS))
+        cls.wav2vec = Wav2Vec2ForSequenceClassification(config)
+        cls.wav2vec.eval()
+
+        resnet_path = os.path.join(cls.tmp.name, "resnet.pt")
+        wav2vec_path = os.path.join(cls.tmp.name, "wav2vec.pt")
+        torch.save(cls.resnet.state_dict(), resnet_path)
+        torch.save(cls.wav2vec.state_dict(), wav2vec_path)
+
+        cls.bundle_dir = os.path.join(cls.tmp.name, "bundle")
+        with patch.object(model_bundle, 'BASE_WAV2VEC_MODEL', base_dir):
+            model_bundle.export_emotion_bundle(resnet_path, wav2vec_path, cls.bundle_dir, EMOTIONS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_exported_bundle_loads_the_same_models(self):
+        self.assertTrue(model_bundle.bundle_exists(self.bundle_dir))
+        resnet, wav2vec, feature_extractor = model_bundle.load_emotion_bundle(
+            self.bundle_dir, len(EMOTIONS), torch.device("cpu")
+        )
+
+        for name, tensor in self.resnet.state_dict().items():
+            self.assertTrue(torch.equal(resnet.state_dict()[name], tensor), name)
+        for name, tensor in self.wav2vec.state_dict().items():
+            self.assertTrue(torch.equal(wav2vec.state_dict()[name], tensor), name)
+        self.assertEqual([wav2vec.config.id2label[i] for i in range(len(EMOTIONS))], EMOTIONS)
+
+        with torch.no_grad():
+            image = torch.randn(1, 3, 224, 224)
+            self.assertTrue(torch.allclose(resnet(image), self.resnet(image)))
+            audio = feature_extractor(torch.randn(16000).numpy(), sampling_rate=16000, return_tensors="pt")
+            self.assertTrue(torch.allclose(wav2vec(**audio).logits, self.wav2vec(**audio).logits))
+
+    def test_label_count_mismatch_is_rejected(self):
+        with self.assertRaises(ValueError):
+            model_bundle.load_emotion_bundle(self.bundle_dir, len(EMOTIONS) + 1, torch.device("cpu"))
+
+    def test_unknown_format_is_rejected(self):
+        manifest_path = os.path.join(self.bundle_dir, model_bundle.MANIFEST_NAME)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with tempfile.TemporaryDirectory() as other_dir:
+            with open(os.path.join(other_dir, model_bundle.MANIFEST_NAME), "w") as f:
+                json.dump({**manifest, "format": model_bundle.BUNDLE_FORMAT + 1}, f)
+            with self.assertRaises(ValueError):
+                model_bundle.load_emotion_bundle(other_dir, len(EMOTIONS), torch.device("cpu"))
+
+    def test_missing_bundle(self):
+        self.assertFalse(model_bundle.bundle_exists(os.path.join(self.tmp.name, "absent")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+import sys
+import threading
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.narrative_jobs import NarrativeJobs, DONE, FAILED, PENDING, RUNNING
+from modules.resilience import Overloaded
+
+
+class TestNarrativeJobs(unittest.TestCase):
+    def setUp(self):
+        self.jobs = NarrativeJobs(workers=2, ttl=60, max_jobs=3)
+
+    def test_job_runs_in_the_background(self):
+        release = threading.Event()
+
+        def generate():
+            release.wait(5)
+            return "narrative"
+
+        job = self.jobs.submit("cad", generate)
+        self.assertIn(job.status, (PENDING, RUNNING))
+        self.assertNotIn("analysis", job.to_dict())
+
+        release.set()
+        finished = self.jobs.wait(job.id, timeout=5)
+        self.assertEqual(finished.status, DONE)
+        self.assertEqual(finished.to_dict()["analysis"], "narrative")
+
+    def test_failure_is_reported(self):
+        def generate():
+            raise RuntimeError("upstream unavailable")
+
+        job = self.jobs.wait(self.jobs.submit("ecg", generate).id, timeout=5)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.to_dict()["error"], "upstream unavailable")
+
+    def test_registry_is_bounded(self):
+        ids = []
+        for _ in range(5):
+            ids.append(self.jobs.submit("ecg", lambda: "text").id)
+            self.jobs.wait(ids[-1], timeout=5)
+        self.assertIsNone(self.jobs.get(ids[0]))
+        self.assertIsNotNone(self.jobs.get(ids[-1]))
+        self.assertIsNone(self.jobs.wait("missing", timeout=0))
+
+    def test_unfinished_jobs_are_never_evicted(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        done = self.jobs.submit("ecg", lambda: "text")
+        self.jobs.wait(done.id, timeout=5)
+
+        # The finished job makes room for the third unfinished one
+        unfinished = [self.jobs.submit("ecg", lambda: release.wait(5) and "text") for _ in range(3)]
+        self.assertIsNone(self.jobs.get(done.id))
+
+        # Every slot is now pending or running
+        with self.assertRaises(Overloaded):
+            self.jobs.submit("ecg", lambda: "text")
+        self.assertTrue(all(self.jobs.get(job.id) is job for job in unfinished))
+
+        release.set()
+        self.assertEqual(self.jobs.wait(unfinished[2].id, timeout=5).status, DONE)
+
+
+if __name__ == '__main__':
+    unittest.main()
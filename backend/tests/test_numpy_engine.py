@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+import numpy as np
+
+# Add parent directory to path to import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.numpy_engine import load_dense_model
+
+try:
+    import tensorflow as tf
+except ImportError:
+    tf = None
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+MODELS = {"heart_disease_model.keras": 15, "cad_model.keras": 13}
+
+
+class TestNumpyEngine(unittest.TestCase):
+    def test_loads_models(self):
+        for name, num_inputs in MODELS.items():
+            model = load_dense_model(os.path.join(MODEL_DIR, name))
+            self.assertEqual(model.input_shape, (None, num_inputs))
+            probs = model.predict(np.zeros((4, num_inputs), np.float32), verbose=0)
+            self.assertEqual(probs.shape, (4, 1))
+            self.assertTrue(np.all((probs >= 0) & (probs <= 1)))
+
+    def test_input_gradients_match_finite_differences(self):
+        model = load_dense_model(os.path.join(MODEL_DIR, "cad_model.keras"))
+        x = np.random.default_rng(0).normal(size=(1, 13))
+        eps = 1e-3
+        expected = [
+            (model.predict(x + eps * np.eye(13)[i]) - model.predict(x - eps * np.eye(13)[i]))[0, 0] / (2 * eps)
+            for i in range(13)
+        ]
+        np.testing.assert_allclose(model.input_gradients(x)[0], expected, atol=1e-3)
+
+    @unittest.skipIf(tf is None, "TensorFlow is not installed")
+    def test_parity_with_keras(self):
+        rng = np.random.default_rng(1)
+        for name, num_inputs in MODELS.items():
+            path = os.path.join(MODEL_DIR, name)
+            keras_model = tf.keras.models.load_model(path)
+            numpy_model = load_dense_model(path)
+
+            X = (rng.normal(size=(2000, num_inputs)) * 2).astype(np.float32)
+            np.testing.assert_allclose(
+                numpy_model.predict(X), keras_model.predict(X, verbose=0), atol=1e-5
+            )
+
+            inputs = tf.constant(X[:64])
+            with tf.GradientTape() as tape:
+                tape.watch(inputs)
+                outputs = keras_model(inputs, training=False)
+            np.testing.assert_allclose(
+                numpy_model.input_gradients(X[:64]), tape.gradient(outputs, inputs).numpy(), atol=1e-5
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
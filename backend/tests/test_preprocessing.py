@@ -0,0 +1,82 @@
+import unittest
+import os
+import sys
+import json
+import pickle
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.preprocessing import HeartFailurePreprocessor, preprocess_input
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+
+def reference_preprocess(inputs, prep_info, scaler_mean, scaler_scale, encoder_categories):
+    """The original DataFrame-based implementation"""
+    df = pd.DataFrame([inputs], columns=prep_info["feature_order"])
+    scaled_numerical = (df[prep_info["numerical_features"]] - scaler_mean) / scaler_scale
+    cat_data = df[prep_info["categorical_features"]]
+    encoded_categorical = np.zeros((1, sum(len(cats) - 1 for cats in encoder_categories)))
+    col_index = 0
+    for i, categories in enumerate(encoder_categories):
+        val = cat_data.iloc[0, i]
+        for cat in categories[1:]:
+            encoded_categorical[0, col_index] = 1 if val == cat else 0
+            col_index += 1
+    return np.concatenate([scaled_numerical, encoded_categorical], axis=1)
+
+
+class TestHeartFailurePreprocessor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(MODEL_DIR, "preprocessing_info.json")) as f:
+            cls.prep_info = json.load(f)
+        with open(os.path.join(MODEL_DIR, "encoder_categories.pkl"), "rb") as f:
+            cls.encoder_categories = pickle.load(f)
+        cls.scaler_mean = np.load(os.path.join(MODEL_DIR, "scaler_mean.npy"))
+        cls.scaler_scale = np.load(os.path.join(MODEL_DIR, "scaler_scale.npy"))
+        cls.artifacts = (cls.prep_info, cls.scaler_mean, cls.scaler_scale, cls.encoder_categories)
+
+    def random_records(self, count, seed=0):
+        rng = np.random.default_rng(seed)
+        records = []
+        for _ in range(count):
+            record = {feature: float(rng.normal(100, 50)) for feature in self.prep_info["numerical_features"]}
+            record["FastingBS"] = int(rng.integers(0, 2))
+            for feature, categories in zip(self.prep_info["categorical_features"], self.encoder_categories):
+                record[feature] = rng.choice(list(categories) + ["unknown"])
+            records.append(record)
+        return records
+
+    def test_preprocess_input_bit_identical(self):
+        for record in self.random_records(200):
+            expected = reference_preprocess(record, *self.artifacts)
+            actual = preprocess_input(record, *self.artifacts)
+            self.assertEqual(actual.dtype, expected.dtype)
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_batch_transform_matches_rows(self):
+        preprocessor = HeartFailurePreprocessor(*self.artifacts)
+        records = self.random_records(50, seed=1)
+        batch = preprocessor.transform(records)
+        self.assertEqual(batch.shape, (50, self.prep_info["input_shape"]))
+        self.assertEqual(batch.dtype, np.float32)
+        expected = np.vstack([reference_preprocess(r, *self.artifacts) for r in records]).astype(np.float32)
+        np.testing.assert_array_equal(batch, expected)
+
+    def test_transform_arrays_matches_records(self):
+        preprocessor = HeartFailurePreprocessor(*self.artifacts)
+        records = self.random_records(20, seed=2)
+        columns = {feature: [r[feature] for r in records] for feature in self.prep_info["feature_order"]}
+        np.testing.assert_array_equal(preprocessor.transform_arrays(columns), preprocessor.transform(records))
+
+    def test_feature_names(self):
+        preprocessor = HeartFailurePreprocessor(*self.artifacts)
+        self.assertEqual(len(preprocessor.feature_names), self.prep_info["input_shape"])
+        self.assertEqual(preprocessor.feature_names[6], "Sex_M")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+import asyncio
+import contextlib
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.resilience import ConcurrencyLimiter, Overloaded
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+    def test_async_overload(self):
+        limiter = ConcurrencyLimiter(1, queue_timeout=0.05)
+
+        async def run():
+            with limiter:
+                with self.assertRaises(Overloaded):
+                    async with limiter:
+                        pass
+
+        asyncio.run(run())
+        self.assertEqual(limiter.rejected, 1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_cancelled_waiter_does_not_leak_a_slot(self):
+        limiter = ConcurrencyLimiter(1, queue_timeout=2)
+
+        async def wait_for_slot():
+            async with limiter:
+                await asyncio.sleep(10)
+
+        async def run():
+            limiter.__enter__()
+            waiter = asyncio.create_task(wait_for_slot())
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            # The waiter's thread picks up the slot freed here after the task was cancelled
+            limiter.__exit__(None, None, None)
+            with contextlib.suppress(asyncio.CancelledError):
+                await waiter
+            await asyncio.sleep(0.2)
+
+        asyncio.run(run())
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertTrue(limiter._semaphore.acquire(timeout=0.5))
+        limiter._semaphore.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ from flask import json
 import os
 import sys
 import io
+import zipfile
+import numpy as np
 from werkzeug.datastructures import FileStorage
 
 # Add parent directory to path to import app
@@ -140,6 +142,149 @@ class TestRoutes(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('prediction', data)
 
+    @patch('app.extract_signals_from_images')
+    @patch('app.model_.predict')
+    def test_predict_arrhythmia_batch(self, mock_predict, mock_extract):
+        mock_extract.return_value = (
+            np.zeros((2, 187, 1)), [0, 2], {1: "Invalid image data. Cannot decode image."}
+        )
+        mock_predict.return_value = np.array([
+            [0.8, 0.1, 0.05, 0.03, 0.02],
+            [0.1, 0.1, 0.7, 0.05, 0.05]
+        ])
+
+        files = [
+            FileStorage(stream=io.BytesIO(b"a"), filename=f"strip{i}.png", content_type="image/png")
+            for i in range(3)
+        ]
+        response = self.app.post('/predict_arrhythmia_batch',
+                               content_type='multipart/form-data',
+                               data={'files': files})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['classified'], 2)
+        self.assertEqual(data['results'][0]['prediction'], "Normal beat")
+        self.assertIn('error', data['results'][1])
+        self.assertEqual(data['results'][2]['prediction'], "Ventricular ectopic beat")
+        mock_predict.assert_called_once()
+
+    @patch('app.MAX_ECG_BATCH_IMAGES', 2)
+    @patch('app.extract_signals_from_images')
+    def test_predict_arrhythmia_batch_too_many_images(self, mock_extract):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i in range(3):
+                zf.writestr(f"strip{i}.png", b"a")
+        archive.seek(0)
+        response = self.app.post('/predict_arrhythmia_batch',
+                               content_type='multipart/form-data',
+                               data={'files': [(archive, 'strips.zip')]})
+        self.assertEqual(response.status_code, 400)
+        mock_extract.assert_not_called()
+
+    @patch('app.MAX_ECG_BATCH_NARRATIVES', 1)
+    @patch('app.generate_cohere_analysis')
+    @patch('app.extract_signals_from_images')
+    @patch('app.model_.predict')
+    def test_predict_arrhythmia_batch_narrative_cap(self, mock_predict, mock_extract, mock_analysis):
+        mock_extract.return_value = (np.zeros((2, 187, 1)), [0, 1], {})
+        mock_predict.return_value = np.array([
+            [0.8, 0.1, 0.05, 0.03, 0.02],
+            [0.1, 0.1, 0.7, 0.05, 0.05]
+        ])
+        mock_analysis.return_value = "analysis"
+        files = [(io.BytesIO(b"a"), f"strip{i}.png") for i in range(2)]
+        response = self.app.post('/predict_arrhythmia_batch',
+                               content_type='multipart/form-data',
+                               data={'files': files, 'include_analysis': 'true'})
+        data = json.loads(response.data)
+        self.assertEqual(data['results'][0]['analysis'], "analysis")
+        self.assertNotIn('analysis', data['results'][1])
+        mock_analysis.assert_called_once()
+
+    @patch('app.generate_cohere_analysis')
+    @patch('app.extract_beats_from_image')
+    @patch('app.model_.predict')
+    def test_predict_arrhythmia_beats_mode(self, mock_predict, mock_extract, mock_analysis):
+        mock_extract.return_value = (np.zeros((3, 187, 1)), np.array([0.5, 1.3, 2.1]))
+        mock_predict.return_value = np.array([
+            [0.9, 0.05, 0.02, 0.02, 0.01],
+            [0.1, 0.1, 0.7, 0.05, 0.05],
+            [0.8, 0.1, 0.05, 0.03, 0.02]
+        ])
+        mock_analysis.return_value = "analysis"
+
+        data = {'file': (io.BytesIO(b"a"), 'strip.png'), 'mode': 'beats'}
+        response = self.app.post('/predict_arrhythmia',
+                               content_type='multipart/form-data',
+                               data=data)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['beat_count'], 3)
+        self.assertEqual(data['prediction'], "Ventricular ectopic beat")
+        self.assertEqual(data['summary']["Normal beat"], 2)
+        self.assertEqual(data['beats'][1]['time'], 1.3)
+        self.assertEqual(data['heart_rate_bpm'], 75.0)
+        mock_predict.assert_called_once()
+
+    @patch('app.model_.predict')
+    def test_predict_arrhythmia_signals(self, mock_predict):
+        mock_predict.return_value = np.array([
+            [0.1, 0.1, 0.7, 0.05, 0.05],
+            [0.8, 0.1, 0.05, 0.03, 0.02]
+        ])
+        signals = [np.sin(np.arange(360) / 10.0).tolist(), [0.0] * 360, np.cos(np.arange(250) / 7.0).tolist()]
+        response = self.app.post('/predict_arrhythmia_signals', json={'signals': signals})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['classified'], 2)
+        self.assertEqual(data['results'][0]['prediction'], "Ventricular ectopic beat")
+        self.assertIn('error', data['results'][1])
+        self.assertEqual(data['results'][2]['prediction'], "Normal beat")
+
+    def test_predict_arrhythmia_signals_empty(self):
+        response = self.app.post('/predict_arrhythmia_signals', json={'signals': []})
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_arrhythmia_signals_body_must_be_object(self):
+        for body in ([[0.0] * 360], 5):
+            response = self.app.post('/predict_arrhythmia_signals', json=body)
+            self.assertEqual(response.status_code, 400)
+
+    @patch('app.generate_cohere_analysis')
+    @patch('app.model_.predict')
+    def test_predict_arrhythmia_signals_analysis_flag(self, mock_predict, mock_analysis):
+        mock_predict.return_value = np.array([[0.8, 0.1, 0.05, 0.03, 0.02]])
+        signals = [np.sin(np.arange(360) / 10.0).tolist()]
+        response = self.app.post('/predict_arrhythmia_signals', json={'signals': signals, 'include_analysis': 'false'})
+        self.assertEqual(response.status_code, 200)
+        mock_analysis.assert_not_called()
+
+    def test_predict_arrhythmia_beats_invalid_duration(self):
+        for duration in ('abc', '-1', 'nan'):
+            data = {'file': (io.BytesIO(b"a"), 'strip.png'), 'mode': 'beats', 'duration': duration}
+            response = self.app.post('/predict_arrhythmia', content_type='multipart/form-data', data=data)
+            self.assertEqual(response.status_code, 400)
+
+    @patch('app.extract_leads_from_image')
+    @patch('app.model_.predict')
+    def test_predict_arrhythmia_12lead(self, mock_predict, mock_extract):
+        leads = ["I", "aVR", "V1", "V4", "II", "aVL", "V2", "V5", "III", "aVF", "V3", "V6"]
+        mock_extract.return_value = (np.zeros((11, 187, 1)), leads, list(range(11)), {11: "Entire signal is empty after processing."})
+        mock_predict.return_value = np.tile([0.8, 0.1, 0.05, 0.03, 0.02], (11, 1))
+
+        data = {'file': (io.BytesIO(b"a"), 'sheet.png')}
+        response = self.app.post('/predict_arrhythmia_12lead',
+                               content_type='multipart/form-data',
+                               data=data)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['classified'], 11)
+        self.assertEqual(data['leads'][0]['lead'], "I")
+        self.assertEqual(data['leads'][0]['prediction'], "Normal beat")
+        self.assertIn('error', data['leads'][11])
+        mock_predict.assert_called_once()
+
     # Heart Disease Prediction Tests
     def test_predict_heart_disease(self):
         test_data = {
@@ -160,6 +305,8 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data)
         self.assertIn('risk', data)
+        self.assertEqual(len(data['top_factors']), 3)
+        self.assertEqual(set(data['attributions']), set(test_data))
 
     # Additional Heart Disease Prediction Tests
     def test_predict_heart_disease_missing_fields(self):
@@ -193,6 +340,99 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('error', data)
 
     # Prescription Generation Tests
+    @patch('app.generate_cohere_analysis_heart')
+    @patch('app.model.predict')
+    def test_predict_heart_disease_bulk(self, mock_predict, mock_analysis):
+        mock_predict.return_value = np.array([[0.9], [0.2]])
+        header = "id,Age,RestingBP,Cholesterol,FastingBS,MaxHR,Oldpeak,Sex,ChestPainType,RestingECG,ExerciseAngina,ST_Slope"
+        rows = [
+            "p1,45,130,233,1,150,2.3,M,ATA,Normal,N,Up",
+            "p2,abc,130,233,1,150,2.3,X,ATA,Normal,N,Up",
+            "p3,60,140,280,0,120,1.0,F,ASY,ST,Y,Flat"
+        ]
+        response = self.app.post('/predict-heart-disease-failure/bulk',
+                               data="\n".join([header] + rows),
+                               content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(lines[0]['id'], "p1")
+        self.assertEqual(lines[0]['risk'], "HIGH")
+        self.assertIn("Age must be numeric", lines[1]['error'])
+        self.assertIn("Sex must be one of", lines[1]['error'])
+        self.assertEqual(lines[2]['risk'], "LOW")
+        self.assertEqual(lines[-1]['summary'], {"count": 3, "scored": 2, "failed": 1, "high_risk": 1})
+        mock_predict.assert_called_once()
+        mock_analysis.assert_not_called()
+
+    @patch('app.HEART_BULK_MAX_NARRATIVES', 1)
+    @patch('app.explain_batch')
+    @patch('app.generate_cohere_analysis_heart')
+    @patch('app.model.predict')
+    def test_predict_heart_disease_bulk_explains_only_narrated_rows(self, mock_predict, mock_analysis, mock_explain):
+        mock_predict.return_value = np.array([[0.9], [0.2]])
+        mock_analysis.return_value = "Narrative"
+        mock_explain.side_effect = lambda model, preprocessor, X: [
+            {"top_factors": ["Age"], "attributions": {"Age": 0.1}} for _ in range(len(X))
+        ]
+        header = "Age,RestingBP,Cholesterol,FastingBS,MaxHR,Oldpeak,Sex,ChestPainType,RestingECG,ExerciseAngina,ST_Slope"
+        rows = ["45,130,233,1,150,2.3,M,ATA,Normal,N,Up", "60,140,280,0,120,1.0,F,ASY,ST,Y,Flat"]
+        response = self.app.post('/predict-heart-disease-failure/bulk?include_analysis=true',
+                               data="\n".join([header] + rows),
+                               content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(lines[0]['analysis'], "Narrative")
+        self.assertNotIn('analysis', lines[1])
+        self.assertNotIn('attributions', lines[0])
+        mock_explain.assert_called_once()
+        self.assertEqual(len(mock_explain.call_args[0][2]), 1)
+
+    def test_predict_heart_disease_bulk_missing_fields(self):
+        response = self.app.post('/predict-heart-disease-failure/bulk',
+                               data="Age,Sex\n45,M",
+                               content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.get_medical_analysis')
+    def test_predict_cad_batch(self, mock_analysis):
+        patient = {
+            "age": 63, "sex": 1, "cp": 3, "trestbps": 145, "chol": 233, "fbs": 1, "restecg": 0,
+            "thalach": 150, "exang": 0, "oldpeak": 2.3, "slope": 0, "ca": 0, "thal": 1
+        }
+        incomplete = {key: value for key, value in patient.items() if key != "chol"}
+        response = self.app.post('/predict_cad_batch',
+                               json={'patients': [patient, incomplete, dict(patient, age=40)]})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['scored'], 2)
+        self.assertIn('diagnosis', data['results'][0])
+        self.assertIn('chol', data['results'][1]['error'])
+        self.assertTrue(0 <= data['results'][2]['prediction_probability'] <= 1)
+        mock_analysis.assert_not_called()
+
+    @patch('app.get_medical_analysis')
+    def test_predict_cad_deferred_analysis(self, mock_analysis):
+        mock_analysis.return_value = "deferred analysis"
+        patient = {
+            "age": 63, "sex": 1, "cp": 3, "trestbps": 145, "chol": 233, "fbs": 1, "restecg": 0,
+            "thalach": 150, "exang": 0, "oldpeak": 2.3, "slope": 0, "ca": 0, "thal": 1
+        }
+        response = self.app.post('/predict_cad', json=dict(patient, defer_analysis=True))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIn('diagnosis', data)
+        self.assertIsNone(data['analysis'])
+
+        stream = self.app.get(data['analysis_job']['stream_url'])
+        self.assertEqual(stream.mimetype, 'text/event-stream')
+        self.assertIn('event: narrative', stream.get_data(as_text=True))
+
+        status = json.loads(self.app.get(data['analysis_job']['url']).data)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['analysis'], "deferred analysis")
+        self.assertEqual(self.app.get('/narratives/unknown').status_code, 404)
+
     def test_generate_prescription(self):
         test_data = {
             "patient_name": "Test Patient",
@@ -248,6 +488,80 @@ class TestRoutes(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('message', data)
 
+    @patch('app.retrieve_similar_content')
+    @patch('app.stream_gemini_response')
+    def test_chat_stream(self, mock_stream, mock_retrieve):
+        mock_retrieve.return_value = ""
+        mock_stream.return_value = iter(['```json\n{"mess', 'age": "Hel', 'lo there", "invitation_to_continue": "How are you?"}\n```'])
+        response = self.app.post('/chat/stream', json={"message": "Hello", "user_name": "Test User"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+
+        events = [event.split('\n', 1) for event in response.get_data(as_text=True).strip().split('\n\n')]
+        tokens = [json.loads(data[len('data: '):])['text'] for name, data in events if name == 'event: token']
+        self.assertEqual(''.join(tokens), 'Hello there')
+        self.assertEqual(events[-1][0], 'event: done')
+        done = json.loads(events[-1][1][len('data: '):])
+        self.assertEqual(done['message'], 'Hello there')
+        self.assertEqual(done['invitation_to_continue'], 'How are you?')
+
+    @patch('app.retrieve_similar_content')
+    def test_chat_stream_retrieval_failure(self, mock_retrieve):
+        mock_retrieve.side_effect = RuntimeError("vector store unavailable")
+        response = self.app.post('/chat/stream', json={"message": "Hello", "user_name": "Test User"})
+        # Same fallback as /chat rather than a 500
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIn('message', data)
+        self.assertNotIn("vector store unavailable", response.get_data(as_text=True))
+
+    @patch('app.retrieve_similar_content')
+    @patch('app.stream_gemini_response')
+    def test_chat_stream_error_hides_exception(self, mock_stream, mock_retrieve):
+        mock_retrieve.return_value = ""
+
+        def failing_stream(prompt):
+            yield '{"message": "Hel'
+            raise RuntimeError("upstream key abc123 rejected")
+
+        mock_stream.side_effect = failing_stream
+        response = self.app.post('/chat/stream', json={"message": "Hello", "user_name": "Test User"})
+        body = response.get_data(as_text=True)
+        events = [event.split('\n', 1) for event in body.strip().split('\n\n')]
+        self.assertEqual(events[-1][0], 'event: error')
+        error = json.loads(events[-1][1][len('data: '):])
+        self.assertEqual(error['message'], 'Hel')
+        self.assertNotIn("abc123", body)
+
+    def test_chat_stream_empty_message(self):
+        response = self.app.post('/chat/stream', json={"message": ""})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.retrieve_similar_content')
+    @patch('app.generate_gemini_response')
+    def test_chat_session(self, mock_generate, mock_retrieve):
+        from modules.chat_sessions import ChatSessionStore
+        store = ChatSessionStore(":memory:")
+        mock_retrieve.return_value = []
+        mock_generate.return_value = {"message": "Hello there"}
+        with patch('app.chat_session_store', return_value=store):
+            response = self.app.post('/chat/sessions', json={"user_name": "Test User"})
+            self.assertEqual(response.status_code, 201)
+            session_id = json.loads(response.data)['session_id']
+
+            # Only the new message is sent; the server keeps the history
+            for message in ("I feel anxious", "It is about work"):
+                response = self.app.post('/chat', json={"session_id": session_id, "message": message})
+                self.assertEqual(json.loads(response.data)['message'], 'Hello there')
+            self.assertIn("I feel anxious", mock_generate.call_args[0][0])
+
+            data = json.loads(self.app.get(f'/chat/sessions/{session_id}').data)
+            self.assertEqual(data['message_count'], 4)
+            self.assertEqual([m['sender'] for m in data['messages']], ['user', 'ai', 'user', 'ai'])
+
+            response = self.app.post('/chat', json={"session_id": "missing", "message": "Hi"})
+            self.assertEqual(response.status_code, 404)
+
     # File Chat Tests
     @patch('app.upload_file')
     @patch('app.process_file_with_gemini')
@@ -331,7 +645,7 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.mimetype, 'application/pdf')
 
     # Video Analysis Tests
-    @patch('app.process_video')
+    @patch('modules.combine.process_video')
     def test_analyze_video(self, mock_process):
         mock_process.return_value = {
             "facial_emotion": "happy",
@@ -359,7 +673,7 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('emotion_analysis', data)
 
     # Additional Video Analysis Tests
-    @patch('app.process_video')
+    @patch('modules.combine.process_video')
     def test_analyze_video_no_patient_info(self, mock_process):
         mock_process.return_value = {
             "facial_emotion": "happy",
@@ -377,7 +691,81 @@ class TestRoutes(unittest.TestCase):
                                data={'video': test_file})
         self.assertEqual(response.status_code, 200)  # Should work with default patient info
 
-    @patch('app.process_video')
+    @patch('app.retrieve_similar_content')
+    @patch('app.generate_gemini_response')
+    @patch('app.transcribe_audio_file')
+    @patch('modules.combine.process_video')
+    def test_analyze_video_transcript_segments(self, mock_process, mock_transcribe, mock_generate, mock_retrieve):
+        mock_retrieve.return_value = ""
+        mock_generate.return_value = {"mental_health_assessment": "Stable"}
+        mock_process.return_value = {
+            "facial_emotion": "happy",
+            "speech_emotion": "happy"
+        }
+        mock_transcribe.return_value = {
+            "text": "hello there",
+            "segments": [{"start": 0.0, "end": 1.5, "text": "hello there"}],
+            "backend": "vosk"
+        }
+
+        test_file = FileStorage(
+            stream=io.BytesIO(b"test content"),
+            filename="test.mp4",
+            content_type="video/mp4",
+        )
+
+        response = self.app.post('/analyze_video',
+                               content_type='multipart/form-data',
+                               data={'video': test_file})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['transcribed_text'], "hello there")
+        self.assertEqual(len(data['transcript_segments']), 1)
+        self.assertFalse(data['transcript_incomplete'])
+        self.assertIn("hello there", mock_generate.call_args[0][0])
+
+    @patch('app.retrieve_similar_content')
+    @patch('app.generate_gemini_response')
+    @patch('app.transcribe_audio_file')
+    @patch('modules.combine.process_video')
+    @patch('modules.analysis_cache.get')
+    def test_analyze_video_cached_keeps_shared_audio(self, mock_cache_get, mock_process, mock_transcribe,
+                                                     mock_generate, mock_retrieve):
+        mock_retrieve.return_value = ""
+        mock_generate.return_value = {"mental_health_assessment": "Stable"}
+        from modules.combine import EmotionAnalysis, EMOTIONS, analyze_temporal_trends, map_to_mental_health
+        combined_probs = np.full((2, len(EMOTIONS)), 1 / len(EMOTIONS))
+        timeline, changes = analyze_temporal_trends(combined_probs)
+        emotion_scores, insights = map_to_mental_health(combined_probs)
+        cached = EmotionAnalysis(timeline=timeline, changes=changes, emotion_scores=emotion_scores, insights=insights)
+        mock_cache_get.return_value = {
+            "stt": {"text": "hello there", "segments": [], "backend": "vosk"},
+            "emotion_analysis": cached.to_dict()
+        }
+        # Another request's extracted audio must survive this cached one
+        with open('audio.wav', 'wb') as f:
+            f.write(b"in use")
+        self.addCleanup(os.remove, 'audio.wav')
+
+        test_file = FileStorage(
+            stream=io.BytesIO(b"test content"),
+            filename="test.mp4",
+            content_type="video/mp4",
+        )
+
+        response = self.app.post('/analyze_video',
+                               content_type='multipart/form-data',
+                               data={'video': test_file})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['analysis_cached'])
+        self.assertEqual(data['transcribed_text'], "hello there")
+        mock_process.assert_not_called()
+        mock_transcribe.assert_not_called()
+        self.assertIn("hello there", mock_generate.call_args[0][0])
+        self.assertTrue(os.path.exists('audio.wav'))
+
+    @patch('modules.combine.process_video')
     def test_analyze_video_invalid_format(self, mock_process):
         test_file = FileStorage(
             stream=io.BytesIO(b"test content"),
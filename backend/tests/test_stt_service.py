@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import wave
+import tempfile
+import numpy as np
+import speech_recognition as sr
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import stt_service
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=8000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def write_wav(path, samples):
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(RATE)
+        wav_file.writeframes(samples.tobytes())
+
+
+class TestSplitOnSilence(unittest.TestCase):
+    def test_cuts_at_pauses(self):
+        samples = np.concatenate([tone(1), silence(1), tone(1)])
+        chunks = stt_service.split_on_silence(samples, RATE)
+        self.assertEqual(len(chunks), 2)
+        # Boundaries fall on frame edges within one frame of the tone edges
+        frame = RATE * stt_service.FRAME_MS // 1000
+        self.assertEqual(chunks[0][0], 0)
+        self.assertAlmostEqual(chunks[0][1], RATE, delta=frame)
+        self.assertAlmostEqual(chunks[1][0], 2 * RATE, delta=frame)
+        self.assertEqual(chunks[1][1], len(samples))
+
+    def test_short_pauses_do_not_cut(self):
+        samples = np.concatenate([tone(1), silence(0.2), tone(1)])
+        self.assertEqual(stt_service.split_on_silence(samples, RATE), [(0, len(samples))])
+
+    def test_long_speech_is_split_evenly(self):
+        samples = tone(2.5)
+        with patch.object(stt_service, 'MAX_CHUNK_SECONDS', 1):
+            chunks = stt_service.split_on_silence(samples, RATE)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(samples))
+        for (_, end), (start, _) in zip(chunks[:-1], chunks[1:]):
+            self.assertEqual(end, start)
+
+    def test_all_silent_audio_has_no_chunks(self):
+        self.assertEqual(stt_service.split_on_silence(silence(2), RATE), [])
+
+    def test_empty_audio(self):
+        self.assertEqual(stt_service.split_on_silence(np.zeros(0, dtype=np.int16), RATE), [])
+
+
+class TestTranscribeAudioFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "audio.wav")
+
+    def transcribe(self, samples, recognize):
+        write_wav(self.path, samples)
+        stt_service.register_backend("test", recognize)
+        self.addCleanup(stt_service._BACKENDS.pop, "test", None)
+        return stt_service.transcribe_audio_file(self.path, backend="test")
+
+    def test_chunks_are_joined_in_order(self):
+        def recognize(audio_data):
+            loud = np.abs(np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)).max() > 10000
+            return "second" if loud else "first"
+
+        result = self.transcribe(np.concatenate([tone(1), silence(1), tone(1, 12000)]), recognize)
+        self.assertEqual(result["text"], "first second")
+        self.assertEqual([segment["text"] for segment in result["segments"]], ["first", "second"])
+        self.assertEqual(result["failed_chunks"], 0)
+
+    def test_all_silent_audio(self):
+        def recognize(audio_data):
+            raise AssertionError("silent audio should not reach the recognizer")
+
+        result = self.transcribe(silence(2), recognize)
+        self.assertEqual(result["text"], stt_service.NO_SPEECH_MESSAGE)
+        self.assertEqual(result["segments"], [])
+
+    def test_partial_failures_are_reported(self):
+        def recognize(audio_data):
+            loud = np.abs(np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)).max() > 10000
+            if loud:
+                raise sr.RequestError("quota exceeded")
+            return "hello"
+
+        result = self.transcribe(np.concatenate([tone(1), silence(1), tone(1, 12000)]), recognize)
+        self.assertEqual(result["text"], "hello")
+        self.assertEqual(len(result["segments"]), 1)
+        self.assertEqual(result["failed_chunks"], 1)
+
+    def test_all_chunks_failing(self):
+        def recognize(audio_data):
+            raise sr.RequestError("offline")
+
+        result = self.transcribe(np.concatenate([tone(1), silence(1), tone(1)]), recognize)
+        self.assertEqual(result["text"], stt_service.SERVICE_UNAVAILABLE_MESSAGE)
+        self.assertEqual(result["failed_chunks"], 2)
+
+    def test_unintelligible_chunks_are_not_failures(self):
+        def recognize(audio_data):
+            raise sr.UnknownValueError()
+
+        result = self.transcribe(tone(1), recognize)
+        self.assertEqual(result["text"], stt_service.NO_SPEECH_MESSAGE)
+        self.assertEqual(result["failed_chunks"], 0)
+
+    def test_missing_file(self):
+        result = stt_service.transcribe_audio_file(os.path.join(self.tmp.name, "missing.wav"))
+        self.assertEqual(result["text"], stt_service.EXTRACTION_FAILED_MESSAGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
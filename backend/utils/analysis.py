@@ -1,11 +1,17 @@
-import cohere
-import os
+import logging
+from modules.cohere_client import generate_text
+from modules.narrative_cache import cached_narrative, band_profile, band_value, HEART_FAILURE_BANDS, PROBABILITY_BAND
+
+logger = logging.getLogger(__name__)
 
 def generate_cohere_analysis_heart(patient_info, risk, prob, top_factors):
-    print("This is File cohere")
-    cohere_api_key = os.getenv("COHERE_API_KEY")
-    co = cohere.Client(cohere_api_key)
+    # Banded inputs, so the narrative can be shared by every patient in the same bands
+    patient_info = band_profile(patient_info, HEART_FAILURE_BANDS)
+    prob = band_value(prob, PROBABILITY_BAND)
+    key = {"risk": risk, "probability": prob, "top_factors": list(top_factors), "patient": patient_info}
+    return cached_narrative("heart_failure", key, lambda: _generate_heart_analysis(patient_info, risk, prob, top_factors))
 
+def _generate_heart_analysis(patient_info, risk, prob, top_factors):
     prompt = f"""
 You are a professional cardiologist.
 
@@ -25,15 +31,7 @@ Please provide a detailed clinical analysis covering:
 """
 
     try:
-        response = co.generate(
-            model='command-r-plus',
-            prompt=prompt,
-            max_tokens=400,
-            temperature=0.3
-        )
-        model_response=response.generations[0].text.strip()
-        print(f"model_response={model_response}")
-        return model_response
+        return generate_text(prompt, max_tokens=400, temperature=0.3, label="heart_failure")
     except Exception as e:
-        Print("Cohere Exception")
+        logger.error(f"Cohere Exception: {e}")
         return f"⚠️ Cohere error: {e}"
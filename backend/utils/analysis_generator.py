@@ -1,21 +1,17 @@
-import cohere
-import os
-import numpy as np
+from modules.cohere_client import generate_text
+from modules.narrative_cache import cached_narrative
 
 def generate_cohere_analysis(ecg_signal, pred_class,class_map):
-    cohere_api_key = os.getenv("COHERE_API_KEY")
-    co = cohere.Client(cohere_api_key)
+    # Signals are z-scored before classification, so their mean and spread are always about 0 and 1
+    # and say nothing about the patient; the narrative depends on, and is cached by, the diagnosis only
     diagnosis = class_map[pred_class]
+    return cached_narrative("ecg", {"diagnosis": diagnosis}, lambda: _generate_ecg_analysis(diagnosis))
 
+def _generate_ecg_analysis(diagnosis):
     prompt = f"""
 You are a professional clinical cardiologist writing a report for a patient's ECG. The ECG signal has been automatically classified as: {diagnosis}.
 
-Based on this classification and the following signal features:
-- Duration: 10 seconds
-- Mean amplitude: {np.mean(ecg_signal):.2f}
-- Signal variability (standard deviation): {np.std(ecg_signal):.2f}
-
-Write a comprehensive clinical report in the following format:
+Based on this classification of a 10 second ECG strip, write a comprehensive clinical report in the following format:
 
 ---
 Clinical Analysis:  
@@ -38,13 +34,6 @@ Use clear, clinical language suitable for a medical report. Be concise yet infor
     """
 
     try:
-        response = co.generate(
-            model="command-r-plus",
-            prompt=prompt,
-            max_tokens=800,
-            temperature=0.3,
-            stop_sequences=["---"]
-        )
-        return response.generations[0].text.strip()
+        return generate_text(prompt, max_tokens=800, temperature=0.3, stop_sequences=["---"], label="ecg")
     except Exception as e:
         return f"⚠️ Error generating analysis: {str(e)}"
@@ -1,60 +1,473 @@
+import os
+import io
+import csv
+import struct
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
-from scipy.signal import resample
+from scipy.signal import resample, find_peaks
 
+logger = logging.getLogger(__name__)
 
-def extract_signal_from_image(image_bytes, target_length=187):
-    print("Inside extract_signal_from_image")
+# OpenCV and NumPy release the GIL, so threads extract strips in parallel
+ECG_EXTRACT_WORKERS = int(os.environ.get("ECG_EXTRACT_WORKERS", os.cpu_count() or 4))
+_extract_executor = ThreadPoolExecutor(max_workers=ECG_EXTRACT_WORKERS, thread_name_prefix="ecg-extract")
+
+# Uploaded strips are normalized to this size before the waveform is traced
+TRACE_WIDTH = 500
+TRACE_HEIGHT = 100
+
+# Uploads are decoded at reduced resolution while staying at least twice the trace size
+MIN_DECODE_WIDTH = 2 * TRACE_WIDTH
+MIN_DECODE_HEIGHT = 2 * TRACE_HEIGHT
+MAX_ECG_IMAGE_BYTES = int(os.environ.get("MAX_ECG_IMAGE_BYTES", 20 * 1024 * 1024))
+MAX_ECG_IMAGE_PIXELS = int(os.environ.get("MAX_ECG_IMAGE_PIXELS", 50_000_000))
+_REDUCED_GRAYSCALE = {
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+}
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic variants)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Standard 12-lead sheet: three rows of four 2.5 s leads, optionally a full-width rhythm strip below
+LEAD_GRID = (
+    ("I", "aVR", "V1", "V4"),
+    ("II", "aVL", "V2", "V5"),
+    ("III", "aVF", "V3", "V6"),
+)
+RHYTHM_LEAD = "II (rhythm)"
+
+# Beat segmentation, matching the MIT-BIH heartbeat preprocessing used to train the model
+STRIP_DURATION_SECONDS = 10
+BEAT_SAMPLING_RATE = 125
+R_PEAK_THRESHOLD = 0.9
+BEAT_WINDOW_RR = 1.2
+MIN_RR_SECONDS = 0.25
+
+# Raw sample uploads
+SIGNAL_FILE_EXTENSIONS = {'csv', 'txt', 'npy'}
+MIN_SIGNAL_SAMPLES = 16
+
+
+def trace_columns(binary):
+    """Mean row index of the foreground pixels in every column, NaN for empty columns."""
+    mask = binary > 0
+    counts = mask.sum(axis=0)
+    rows = np.arange(binary.shape[0], dtype=np.float64)
+    sums = rows @ mask
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def image_dimensions(image_bytes):
+    """(width, height) from a PNG or JPEG header without decoding pixels, None for other formats."""
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n" and len(image_bytes) >= 24:
+        return struct.unpack(">II", image_bytes[16:24])
+
+    if image_bytes[:2] == b"\xff\xd8":
+        pos = 2
+        size = len(image_bytes)
+        while pos + 4 <= size:
+            if image_bytes[pos] != 0xFF:
+                return None
+            marker = image_bytes[pos + 1]
+            if marker == 0xFF:  # fill byte
+                pos += 1
+                continue
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # standalone markers
+                pos += 2
+                continue
+            length = struct.unpack(">H", image_bytes[pos + 2:pos + 4])[0]
+            if marker in _JPEG_SOF_MARKERS:
+                if pos + 9 > size:
+                    return None
+                height, width = struct.unpack(">HH", image_bytes[pos + 5:pos + 9])
+                return width, height
+            pos += 2 + length
+    return None
+
+
+def decode_scale(width, height, min_width=MIN_DECODE_WIDTH, min_height=MIN_DECODE_HEIGHT):
+    """Largest reduced-decode factor that keeps the image at least min_width x min_height."""
+    for factor in _REDUCED_GRAYSCALE:
+        if width // factor >= min_width and height // factor >= min_height:
+            return factor
+    return 1
+
+
+def decode_ecg_image(image_bytes, min_width=MIN_DECODE_WIDTH, min_height=MIN_DECODE_HEIGHT):
+    """Decode uploaded image bytes to a grayscale array, downscaled during decode when the image is large."""
+    if len(image_bytes) > MAX_ECG_IMAGE_BYTES:
+        raise ValueError(f"Image is too large: {len(image_bytes)} bytes (maximum {MAX_ECG_IMAGE_BYTES}).")
 
     # Convert byte array to numpy array
     np_arr = np.frombuffer(image_bytes, np.uint8)
-    print(f"Byte array size: {np_arr.size}")
+    logger.debug("Byte array size: %d", np_arr.size)
+
+    flags = cv2.IMREAD_GRAYSCALE
+    dimensions = image_dimensions(image_bytes)
+    if dimensions is not None:
+        width, height = dimensions
+        if width * height > MAX_ECG_IMAGE_PIXELS:
+            raise ValueError(f"Image is too large: {width}x{height} pixels (maximum {MAX_ECG_IMAGE_PIXELS}).")
+        factor = decode_scale(width, height, min_width, min_height)
+        if factor > 1:
+            flags = _REDUCED_GRAYSCALE[factor]
+        logger.debug("Header size %dx%d, decode scale 1/%d", width, height, factor)
 
     # Decode the image
-    img = cv2.imdecode(np_arr, cv2.IMREAD_GRAYSCALE)
+    img = cv2.imdecode(np_arr, flags)
     if img is None:
         raise ValueError("Invalid image data. Cannot decode image.")
 
-    print(f"Original image shape: {img.shape}")
+    logger.debug("Decoded image shape: %s", img.shape)
+    return img
+
 
+def trace_from_image(img, width=TRACE_WIDTH, height=TRACE_HEIGHT):
+    """Trace the waveform in a grayscale strip; returns one row position per column, gaps interpolated."""
     # Resize the image
-    img = cv2.resize(img, (500, 100))
-    print(f"Resized image shape: {img.shape}")
+    img = cv2.resize(img, (width, height))
+    logger.debug("Resized image shape: %s", img.shape)
 
     # Threshold to binary (inverse: ECG waveform becomes white on black background)
     _, binary = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY_INV)
 
-    # Extract the vertical position of the waveform from each column
-    signal = []
-    for col in range(binary.shape[1]):
-        column_pixels = np.where(binary[:, col] > 0)[0]
-        signal.append(np.mean(column_pixels) if column_pixels.size > 0 else np.nan)
-
-    signal = np.array(signal)
-    print(f"Raw extracted signal (with NaNs): {signal[:10]}")
+    # Extract the vertical position of the waveform from each column in one masked reduction
+    signal = trace_columns(binary)
+    logger.debug("Raw extracted signal (with NaNs): %s", signal[:10])
 
     # Interpolate and fill missing values
-    nans, x = np.isnan(signal), lambda z: z.nonzero()[0]
+    nans = np.isnan(signal)
     if np.all(nans):
         raise ValueError("Entire signal is empty after processing.")
 
-    signal[nans] = np.interp(x(nans), x(~nans), signal[~nans])
-    print(f"Interpolated signal: {signal[:10]}")
+    if nans.any():
+        positions = np.arange(signal.size)
+        signal[nans] = np.interp(positions[nans], positions[~nans], signal[~nans])
+    logger.debug("Interpolated signal: %s", signal[:10])
+    return signal
 
+
+def normalize_signal(signal, target_length=187):
+    """Z-score a signal and resample it to the model input shape (1, target_length, 1)."""
     # Normalize (z-score)
     std = np.std(signal)
     if std == 0:
         raise ValueError("Standard deviation of signal is zero. Cannot normalize.")
 
     signal = (signal - np.mean(signal)) / std
-    print(f"Normalized signal: {signal[:10]}")
+    logger.debug("Normalized signal: %s", signal[:10])
 
     # Resample to target length
     signal_resampled = resample(signal, target_length)
-    print(f"Resampled signal shape: {signal_resampled.shape}")
+    logger.debug("Resampled signal shape: %s", signal_resampled.shape)
 
     # Reshape for model input (batch_size, time_steps, channels)
     processed_ecg = signal_resampled.reshape(1, target_length, 1)
-    print("Processed ECG shape:", processed_ecg.shape)
+    logger.debug("Processed ECG shape: %s", processed_ecg.shape)
 
     return processed_ecg
+
+
+def extract_signal_from_image(image_bytes, target_length=187):
+    logger.debug("Inside extract_signal_from_image")
+    return normalize_signal(trace_from_image(decode_ecg_image(image_bytes)), target_length)
+
+
+def segment_beats(trace, duration_seconds=STRIP_DURATION_SECONDS, target_length=187):
+    """
+    Cut a traced strip into R-peak aligned beat windows, following the MIT-BIH preprocessing
+    the arrhythmia model was trained on: resample to 125 Hz, scale to [0, 1], take R-peaks above
+    0.9, cut 1.2 x the median RR interval from each R-peak and zero-pad to target_length.
+
+    Args:
+        trace (np.ndarray): Row positions from trace_from_image (rows grow downwards)
+        duration_seconds (float): Time covered by the strip
+        target_length (int): Samples per beat window
+
+    Returns:
+        tuple: (beats of shape (num_beats, target_length, 1), R-peak times in seconds)
+    """
+    num_samples = max(1, int(round(duration_seconds * BEAT_SAMPLING_RATE)))
+    # Image rows grow downwards, so flip the trace to make R waves point up
+    signal = resample(-np.asarray(trace, dtype=np.float64), num_samples)
+
+    span = np.ptp(signal)
+    if span == 0:
+        raise ValueError("Signal is flat. Cannot detect beats.")
+    signal = (signal - signal.min()) / span
+
+    min_distance = max(1, int(MIN_RR_SECONDS * BEAT_SAMPLING_RATE))
+    peaks, _ = find_peaks(signal, height=R_PEAK_THRESHOLD, distance=min_distance)
+    if len(peaks) < 2:
+        raise ValueError("Fewer than two R-peaks detected. Cannot segment beats.")
+
+    window = min(target_length, int(BEAT_WINDOW_RR * np.median(np.diff(peaks))))
+    # Zero-padded beat matrix filled with one fancy-indexed gather
+    offsets = np.arange(window)
+    positions = peaks[:, None] + offsets[None, :]
+    valid = positions < num_samples
+    beats = np.zeros((len(peaks), target_length))
+    beats[:, :window] = np.where(valid, signal[np.minimum(positions, num_samples - 1)], 0.0)
+
+    logger.debug("Detected %d beats, window %d samples", len(peaks), window)
+    return beats[:, :, None], peaks / BEAT_SAMPLING_RATE
+
+
+def extract_beats_from_image(image_bytes, duration_seconds=STRIP_DURATION_SECONDS, target_length=187):
+    """Beat windows and R-peak times for an ECG strip image; see segment_beats."""
+    return segment_beats(trace_from_image(decode_ecg_image(image_bytes)), duration_seconds, target_length)
+
+
+def find_lead_rows(img, num_rows):
+    """
+    Locate the horizontal bands of a multi-lead sheet from its ink projection.
+
+    Each boundary is placed at the emptiest row near where an evenly spaced layout would
+    put it, so slightly uneven margins are tolerated. Falls back to an even split when the
+    sheet has no usable ink profile.
+
+    Args:
+        img (np.ndarray): Grayscale sheet
+        num_rows (int): Number of lead rows on the sheet
+
+    Returns:
+        list: (top, bottom) pixel rows for each band
+    """
+    height = img.shape[0]
+    even = np.linspace(0, height, num_rows + 1).round().astype(int)
+
+    ink = (img < 128).sum(axis=1).astype(np.float64)
+    if ink.max() == 0:
+        return list(zip(even[:-1], even[1:]))
+
+    # Smooth over about 1/20 of a band so single text lines do not create a boundary
+    kernel = max(1, height // (20 * num_rows))
+    ink = np.convolve(ink, np.ones(kernel) / kernel, mode="same")
+
+    search = max(1, height // (4 * num_rows))
+    bounds = [0]
+    for expected in even[1:-1]:
+        low, high = max(bounds[-1] + 1, expected - search), min(height - 1, expected + search)
+        bounds.append(int(low + np.argmin(ink[low:high + 1])) if high > low else int(expected))
+    bounds.append(height)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def split_12_lead(img, rhythm_strip=False):
+    """
+    Split a standard 12-lead sheet into per-lead images.
+
+    Args:
+        img (np.ndarray): Grayscale sheet
+        rhythm_strip (bool): Whether a full-width lead II rhythm strip sits under the grid
+
+    Returns:
+        list: (lead name, grayscale image) pairs in LEAD_GRID order, then the rhythm strip
+    """
+    rows = find_lead_rows(img, len(LEAD_GRID) + int(rhythm_strip))
+    width = img.shape[1]
+    columns = np.linspace(0, width, len(LEAD_GRID[0]) + 1).round().astype(int)
+
+    leads = []
+    for (top, bottom), names in zip(rows, LEAD_GRID):
+        for name, left, right in zip(names, columns[:-1], columns[1:]):
+            leads.append((name, img[top:bottom, left:right]))
+    if rhythm_strip:
+        top, bottom = rows[-1]
+        leads.append((RHYTHM_LEAD, img[top:bottom]))
+    return leads
+
+
+def _lead_or_error(lead_img, target_length):
+    try:
+        return normalize_signal(trace_from_image(lead_img), target_length), None
+    except Exception as e:
+        return None, str(e)
+
+
+def extract_leads_from_image(image_bytes, rhythm_strip=False, target_length=187):
+    """
+    Extract every lead of a 12-lead sheet into one model batch.
+
+    Args:
+        image_bytes (bytes): Encoded sheet image
+        rhythm_strip (bool): Whether the sheet has a rhythm strip below the 3x4 grid
+        target_length (int): Samples per signal
+
+    Returns:
+        tuple: (batch of shape (num_ok, target_length, 1),
+                lead names in sheet order,
+                indices into the lead names for each batch row,
+                {index: error message} for leads that could not be traced)
+    """
+    num_rows = len(LEAD_GRID) + int(rhythm_strip)
+    # Keep each lead at twice the trace size or more after the reduced decode
+    img = decode_ecg_image(
+        image_bytes,
+        min_width=len(LEAD_GRID[0]) * MIN_DECODE_WIDTH,
+        min_height=num_rows * MIN_DECODE_HEIGHT
+    )
+    leads = split_12_lead(img, rhythm_strip)
+    names = [name for name, _ in leads]
+    outputs = list(_extract_executor.map(lambda lead: _lead_or_error(lead[1], target_length), leads))
+
+    signals, indices, errors = [], [], {}
+    for i, (signal, error) in enumerate(outputs):
+        if error is None:
+            signals.append(signal)
+            indices.append(i)
+        else:
+            errors[i] = error
+
+    batch = np.concatenate(signals) if signals else np.empty((0, target_length, 1))
+    logger.debug("Extracted %d of %d leads", len(indices), len(leads))
+    return batch, names, indices, errors
+
+
+def _extract_or_error(image_bytes, target_length):
+    try:
+        return extract_signal_from_image(image_bytes, target_length), None
+    except Exception as e:
+        return None, str(e)
+
+
+def extract_signals_from_images(images, target_length=187):
+    """
+    Extract many ECG strips in parallel and stack them into one model batch.
+
+    Args:
+        images (list): Encoded image bytes, one entry per strip
+        target_length (int): Samples per signal
+
+    Returns:
+        tuple: (batch of shape (num_ok, target_length, 1),
+                indices into images for each batch row,
+                {index: error message} for images that could not be processed)
+    """
+    outputs = list(_extract_executor.map(lambda image: _extract_or_error(image, target_length), images))
+
+    signals, indices, errors = [], [], {}
+    for i, (signal, error) in enumerate(outputs):
+        if error is None:
+            signals.append(signal)
+            indices.append(i)
+        else:
+            errors[i] = error
+
+    batch = np.concatenate(signals) if signals else np.empty((0, target_length, 1))
+    return batch, indices, errors
+
+
+def _normalize_rows(signals, target_length):
+    """normalize_signal for a 2-D array of equal-length signals, one row each"""
+    std = signals.std(axis=1, keepdims=True)
+    flat = std[:, 0] == 0
+    std[flat] = 1.0
+    normalized = (signals - signals.mean(axis=1, keepdims=True)) / std
+    return resample(normalized, target_length, axis=1)[:, :, None], flat
+
+
+def signals_from_samples(signals, target_length=187):
+    """
+    Turn raw ECG sample arrays into one model batch, skipping image decoding entirely.
+
+    Each signal is z-scored and resampled to target_length exactly like a traced strip.
+    Equal-length signals are processed together in a single vectorized pass.
+
+    Args:
+        signals (list or np.ndarray): One sequence of samples per signal, or a 2-D array
+        target_length (int): Samples per signal
+
+    Returns:
+        tuple: (batch of shape (num_ok, target_length, 1),
+                indices into signals for each batch row,
+                {index: error message} for signals that could not be used)
+    """
+    rows, indices, errors = [], [], {}
+    for i, samples in enumerate(signals):
+        try:
+            samples = np.asarray(samples, dtype=np.float64)
+        except (TypeError, ValueError):
+            errors[i] = "Signal must be a list of numbers."
+            continue
+        if samples.ndim != 1:
+            errors[i] = "Signal must be one-dimensional."
+        elif samples.size < MIN_SIGNAL_SAMPLES:
+            errors[i] = f"Signal has {samples.size} samples, at least {MIN_SIGNAL_SAMPLES} are required."
+        elif not np.isfinite(samples).all():
+            errors[i] = "Signal contains NaN or infinite values."
+        else:
+            rows.append(samples)
+            indices.append(i)
+
+    # Group by length so every group is one 2-D z-score and FFT resample
+    outputs = [None] * len(rows)
+    by_length = {}
+    for row, samples in enumerate(rows):
+        by_length.setdefault(samples.size, []).append(row)
+    for group in by_length.values():
+        normalized, flat = _normalize_rows(np.stack([rows[row] for row in group]), target_length)
+        for j, row in enumerate(group):
+            if flat[j]:
+                errors[indices[row]] = "Standard deviation of signal is zero. Cannot normalize."
+            else:
+                outputs[row] = normalized[j:j + 1]
+
+    kept = [row for row in range(len(rows)) if outputs[row] is not None]
+    batch = np.concatenate([outputs[row] for row in kept]) if kept else np.empty((0, target_length, 1))
+    logger.debug("Prepared %d raw signals, %d rejected", len(kept), len(errors))
+    return batch, [indices[row] for row in kept], dict(sorted(errors.items()))
+
+
+def signal_from_samples(samples, target_length=187):
+    """Single raw signal to model input of shape (1, target_length, 1)."""
+    batch, _, errors = signals_from_samples([samples], target_length)
+    if errors:
+        raise ValueError(errors[0])
+    return batch
+
+
+def parse_signal_file(data, filename):
+    """
+    Read raw ECG signals from an uploaded file.
+
+    CSV/TXT files hold one signal per row (rows may differ in length). NPY files hold
+    a 1-D array (one signal) or a 2-D array (one signal per row).
+
+    Args:
+        data (bytes): File contents
+        filename (str): Original file name, used to pick the format
+
+    Returns:
+        list: Signals as 1-D float arrays
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in SIGNAL_FILE_EXTENSIONS:
+        raise ValueError(f"Unsupported signal file type: {filename}")
+
+    if extension == 'npy':
+        array = np.load(io.BytesIO(data), allow_pickle=False)
+        if array.ndim == 1:
+            return [array.astype(np.float64)]
+        if array.ndim == 2:
+            return list(array.astype(np.float64))
+        raise ValueError(f"Expected a 1-D or 2-D array in {filename}, got {array.ndim} dimensions")
+
+    signals = []
+    reader = csv.reader(io.StringIO(data.decode('utf-8-sig')))
+    for line_number, row in enumerate(reader, start=1):
+        values = [value.strip() for value in row if value.strip()]
+        if not values:
+            continue
+        try:
+            signals.append(np.array(values, dtype=np.float64))
+        except ValueError:
+            # Tolerate a header line
+            if line_number == 1 and not signals:
+                continue
+            raise ValueError(f"Non-numeric value on line {line_number} of {filename}")
+    return signals
@@ -1,23 +1,98 @@
+import logging
 import numpy as np
-import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class HeartFailurePreprocessor:
+    """
+    Scaling and one-hot encoding for the heart-failure model, compiled once from the
+    saved preprocessing artifacts.
+
+    Numeric features are standardized with the saved scaler; categorical features are
+    one-hot encoded with the first category dropped, in encoder_categories order. Unknown
+    categories encode as all zeros.
+    """
+
+    def __init__(self, prep_info, scaler_mean, scaler_scale, encoder_categories):
+        self.numerical_features = list(prep_info["numerical_features"])
+        self.categorical_features = list(prep_info["categorical_features"])
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+
+        # category -> output column for every categorical feature
+        self.category_columns = []
+        self.feature_names = list(self.numerical_features)
+        self.column_features = list(self.numerical_features)
+        column = len(self.numerical_features)
+        for feature, categories in zip(self.categorical_features, encoder_categories):
+            mapping = {}
+            for category in categories[1:]:
+                mapping[category] = column
+                self.feature_names.append(f"{feature}_{category}")
+                self.column_features.append(feature)
+                column += 1
+            self.category_columns.append(mapping)
+        self.num_columns = column
+
+    def transform(self, records, dtype=np.float32):
+        """
+        Encode one record or a list of records.
+
+        Args:
+            records (dict or list): Raw input fields keyed by feature name
+            dtype: Output dtype
+
+        Returns:
+            np.ndarray: Model input of shape (num_records, num_columns)
+        """
+        if isinstance(records, dict):
+            records = [records]
+        columns = {
+            feature: [record.get(feature, np.nan) for record in records]
+            for feature in self.numerical_features
+        }
+        columns.update({
+            feature: [record.get(feature) for record in records]
+            for feature in self.categorical_features
+        })
+        return self.transform_arrays(columns, dtype)
+
+    def transform_arrays(self, columns, dtype=np.float32):
+        """
+        Encode columnar input, e.g. a parsed CSV.
+
+        Args:
+            columns (dict): Feature name -> sequence of values, all the same length
+            dtype: Output dtype
+
+        Returns:
+            np.ndarray: Model input of shape (num_records, num_columns)
+        """
+        numeric = np.column_stack([
+            np.asarray(columns[feature], dtype=np.float64) for feature in self.numerical_features
+        ])
+        encoded = np.zeros((numeric.shape[0], self.num_columns), dtype=np.float64)
+        encoded[:, :len(self.numerical_features)] = (numeric - self.scaler_mean) / self.scaler_scale
+
+        for feature, mapping in zip(self.categorical_features, self.category_columns):
+            values = np.asarray(columns[feature], dtype=object)
+            for category, column in mapping.items():
+                encoded[:, column] = values == category
+
+        return encoded.astype(dtype, copy=False)
+
+
+_compiled = None
+
 
 def preprocess_input(inputs, prep_info, scaler_mean, scaler_scale, encoder_categories):
-    print("Preprocessing")
-    df = pd.DataFrame([inputs], columns=prep_info["feature_order"])
-
-    num_data = df[prep_info["numerical_features"]]
-    scaled_numerical = (num_data - scaler_mean) / scaler_scale
-
-    cat_data = df[prep_info["categorical_features"]]
-    encoded_categorical = np.zeros((1, sum(len(cats) - 1 for cats in encoder_categories)))
-
-    col_index = 0
-    for i, categories in enumerate(encoder_categories):
-        cats_to_encode = categories[1:]
-        val = cat_data.iloc[0, i]
-        for cat in cats_to_encode:
-            encoded_categorical[0, col_index] = 1 if val == cat else 0
-            col_index += 1
-    value=np.concatenate([scaled_numerical, encoded_categorical], axis=1)
-    print(value)
+    """Encode a single record as a float64 row, reusing the compiled preprocessor for the same artifacts"""
+    global _compiled
+    artifacts = (prep_info, scaler_mean, scaler_scale, encoder_categories)
+    if _compiled is None or any(a is not b for a, b in zip(_compiled[0], artifacts)):
+        _compiled = (artifacts, HeartFailurePreprocessor(*artifacts))
+
+    value = _compiled[1].transform(inputs, dtype=np.float64)
+    logger.debug("Preprocessed input: %s", value)
     return value
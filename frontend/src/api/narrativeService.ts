@@ -0,0 +1,74 @@
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
+
+// Handle returned by the prediction endpoints when the analysis is deferred
+export interface NarrativeJob {
+  id: string;
+  status: string;
+  url: string;
+  stream_url: string;
+}
+
+interface NarrativeStatus {
+  id: string;
+  status: "pending" | "running" | "done" | "error";
+  analysis?: string;
+  error?: string;
+}
+
+const toAnalysis = (job: NarrativeStatus): string => {
+  if (job.status === "done" && job.analysis) {
+    return job.analysis;
+  }
+  throw new Error(job.error || "The analysis is not available yet.");
+};
+
+// Fallback when server-sent events are unavailable: poll the job status
+const pollNarrative = async (
+  job: NarrativeJob,
+  intervalMs = 1000,
+  attempts = 120
+): Promise<string> => {
+  for (let i = 0; i < attempts; i++) {
+    const response = await fetch(`${API_BASE_URL}${job.url}`);
+    const data: NarrativeStatus = await response.json();
+    if (!response.ok) {
+      throw new Error(data.error || `Server responded with status ${response.status}`);
+    }
+    if (data.status === "done" || data.status === "error") {
+      return toAnalysis(data);
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+  throw new Error("Timed out waiting for the analysis.");
+};
+
+// Resolves with the analysis text once the background narrative is ready
+export const waitForNarrative = (job: NarrativeJob): Promise<string> => {
+  if (typeof window === "undefined" || !("EventSource" in window)) {
+    return pollNarrative(job);
+  }
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE_URL}${job.stream_url}`);
+
+    source.addEventListener("narrative", (event) => {
+      source.close();
+      try {
+        const data: NarrativeStatus = JSON.parse((event as MessageEvent).data);
+        if (data.status === "pending" || data.status === "running") {
+          // The stream timed out before the job finished; keep waiting by polling
+          pollNarrative(job).then(resolve, reject);
+          return;
+        }
+        resolve(toAnalysis(data));
+      } catch (error) {
+        reject(error);
+      }
+    });
+
+    source.onerror = () => {
+      source.close();
+      pollNarrative(job).then(resolve, reject);
+    };
+  });
+};
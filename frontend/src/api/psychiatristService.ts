@@ -239,3 +239,99 @@ export async function sendChatMessage(
     };
   }
 }
+
+// Starts a server-side chat session; its messages are kept on the server from then on
+export async function createChatSession(userName: string): Promise<string> {
+  const response = await fetch(`${API_BASE_URL}/chat/sessions`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    mode: "cors",
+    body: JSON.stringify({ user_name: userName }),
+  });
+  if (!response.ok) {
+    throw new Error(`Server responded with status ${response.status}`);
+  }
+  const data = await response.json();
+  return data.session_id;
+}
+
+// Streams the reply from /chat/stream; onToken receives the text as it is generated.
+// With a sessionId only the new message is sent, otherwise chatHistory is sent along.
+export async function streamChatMessage(
+  message: string,
+  userName: string,
+  chatHistory: any[] = [],
+  onToken: (text: string) => void,
+  conversation: { sessionId?: string; conversationId?: string } = {}
+) {
+  const fallback =
+    "Sorry, I couldn't process your message right now. Please check your connection and try again.";
+  try {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+      },
+      mode: "cors",
+      body: JSON.stringify(
+        conversation.sessionId
+          ? { message, user_name: userName, session_id: conversation.sessionId }
+          : {
+              message,
+              user_name: userName,
+              chat_history: chatHistory.map((msg) => ({
+                sender: msg.sender,
+                content: msg.content,
+              })),
+              // The server summarizes older turns per conversation and trims to its token budget
+              conversation_id: conversation.conversationId,
+            }
+      ),
+    });
+
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}));
+      return { message: data.message || fallback, error: data.error || `Server responded with status ${response.status}` };
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let streamed = "";
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line: "event: <name>\ndata: <json>"
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const event = block.match(/^event: (.*)$/m)?.[1];
+        const data = block.match(/^data: (.*)$/m)?.[1];
+        if (!event || !data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === "token") {
+          streamed += payload.text;
+          onToken(payload.text);
+        } else if (event === "done") {
+          return payload;
+        } else if (event === "error") {
+          return { message: payload.message || fallback, error: payload.error };
+        }
+      }
+    }
+
+    return { message: streamed || fallback, error: streamed ? undefined : "Stream ended unexpectedly" };
+  } catch (error: any) {
+    console.error("Error in streamChatMessage:", error);
+    return {
+      message: fallback,
+      error: error.message || "Failed to communicate with the server",
+    };
+  }
+}
@@ -1,11 +1,13 @@
 "use client";
 
 import { useState, FormEvent } from "react";
+import { NarrativeJob, waitForNarrative } from "@/api/narrativeService";
 
 interface PredictionResult {
   prediction: string;
   confidence: string;
-  analysis: string;
+  analysis: string | null;
+  analysis_job?: NarrativeJob;
 }
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
 export default function Page() {
@@ -31,6 +33,16 @@ export default function Page() {
     }
   };
 
+  // The prediction returns immediately; the analysis arrives from a background job
+  const loadDeferredAnalysis = (job?: NarrativeJob) => {
+    if (!job) return;
+    waitForNarrative(job)
+      .then((analysis) => setResult((prev) => (prev ? { ...prev, analysis } : prev)))
+      .catch((err: Error) =>
+        setResult((prev) => (prev ? { ...prev, analysis: `⚠️ ${err.message}` } : prev))
+      );
+  };
+
   const handleSubmit = async (e: FormEvent) => {
     e.preventDefault();
     setError("");
@@ -43,6 +55,7 @@ export default function Page() {
 
     const formData = new FormData();
     formData.append("file", file);
+    formData.append("defer_analysis", "true");
 
     setLoading(true);
     try {
@@ -54,6 +67,7 @@ export default function Page() {
       const data = await res.json();
       if (res.ok) {
         setResult(data);
+        loadDeferredAnalysis(data.analysis_job);
       } else {
         setError(data.error || "An error occurred during prediction.");
       }
@@ -289,7 +303,7 @@ export default function Page() {
                     </h3>
                     <div className="bg-gray-50 p-4 rounded-lg">
                       <p className="whitespace-pre-wrap text-gray-700 leading-relaxed">
-                        {result.analysis}
+                        {result.analysis ?? "Generating analysis..."}
                       </p>
                     </div>
                   </div>
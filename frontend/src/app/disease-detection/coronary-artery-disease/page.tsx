@@ -1,6 +1,7 @@
 "use client";
 import { useState, ChangeEvent, FormEvent } from "react";
 import Link from "next/link";
+import { NarrativeJob, waitForNarrative } from "@/api/narrativeService";
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
 type FeatureKey =
@@ -25,7 +26,8 @@ type FeatureDescriptionsType = Record<FeatureKey, [string, string]>;
 type PredictionResult = {
   prediction_probability: number;
   diagnosis: string;
-  analysis: string;
+  analysis: string | null;
+  analysis_job?: NarrativeJob;
 };
 
 const featureDescriptions: FeatureDescriptionsType = {
@@ -85,6 +87,16 @@ export default function Page() {
     setFormData((prev) => ({ ...prev, [name]: value }));
   };
 
+  // The prediction returns immediately; the analysis arrives from a background job
+  const loadDeferredAnalysis = (job?: NarrativeJob) => {
+    if (!job) return;
+    waitForNarrative(job)
+      .then((analysis) => setResult((prev) => (prev ? { ...prev, analysis } : prev)))
+      .catch((err: Error) =>
+        setResult((prev) => (prev ? { ...prev, analysis: `⚠️ ${err.message}` } : prev))
+      );
+  };
+
   const handleSubmit = async (e: FormEvent) => {
     e.preventDefault();
     setLoading(true);
@@ -102,22 +114,20 @@ export default function Page() {
         Object.entries(formData).map(([k, v]) => [k, parseFloat(v)])
       );
 
-      // Add small delays to showcase the inference stages
       setInferenceStage("processing");
-      await new Promise((resolve) => setTimeout(resolve, 700));
 
       const res = await fetch(`${API_BASE_URL}/predict_cad`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
+        body: JSON.stringify({ ...payload, defer_analysis: true }),
       });
 
       setInferenceStage("analyzing");
-      await new Promise((resolve) => setTimeout(resolve, 800));
 
       const data = await res.json();
       if (res.ok) {
         setResult(data);
+        loadDeferredAnalysis(data.analysis_job);
         setInferenceStage("complete");
       } else {
         setError(data.error || "An error occurred.");
@@ -576,7 +586,7 @@ export default function Page() {
                     </h3>
                     <div className="bg-gray-50 p-4 rounded-lg">
                       <p className="whitespace-pre-wrap text-gray-700 leading-relaxed">
-                        {result.analysis}
+                        {result.analysis ?? "Generating analysis..."}
                       </p>
                     </div>
                   </div>
@@ -2,6 +2,7 @@
 
 import { useState, ChangeEvent, FormEvent } from "react";
 import Link from "next/link";
+import { NarrativeJob, waitForNarrative } from "@/api/narrativeService";
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
 
@@ -18,7 +19,9 @@ type PredictionResponse = {
   risk: string;
   probability: number;
   top_factors: string[];
-  analysis: string;
+  attributions?: Record<string, number>;
+  analysis: string | null;
+  analysis_job?: NarrativeJob;
 };
 
 const featureDescriptions: Record<string, FeatureMetadata> = {
@@ -125,6 +128,16 @@ export default function Page() {
     setFormData((prev) => ({ ...prev, [name]: value }));
   };
 
+  // The prediction returns immediately; the analysis arrives from a background job
+  const loadDeferredAnalysis = (job?: NarrativeJob) => {
+    if (!job) return;
+    waitForNarrative(job)
+      .then((analysis) => setResult((prev) => (prev ? { ...prev, analysis } : prev)))
+      .catch((err: Error) =>
+        setResult((prev) => (prev ? { ...prev, analysis: `⚠️ ${err.message}` } : prev))
+      );
+  };
+
   const handleSubmit = async (e: FormEvent) => {
     e.preventDefault();
     setError("");
@@ -158,19 +171,17 @@ export default function Page() {
 
     try {
       setInferenceStage("processing");
-      await new Promise((resolve) => setTimeout(resolve, 500));
 
       const response = await fetch(
         `${API_BASE_URL}/predict-heart-disease-failure`,
         {
           method: "POST",
           headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(payload),
+          body: JSON.stringify({ ...payload, defer_analysis: true }),
         }
       );
 
       setInferenceStage("analyzing");
-      await new Promise((resolve) => setTimeout(resolve, 800));
 
       const data = await response.json();
 
@@ -179,6 +190,7 @@ export default function Page() {
       }
 
       setResult(data);
+      loadDeferredAnalysis(data.analysis_job);
       setInferenceStage("complete");
     } catch (err: any) {
       setError(err.message || "An unexpected error occurred.");
@@ -567,7 +579,7 @@ export default function Page() {
                     </h3>
                     <div className="bg-gray-50 p-4 rounded-lg">
                       <p className="whitespace-pre-wrap text-gray-700 leading-relaxed">
-                        {result.analysis}
+                        {result.analysis ?? "Generating analysis..."}
                       </p>
                     </div>
                   </div>
@@ -11,7 +11,7 @@ import {
 } from "react-icons/fi";
 import Link from "next/link";
 import { motion, AnimatePresence } from "framer-motion";
-import { sendChatMessage } from "@/api/psychiatristService";
+import { createChatSession, streamChatMessage } from "@/api/psychiatristService";
 
 type Message = {
   id: number;
@@ -35,6 +35,9 @@ export default function ChatPage() {
   const [userName, setUserName] = useState("");
   const [sessionStarted, setSessionStarted] = useState(false);
   const [error, setError] = useState("");
+  const [conversationId, setConversationId] = useState("");
+  const [chatSessionId, setChatSessionId] = useState("");
+  const [sessionReady, setSessionReady] = useState(false);
   const messagesEndRef = useRef<null | HTMLDivElement>(null);
   const chatContainerRef = useRef<null | HTMLDivElement>(null);
 
@@ -57,11 +60,13 @@ export default function ChatPage() {
     return () => window.removeEventListener("resize", handleResize);
   }, []);
 
-  const handleStartSession = (e: React.FormEvent) => {
+  const handleStartSession = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!userName) return;
 
     setSessionStarted(true);
+    setSessionReady(false);
+    setConversationId(`${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
     setMessages([
       {
         id: 1,
@@ -70,12 +75,21 @@ export default function ChatPage() {
         timestamp: new Date(),
       },
     ]);
+    // Input stays disabled until the session exists, so the server log has every turn.
+    // Without a server session the full history is sent with every message instead.
+    try {
+      setChatSessionId(await createChatSession(userName));
+    } catch (error) {
+      console.warn("Chat session unavailable:", error);
+    } finally {
+      setSessionReady(true);
+    }
   };
 
   const handleSendMessage = async (e: React.FormEvent) => {
     e.preventDefault();
 
-    if (inputMessage.trim() === "") return;
+    if (inputMessage.trim() === "" || !sessionReady) return;
 
     const userMessage: Message = {
       id: messages.length + 1,
@@ -91,12 +105,30 @@ export default function ChatPage() {
     setIsTyping(true);
 
     try {
-      const recentMessages = messages.slice(-5);
+      const aiMessageId = messages.length + 2;
 
-      const response = await sendChatMessage(
+      // Show the reply as it streams in, then replace it with the final message
+      const response = await streamChatMessage(
         inputMessage,
         userName,
-        recentMessages
+        // Full history; the server keeps recent turns verbatim and summarizes older ones
+        messages,
+        (text) => {
+          setIsTyping(false);
+          setMessages((prev) =>
+            prev.some((msg) => msg.id === aiMessageId)
+              ? prev.map((msg) =>
+                  msg.id === aiMessageId
+                    ? { ...msg, content: msg.content + text }
+                    : msg
+                )
+              : [
+                  ...prev,
+                  { id: aiMessageId, content: text, sender: "ai", timestamp: new Date() },
+                ]
+          );
+        },
+        { sessionId: chatSessionId, conversationId }
       );
 
       const messageContent =
@@ -106,13 +138,16 @@ export default function ChatPage() {
           : response.message;
 
       const aiMessage: Message = {
-        id: messages.length + 2,
+        id: aiMessageId,
         content: messageContent,
         sender: "ai",
         timestamp: new Date(),
       };
 
-      setMessages((prev) => [...prev, aiMessage]);
+      setMessages((prev) => [
+        ...prev.filter((msg) => msg.id !== aiMessageId),
+        aiMessage,
+      ]);
     } catch (err: any) {
       setError(err.message || "Failed to get response. Please try again.");
       console.error(err);
@@ -373,16 +408,16 @@ export default function ChatPage() {
                 type="text"
                 value={inputMessage}
                 onChange={(e) => setInputMessage(e.target.value)}
-                placeholder="Type your message..."
+                placeholder={sessionReady ? "Type your message..." : "Starting conversation..."}
                 className="flex-1 border-2 rounded-lg px-4 py-3 focus:outline-none focus:ring-2 focus:ring-opacity-50 transition-all bg-white border-gray-300 text-gray-800 focus:ring-blue-400 focus:border-blue-400"
-                disabled={isTyping}
+                disabled={isTyping || !sessionReady}
               />
               <motion.button
                 whileHover={{ scale: 1.05 }}
                 whileTap={{ scale: 0.95 }}
                 type="submit"
                 className="rounded-lg px-5 py-3 shadow-md transition-all disabled:opacity-50 bg-gradient-to-r from-blue-500 to-blue-600 hover:from-blue-600 hover:to-blue-700 text-white disabled:from-blue-300 disabled:to-blue-400"
-                disabled={isTyping || !inputMessage.trim()}
+                disabled={isTyping || !sessionReady || !inputMessage.trim()}
               >
                 <FiSend size={20} />
               </motion.button>
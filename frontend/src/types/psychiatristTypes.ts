@@ -34,6 +34,29 @@ export interface AnalysisResponse {
   prognosis: string;
   timestamp: string;
   emotion_analysis?: string; // Raw emotion analysis from video processing
+  emotion_timeline?: EmotionTimeline; // Structured form of emotion_analysis
+}
+
+export interface EmotionInsight {
+  kind: string;
+  message: string;
+  score: number;
+  time?: number | null;
+}
+
+// Per-segment emotion timeline returned by /analyze_video
+export interface EmotionTimeline {
+  emotions: string[];
+  timeline: {
+    start: number[];
+    end: number[];
+    probabilities: number[][];
+    dominant: string[];
+    confidence: number[];
+  };
+  changes: EmotionInsight[];
+  emotion_scores: Record<string, number>;
+  insights: EmotionInsight[];
 }
 
 // New type for the data sent to generate a prescription